@@ -0,0 +1,273 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 when allowed, else the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+class RouteLimit:
+    """Token bucket shared by every request matching "METHOD /path/{param}" """
+
+    def __init__(self, route: str, rate: float, burst: float):
+        self.route = route
+        method, _, template = route.partition(" ")
+        self.method = method.upper()
+        self.pattern = re.compile("^" + re.sub(r"\\{\w+\\}", r"[^/]+", re.escape(template)) + "$")
+        self.bucket = TokenBucket(rate, burst)
+
+    def matches(self, method: str, path: str) -> bool:
+        return self.method in ("*", method) and bool(self.pattern.match(path))
+
+def parse_route_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "POST /rides/request=20:40" into {"POST /rides/request": (20.0, 40.0)}"""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        route, _, limit = item.rpartition("=")
+        rate, _, burst = limit.partition(":")
+        limits[route.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+class RateLimiter:
+    """
+    Per-client and per-route token buckets. A client is the authenticated user
+    when the gateway knows one, otherwise the remote address. Client buckets are
+    kept in a bounded LRU; an evicted client simply starts again with a full bucket.
+    """
+
+    def __init__(self, client_rate: float = 0.0, client_burst: float = 0.0,
+                 route_limits: Optional[Dict[str, Tuple[float, float]]] = None, max_clients: int = 100000):
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.configure(client_rate, client_burst, route_limits or {})
+
+        self.limited_clients = 0
+        self.limited_routes = 0
+
+    def configure(self, client_rate: float, client_burst: float, route_limits: Dict[str, Tuple[float, float]]) -> None:
+        """Replace the limits; a client rate of 0 turns per-client limiting off"""
+        self.client_rate = client_rate
+        self.client_burst = max(float(client_burst), 1.0)
+        self._clients.clear()
+        self.routes: List[RouteLimit] = [RouteLimit(route, rate, burst) for route, (rate, burst) in route_limits.items()]
+
+    def check(self, client: str, method: str, path: str) -> float:
+        """0 when the request may proceed, else the seconds the caller should wait"""
+        for route in self.routes:
+            if route.matches(method, path):
+                wait = route.bucket.take()
+                if wait:
+                    self.limited_routes += 1
+                    return wait
+                break
+
+        if self.client_rate <= 0:
+            return 0.0
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        wait = bucket.take()
+        if wait:
+            self.limited_clients += 1
+        return wait
+
+    def stats(self) -> Dict:
+        return {
+            "client_rate": self.client_rate,
+            "client_burst": self.client_burst,
+            "tracked_clients": len(self._clients),
+            "routes": {route.route: {"rate": route.bucket.rate, "burst": route.bucket.burst} for route in self.routes},
+            "limited_clients": self.limited_clients,
+            "limited_routes": self.limited_routes,
+        }
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted to an upstream"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+class ConcurrencyLimiter:
+    """
+    Caps the requests in flight to one upstream. Up to `max_queue` callers wait
+    in FIFO order for a free slot, for at most `queue_timeout` seconds; anyone
+    beyond that is shed immediately, so a burst cannot pile up on the upstream's
+    database pool.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int = 100, queue_timeout: float = 5.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> None:
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise Overloaded("queue full", retry_after=1.0)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ran out; keep it
+                self.admitted += 1
+                return
+            waiter.cancel()
+            self.timed_out += 1
+            self.shed += 1
+            raise Overloaded("queue timeout", retry_after=self.queue_timeout)
+        except asyncio.CancelledError:
+            # The caller went away; pass on a slot it was handed meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    def release(self) -> None:
+        # Hand the slot straight to the next live waiter, keeping in_flight unchanged
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def configure(self, max_concurrent: int, max_queue: int, queue_timeout: float) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Raising the cap admits waiters right away
+        while self._waiters and self.in_flight < self.max_concurrent:
+            self.in_flight += 1
+            self.release()
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+def parse_upstream_limits(value: str) -> Dict[str, Tuple[int, int]]:
+    """Parse "booking_service=15:100" into {"booking_service": (15, 100)}"""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, limit = item.rpartition("=")
+        max_concurrent, _, max_queue = limit.partition(":")
+        limits[name.strip()] = (int(max_concurrent), int(max_queue or 0))
+    return limits
+
+class RouteRate(BaseModel):
+    rate: float = Field(..., gt=0)
+    burst: float = Field(..., ge=1)
+
+class UpstreamLimit(BaseModel):
+    max_concurrent: int = Field(..., ge=1)
+    max_queue: int = Field(100, ge=0)
+    queue_timeout: float = Field(5.0, gt=0)
+
+class AdmissionLimits(BaseModel):
+    """Runtime limit changes; fields left out keep their current values"""
+    client_rate: Optional[float] = Field(None, ge=0)
+    client_burst: Optional[float] = Field(None, ge=1)
+    routes: Optional[Dict[str, RouteRate]] = None
+    upstreams: Dict[str, UpstreamLimit] = {}
+
+class AdmissionController:
+    """Rate limits for every request plus a concurrency limiter per upstream"""
+
+    def __init__(self, rate_limiter: RateLimiter, upstreams: Dict[str, ConcurrencyLimiter]):
+        self.rate_limiter = rate_limiter
+        self.upstreams = upstreams
+
+    def check_rate(self, client: str, method: str, path: str) -> float:
+        return self.rate_limiter.check(client, method, path)
+
+    def upstream(self, name: str) -> ConcurrencyLimiter:
+        return self.upstreams[name]
+
+    def configure(self, limits: AdmissionLimits) -> None:
+        """Apply limit changes; unknown upstream names raise KeyError before anything changes"""
+        unknown = set(limits.upstreams) - set(self.upstreams)
+        if unknown:
+            raise KeyError(", ".join(sorted(unknown)))
+        if limits.client_rate is not None or limits.client_burst is not None or limits.routes is not None:
+            routes = limits.routes
+            self.rate_limiter.configure(
+                self.rate_limiter.client_rate if limits.client_rate is None else limits.client_rate,
+                self.rate_limiter.client_burst if limits.client_burst is None else limits.client_burst,
+                {route.route: (route.bucket.rate, route.bucket.burst) for route in self.rate_limiter.routes}
+                if routes is None else {route: (limit.rate, limit.burst) for route, limit in routes.items()},
+            )
+        for name, limit in limits.upstreams.items():
+            self.upstreams[name].configure(limit.max_concurrent, limit.max_queue, limit.queue_timeout)
+
+    def stats(self) -> Dict:
+        upstreams = {name: limiter.stats() for name, limiter in self.upstreams.items()}
+        return {
+            "rate_limits": self.rate_limiter.stats(),
+            "upstreams": upstreams,
+            "admitted": sum(stats["admitted"] for stats in upstreams.values()),
+            "queued": sum(stats["queued"] for stats in upstreams.values()),
+            "shed": sum(stats["shed"] for stats in upstreams.values())
+            + self.rate_limiter.limited_clients + self.rate_limiter.limited_routes,
+        }
@@ -0,0 +1,75 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+@dataclass
+class Fetched:
+    """Outcome of one upstream lookup; `body` is the parsed JSON of a successful response"""
+    status_code: int
+    body: Any = None
+    detail: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    def error(self) -> Dict:
+        return {"status": self.status_code, "detail": self.detail}
+
+# fetch(upstream name, upstream path, JSON body to POST or None to GET) -> Fetched
+Fetch = Callable[[str, str, Optional[Any]], Awaitable[Fetched]]
+
+async def batch_lookup(fetch: Fetch, upstream: str, path: str, ids: List[int], missing_detail: str) -> Dict[int, Fetched]:
+    """Resolve ids with one call to an upstream batch endpoint, as one Fetched per id"""
+    if not ids:
+        return {}
+    batch = await fetch(upstream, path, {"ids": ids})
+    if not batch.ok:
+        return {item_id: batch for item_id in ids}
+    # JSON object keys are strings
+    items = batch.body.get("items", {})
+    return {
+        item_id: Fetched(200, body=items[str(item_id)]) if str(item_id) in items else Fetched(404, detail=missing_detail)
+        for item_id in ids
+    }
+
+async def ride_details(fetch: Fetch, ride_ids: List[int]) -> List[Dict]:
+    """
+    Compose ride documents with their rider and user, one per ride id in order.
+
+    The rides come from one batch lookup, then every distinct rider and user
+    they reference from one batch lookup per service, both concurrently. A
+    failed lookup leaves its field null and is reported under the document's
+    `errors`, so one slow or broken service never costs the caller the fields
+    that did load.
+    """
+    unique_ride_ids = list(dict.fromkeys(ride_ids))
+    rides = await batch_lookup(fetch, "booking_service", "/api/v1/rides/batch", unique_ride_ids, "Ride not found")
+    fetched_rides = list(rides.values())
+
+    rider_ids = list(dict.fromkeys(ride.body["rider_id"] for ride in fetched_rides if ride.ok and ride.body.get("rider_id") is not None))
+    user_ids = list(dict.fromkeys(ride.body["user_id"] for ride in fetched_rides if ride.ok and ride.body.get("user_id") is not None))
+    riders, users = await asyncio.gather(
+        batch_lookup(fetch, "rider_service", "/api/v1/riders/batch", rider_ids, "Rider not found"),
+        batch_lookup(fetch, "user_service", "/api/v1/users/batch", user_ids, "User not found"),
+    )
+
+    documents = []
+    for ride_id in ride_ids:
+        ride = rides[ride_id]
+        document = {"ride_id": ride_id, "ride": None, "rider": None, "user": None, "errors": {}}
+        if not ride.ok:
+            document["errors"]["ride"] = ride.error()
+            documents.append(document)
+            continue
+        document["ride"] = ride.body
+        for field, lookups, key in (("rider", riders, "rider_id"), ("user", users, "user_id")):
+            fetched = lookups.get(ride.body.get(key))
+            if fetched is None:
+                continue
+            if fetched.ok:
+                document[field] = fetched.body
+            else:
+                document["errors"][field] = fetched.error()
+        documents.append(document)
+    return documents
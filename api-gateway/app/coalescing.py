@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+from fastapi import Request
+from app.response_cache import path_pattern
+
+# Request headers that can change an upstream's answer to the same URL and credentials
+VARYING_HEADERS = ("accept", "accept-encoding", "if-none-match", "if-modified-since")
+
+def coalesce_key(request: Request) -> Tuple:
+    """Method, path, query, a digest of the credentials and the headers that vary the response"""
+    authorization = request.headers.get("authorization", "")
+    credential = hashlib.sha256(authorization.encode()).hexdigest() if authorization else ""
+    varying = tuple(request.headers.get(name, "") for name in VARYING_HEADERS)
+    return (request.method, request.url.path, request.url.query, credential, varying)
+
+def parse_coalesce_routes(value: str) -> List[str]:
+    """Parse "/riders,/riders/{id}" into path templates"""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one. The first caller for a key
+    starts the call in its own task; callers arriving while it runs await the
+    same task and all receive its result or its exception. The task is shielded,
+    so the first caller disconnecting does not cancel the call for the others.
+    Proxied GETs are only shared on the `routes` templates, as a shared call
+    has to be read whole before it can be handed to several callers.
+    """
+
+    def __init__(self, enabled: bool = True, routes: List[str] = ()):
+        self.enabled = enabled
+        self.routes = list(routes)
+        self._patterns = [path_pattern(template) for template in self.routes]
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+        self.requests = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+
+    def covers(self, path: str) -> bool:
+        """Whether proxied GETs for `path` may be shared"""
+        return self.enabled and any(pattern.match(path) for pattern in self._patterns)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await call()
+        self.requests += 1
+        task = self._calls.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "routes": self.routes,
+            "in_flight": len(self._calls),
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "coalescing_ratio": round(self.coalesced / self.requests, 4) if self.requests else 0.0,
+        }
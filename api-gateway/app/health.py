@@ -0,0 +1,102 @@
+import asyncio
+import time
+import httpx
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from app.proxy import UpstreamClients
+
+class UpstreamHealth:
+    """Rolling health state of one upstream, fed by the prober"""
+
+    def __init__(self, window: int = 20):
+        # (ok, latency_seconds) of the most recent probes
+        self.probes: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_response: Optional[Dict] = None
+
+    def record(self, ok: bool, latency: float, response: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        self.probes.append((ok, latency))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        self.last_checked = time.time()
+        self.last_error = error
+        if ok:
+            self.last_response = response
+
+    @property
+    def error_rate(self) -> float:
+        if not self.probes:
+            return 0.0
+        return sum(1 for ok, _ in self.probes if not ok) / len(self.probes)
+
+    @property
+    def average_latency_ms(self) -> Optional[float]:
+        latencies = [latency for ok, latency in self.probes if ok]
+        return round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None
+
+class HealthProber:
+    """
+    Probes every upstream's /health concurrently on an interval and keeps the
+    results, so the gateway's /health answers from memory and the proxy can
+    refuse traffic for an upstream that is known to be down instead of waiting
+    for it to time out.
+    """
+
+    def __init__(self, upstreams: UpstreamClients, interval: float = 5.0, timeout: float = 2.0,
+                 failure_threshold: int = 3, window: int = 20):
+        self.upstreams = upstreams
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.health = {name: UpstreamHealth(window) for name in upstreams.clients}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        # One round up front so the first /health after startup has data
+        await self.probe_all()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.probe_all()
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self.probe(name) for name in self.health))
+
+    async def probe(self, name: str) -> None:
+        start = time.perf_counter()
+        try:
+            response = await self.upstreams[name].get("/health", timeout=self.timeout)
+            response.raise_for_status()
+            self.health[name].record(True, time.perf_counter() - start, response=response.json())
+        except (httpx.HTTPError, ValueError) as e:
+            self.health[name].record(False, time.perf_counter() - start, error=str(e) or e.__class__.__name__)
+
+    def is_down(self, name: str) -> bool:
+        """True once an upstream has failed `failure_threshold` probes in a row"""
+        return self.health[name].consecutive_failures >= self.failure_threshold
+
+    def snapshot(self) -> Dict:
+        services = {}
+        for name, health in self.health.items():
+            services[name] = {
+                "status": "down" if self.is_down(name) else ("degraded" if health.consecutive_failures else "up"),
+                "response": health.last_response,
+                "error_rate": round(health.error_rate, 4),
+                "average_latency_ms": health.average_latency_ms,
+                "consecutive_failures": health.consecutive_failures,
+                "last_checked": health.last_checked,
+                "last_error": health.last_error,
+            }
+        return services
@@ -0,0 +1,135 @@
+import httpx
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from app.auth import IDENTITY_HEADER
+from ride_sharing_common.resilience import Resilience
+
+# Methods whose requests carry no body and may be sent again or twice
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Headers that describe a single connection and must not be forwarded (RFC 7230, section 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Open-ended bodies that are passed through as they arrive and never read whole
+STREAMING_MEDIA_TYPES = {"text/event-stream", "application/x-ndjson", "text/csv"}
+
+class StreamingUpstream(Exception):
+    """Raised by fetch_response for a response that has to be streamed rather than buffered"""
+
+def forwardable_headers(headers: Iterable[Tuple[str, str]], drop: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    """Copy header pairs minus hop-by-hop ones, including any named in the Connection header"""
+    headers = list(headers)
+    excluded = HOP_BY_HOP_HEADERS | set(drop)
+    for name, value in headers:
+        if name.lower() == "connection":
+            excluded |= {token.strip().lower() for token in value.split(",")}
+    return [(name, value) for name, value in headers if name.lower() not in excluded]
+
+class UpstreamClients:
+    """One long-lived, connection-pooled HTTP client per upstream service"""
+
+    def __init__(self, upstreams: Dict[str, str], max_connections: int = 100,
+                 max_keepalive_connections: int = 20, keepalive_expiry: float = 30.0,
+                 timeout: float = 30.0, connect_timeout: float = 5.0):
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.clients = {
+            name: httpx.AsyncClient(
+                base_url=url,
+                limits=limits,
+                timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                # Redirects are the client's business, pass them through untouched
+                follow_redirects=False,
+            )
+            for name, url in upstreams.items()
+        }
+
+    def __getitem__(self, name: str) -> httpx.AsyncClient:
+        return self.clients[name]
+
+    async def aclose(self) -> None:
+        for client in self.clients.values():
+            await client.aclose()
+
+def build_upstream_request(request: Request, client: httpx.AsyncClient, path: str,
+                           extra_headers: Optional[Dict[str, str]] = None) -> httpx.Request:
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    # Identity headers are only ever set by the gateway itself
+    headers = forwardable_headers(request.headers.items(), drop=("host", IDENTITY_HEADER))
+    headers.extend((extra_headers or {}).items())
+    return client.build_request(
+        method=request.method,
+        url=httpx.URL(path, query=request.url.query.encode("utf-8")),
+        headers=headers,
+        content=request.stream() if has_body else None,
+    )
+
+def response_headers(upstream_response: httpx.Response) -> List[Tuple[str, str]]:
+    # Date and Server come from the gateway's own server
+    return forwardable_headers(upstream_response.headers.multi_items(), drop=("date", "server"))
+
+async def send_upstream(request: Request, client: httpx.AsyncClient, path: str,
+                        extra_headers: Optional[Dict[str, str]] = None,
+                        resilience: Optional[Resilience] = None) -> httpx.Response:
+    """Send the request upstream with a streamed response, under the upstream's breaker and retry policy if given"""
+    send = lambda: client.send(build_upstream_request(request, client, path, extra_headers), stream=True)
+    if resilience is None:
+        return await send()
+    return await resilience.call(send, idempotent=request.method in IDEMPOTENT_METHODS)
+
+async def proxy_request(request: Request, client: httpx.AsyncClient, path: str,
+                        extra_headers: Optional[Dict[str, str]] = None,
+                        resilience: Optional[Resilience] = None) -> StreamingResponse:
+    """
+    Forward a request to an upstream service, streaming both bodies through as raw
+    bytes. Nothing is parsed, so empty and non-JSON bodies pass unchanged. Raises
+    httpx.HTTPError when the upstream cannot be reached.
+    """
+    upstream_response = await send_upstream(request, client, path, extra_headers, resilience)
+
+    response = StreamingResponse(
+        upstream_response.aiter_raw(),
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(upstream_response.aclose),
+    )
+    # Raw pairs keep repeated headers such as Set-Cookie
+    response.raw_headers.extend(
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in response_headers(upstream_response)
+    )
+    return response
+
+async def fetch_response(request: Request, client: httpx.AsyncClient, path: str,
+                         extra_headers: Optional[Dict[str, str]] = None,
+                         resilience: Optional[Resilience] = None) -> Tuple[int, List[Tuple[str, str]], bytes]:
+    """
+    Forward a request and read the whole response, as (status, headers, raw body
+    bytes). Raises StreamingUpstream, without reading the body, when the upstream
+    answers with a streaming media type.
+    """
+    upstream_response = await send_upstream(request, client, path, extra_headers, resilience)
+    media_type = upstream_response.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type in STREAMING_MEDIA_TYPES:
+        await upstream_response.aclose()
+        raise StreamingUpstream(media_type)
+    try:
+        body = b"".join([chunk async for chunk in upstream_response.aiter_raw()])
+    finally:
+        await upstream_response.aclose()
+    headers = [(name.lower(), value) for name, value in response_headers(upstream_response)]
+    return upstream_response.status_code, headers, body
@@ -0,0 +1,207 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+
+def path_pattern(template: str) -> re.Pattern:
+    """
+    Compile a path template; "{name}" matches one numeric id segment, so
+    /riders/{id} covers /riders/5 but not /riders/changes or /riders/available.
+    """
+    return re.compile("^" + re.sub(r"\\{\w+\\}", r"\\d+", re.escape(template)) + "$")
+
+@dataclass
+class CacheRoute:
+    """A gateway path template whose GET responses may be cached for `ttl_seconds`"""
+    template: str
+    ttl_seconds: float
+    pattern: re.Pattern = field(init=False)
+
+    def __post_init__(self):
+        self.pattern = path_pattern(self.template)
+
+def parse_cache_routes(value: str) -> List[CacheRoute]:
+    """Parse "/riders=5,/riders/{id}=30" into cache routes"""
+    routes = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        template, _, ttl = item.rpartition("=")
+        routes.append(CacheRoute(template.strip(), float(ttl)))
+    return routes
+
+def resource_tags(path: str) -> Set[str]:
+    """
+    Tags for invalidation: the resource a path belongs to and its collection,
+    e.g. /rides/5/status -> {"/rides/5", "/rides"}.
+    """
+    segments = [segment for segment in path.split("/") if segment]
+    tags = set()
+    if segments:
+        tags.add("/" + segments[0])
+    if len(segments) > 1:
+        tags.add("/" + "/".join(segments[:2]))
+    return tags
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 7232 requires for If-None-Match
+    strip = lambda tag: tag.strip().removeprefix("W/")
+    return strip(etag) in {strip(tag) for tag in if_none_match.split(",")}
+
+@dataclass
+class CacheEntry:
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+    etag: str
+    expires_at: float
+    tag: str
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+class ResponseCache:
+    """
+    Memory-bounded LRU cache of upstream GET responses with per-route TTLs.
+
+    Entries are keyed by path, query string and the caller's Authorization
+    header, so one user's response is never served to another. A successful
+    write through the gateway drops the cached copies of the resource it
+    touched and of its collection. Writes that reach a service without going
+    through the gateway are only picked up when the TTL runs out.
+    """
+
+    def __init__(self, routes: List[CacheRoute], max_bytes: int = 32 * 1024 * 1024, enabled: bool = True):
+        self.routes = routes
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._entries: "OrderedDict[Tuple[str, str, str], CacheEntry]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bypassed = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def route_for(self, request: Request) -> Optional[CacheRoute]:
+        """The cache route for a request, or None when it must go straight upstream"""
+        if not self.enabled or request.method != "GET":
+            return None
+        for route in self.routes:
+            if route.pattern.match(request.url.path):
+                return route
+        return None
+
+    def bypass(self, request: Request) -> bool:
+        """Clients skip the cache with Cache-Control: no-cache or no-store"""
+        cache_control = request.headers.get("cache-control", "").lower()
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            self.bypassed += 1
+            return True
+        return False
+
+    @staticmethod
+    def key(request: Request) -> Tuple[str, str, str]:
+        authorization = request.headers.get("authorization", "")
+        credential = hashlib.sha256(authorization.encode()).hexdigest() if authorization else ""
+        return (request.url.path, request.url.query, credential)
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._discard(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Tuple[str, str, str], route: CacheRoute, status_code: int,
+            headers: List[Tuple[str, str]], body: bytes) -> Optional[CacheEntry]:
+        """Store a response if it may be cached, returns the entry"""
+        cache_control = dict(headers).get("cache-control", "").lower()
+        if status_code != 200 or "no-store" in cache_control or "private" in cache_control:
+            return None
+        etag = dict(headers).get("etag") or '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        headers = [(name, value) for name, value in headers if name not in ("etag", "content-length")]
+        entry = CacheEntry(
+            status_code=status_code,
+            headers=headers,
+            body=body,
+            etag=etag,
+            expires_at=time.monotonic() + route.ttl_seconds,
+            tag=key[0],
+        )
+        if entry.size > self.max_bytes:
+            return entry
+        self._discard(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self.evictions += 1
+        return entry
+
+    def _discard(self, key: Tuple[str, str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def invalidate(self, path: str) -> int:
+        """Drop the entries for the resource at `path` and for its collection"""
+        tags = resource_tags(path)
+        stale = [key for key, entry in self._entries.items() if entry.tag in tags]
+        for key in stale:
+            self._discard(key)
+        self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def respond(self, request: Request, entry: CacheEntry, cache_status: str) -> Response:
+        """Build the client response from an entry, 304 when the client already has it"""
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            response = Response(status_code=304)
+        else:
+            response = Response(content=entry.body, status_code=entry.status_code)
+            response.raw_headers = [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in entry.headers
+            ] + response.raw_headers
+        response.headers["etag"] = entry.etag
+        response.headers["x-cache"] = cache_status
+        return response
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "bypassed": self.bypassed,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "routes": {route.template: route.ttl_seconds for route in self.routes},
+        }
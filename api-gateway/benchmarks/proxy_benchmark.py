@@ -0,0 +1,62 @@
+"""
+Measure latency and throughput of requests proxied through a running api-gateway.
+
+    python -m benchmarks.proxy_benchmark --url http://localhost:8000/riders/1 --requests 5000
+
+Point --url at the gateway and, for comparison, at the upstream service directly
+to see the overhead the gateway adds.
+"""
+import argparse
+import asyncio
+import collections
+import statistics
+import time
+import httpx
+
+async def run(url: str, method: str, body: str, total: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        statuses = collections.Counter()
+
+        async def call():
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(
+                        method, url,
+                        content=body.encode() if body else None,
+                        headers={"Content-Type": "application/json"} if body else None,
+                    )
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[e.__class__.__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        # Warm up connections first so both runs start from the same state
+        await asyncio.gather(*(call() for _ in range(min(concurrency, total))))
+        latencies.clear()
+        statuses.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{method} {url}: {total} requests, concurrency {concurrency}")
+    print(f"  throughput {total / elapsed:.0f} req/s")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.1f} ms"
+          f" | p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms"
+          f" | p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"  status codes {dict(statuses)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/riders/1")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--body", default="")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.method, args.body, args.requests, args.concurrency))
@@ -1,14 +1,114 @@
+import json
+import math
 import os
-from fastapi import FastAPI, Request, HTTPException, status
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from fastapi import FastAPI, Header, Query, Request, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 import httpx
+from fastapi.responses import Response
+from app.admission import (
+    AdmissionController, AdmissionLimits, ConcurrencyLimiter, Overloaded, RateLimiter,
+    parse_route_limits, parse_upstream_limits,
+)
+from app.aggregation import Fetched, ride_details
+from app.auth import IDENTITY_HEADER, DenylistUpdate, EdgeAuthenticator, token_digest
+from app.coalescing import SingleFlight, coalesce_key, parse_coalesce_routes
+from app.health import HealthProber
+from app.proxy import StreamingUpstream, UpstreamClients, fetch_response, proxy_request
+from ride_sharing_common.resilience import CircuitOpenError, Resilience, resilience_from_env
+from app.response_cache import ResponseCache, parse_cache_routes
+
+# Service URLs
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8001")
+RIDER_SERVICE_URL = os.getenv("RIDER_SERVICE_URL", "http://rider-service:8002")
+BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8003")
+RIDE_MATCHING_SERVICE_URL = os.getenv("RIDE_MATCHING_SERVICE_URL", "http://ride-matching-service:8004")
+
+# Verify bearer tokens at the edge and hand the services a trusted identity header
+GATEWAY_EDGE_AUTH = os.getenv("GATEWAY_EDGE_AUTH", "false").lower() == "true"
+JWT_SECRET = os.getenv("JWT_SECRET", "your_super_secret_key_for_jwt")
+
+# Shared key for the gateway's admin endpoints; they are disabled when unset
+GATEWAY_ADMIN_KEY = os.getenv("GATEWAY_ADMIN_KEY")
+
+# Keep one pooled keep-alive client per upstream for the lifetime of the app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.upstreams = UpstreamClients(
+        {
+            "user_service": USER_SERVICE_URL,
+            "rider_service": RIDER_SERVICE_URL,
+            "booking_service": BOOKING_SERVICE_URL,
+            "ride_matching_service": RIDE_MATCHING_SERVICE_URL,
+        },
+        max_connections=int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "50")),
+        keepalive_expiry=float(os.getenv("UPSTREAM_KEEPALIVE_SECONDS", "30")),
+        timeout=float(os.getenv("UPSTREAM_TIMEOUT_SECONDS", "30")),
+    )
+    # Read-heavy GET routes and their TTLs in seconds, e.g. "/riders=5,/riders/{id}=30"
+    app.state.response_cache = ResponseCache(
+        parse_cache_routes(os.getenv("GATEWAY_CACHE_ROUTES", "/riders=5,/riders/{id}=30,/rides/{id}=10")),
+        max_bytes=int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        enabled=os.getenv("GATEWAY_CACHE_ENABLED", "true").lower() == "true",
+    )
+    # Per-upstream circuit breakers and retries, so a dead upstream fails in milliseconds
+    app.state.resilience = {
+        name: resilience_from_env(name, default_deadline=10.0)
+        for name in app.state.upstreams.clients
+    }
+    app.state.admission = build_admission(list(app.state.upstreams.clients))
+    # Identical concurrent GETs on these routes share one upstream call; every other route streams
+    app.state.coalescer = SingleFlight(
+        enabled=os.getenv("GATEWAY_COALESCE_ENABLED", "true").lower() == "true",
+        routes=parse_coalesce_routes(os.getenv("GATEWAY_COALESCE_ROUTES", "/riders,/riders/{id},/rides/{id}")),
+    )
+    app.state.authenticator = None
+    if GATEWAY_EDGE_AUTH:
+        app.state.authenticator = EdgeAuthenticator(
+            JWT_SECRET,
+            cache_size=int(os.getenv("GATEWAY_TOKEN_CACHE_SIZE", "10000")),
+        )
+    
+    # Probe every upstream in the background; /health and the proxy read the results
+    app.state.health_prober = HealthProber(
+        app.state.upstreams,
+        interval=float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "5")),
+        timeout=float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "2")),
+        failure_threshold=int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3")),
+    )
+    await app.state.health_prober.start()
+    yield
+    await app.state.health_prober.stop()
+    await app.state.upstreams.aclose()
+
+# Rate limits and per-upstream concurrency caps, adjustable later through /admin/limits
+def build_admission(upstream_names) -> AdmissionController:
+    # booking-service's DB pool is 5 connections plus 10 overflow, so it gets 15 slots
+    upstream_limits = parse_upstream_limits(os.getenv("GATEWAY_UPSTREAM_LIMITS", "booking_service=15:100"))
+    default_concurrency = int(os.getenv("GATEWAY_UPSTREAM_MAX_CONCURRENT", "50"))
+    default_queue = int(os.getenv("GATEWAY_UPSTREAM_MAX_QUEUE", "100"))
+    queue_timeout = float(os.getenv("GATEWAY_QUEUE_TIMEOUT_SECONDS", "5"))
+    upstreams = {}
+    for name in upstream_names:
+        max_concurrent, max_queue = upstream_limits.get(name, (default_concurrency, default_queue))
+        upstreams[name] = ConcurrencyLimiter(max_concurrent, max_queue, queue_timeout)
+    
+    # Requests per second per client (0 disables), and e.g. "POST /rides/request=20:40" per route
+    rate_limiter = RateLimiter(
+        client_rate=float(os.getenv("GATEWAY_CLIENT_RATE", "20")),
+        client_burst=float(os.getenv("GATEWAY_CLIENT_BURST", "40")),
+        route_limits=parse_route_limits(os.getenv("GATEWAY_ROUTE_LIMITS", "")),
+    )
+    return AdmissionController(rate_limiter, upstreams)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="API Gateway",
     description="API Gateway for the Ride Sharing System",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -18,107 +118,275 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers may read the list endpoints' next-page cursor
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Service URLs
-USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8001")
-RIDER_SERVICE_URL = os.getenv("RIDER_SERVICE_URL", "http://rider-service:8002")
-BOOKING_SERVICE_URL = os.getenv("BOOKING_SERVICE_URL", "http://booking-service:8003")
-RIDE_MATCHING_SERVICE_URL = os.getenv("RIDE_MATCHING_SERVICE_URL", "http://ride-matching-service:8004")
-
-# Service health route
+# Service health route, answered from the background prober's latest results
 @app.get("/health", tags=["health"])
-async def health_check():
-    async with httpx.AsyncClient() as client:
-        try:
-            health = {}
-            # Check User Service
-            user_response = await client.get(f"{USER_SERVICE_URL}/health")
-            health["user_service"] = user_response.json()
-
-            # Check Rider Service
-            rider_response = await client.get(f"{RIDER_SERVICE_URL}/health")
-            health["rider_service"] = rider_response.json()
-
-            # Check Booking Service
-            booking_response = await client.get(f"{BOOKING_SERVICE_URL}/health")
-            health["booking_service"] = booking_response.json()
-
-            # Check Ride Matching Service
-            matching_response = await client.get(f"{RIDE_MATCHING_SERVICE_URL}/health")
-            health["ride_matching_service"] = matching_response.json()
-
-            return {"status": "healthy", "services": health}
-        except httpx.HTTPError as e:
-            return {"status": "unhealthy", "error": str(e)}
+def health_check(request: Request):
+    services = request.app.state.health_prober.snapshot()
+    healthy = all(service["status"] == "up" for service in services.values())
+    return {"status": "healthy" if healthy else "unhealthy", "services": services}
 
 # User Service routes
 @app.api_route("/users{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def user_service_proxy(request: Request, path: str):
-    return await proxy_request(request, f"{USER_SERVICE_URL}/api/v1/users{path}")
+    return await forward(request, "user_service", f"/api/v1/users{path}")
 
 @app.api_route("/token", methods=["POST"])
 async def token_proxy(request: Request):
-    return await proxy_request(request, f"{USER_SERVICE_URL}/api/v1/token")
+    return await forward(request, "user_service", "/api/v1/token")
 
 # Rider Service routes
 @app.api_route("/riders{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def rider_service_proxy(request: Request, path: str):
-    return await proxy_request(request, f"{RIDER_SERVICE_URL}/api/v1/riders{path}")
+    return await forward(request, "rider_service", f"/api/v1/riders{path}")
+
+@app.api_route("/distance-matrix{path:path}", methods=["GET", "POST"])
+async def distance_matrix_proxy(request: Request, path: str):
+    return await forward(request, "rider_service", f"/api/v1/distance-matrix{path}")
 
-@app.api_route("/distance-matrix", methods=["GET", "POST"])
-async def distance_matrix_proxy(request: Request):
-    return await proxy_request(request, f"{RIDER_SERVICE_URL}/api/v1/distance-matrix")
+# Composed ride documents, registered ahead of the /rides catch-all
+MAX_DETAIL_BATCH = int(os.getenv("GATEWAY_MAX_DETAIL_BATCH", "100"))
+
+@app.get("/rides/details", tags=["aggregation"])
+async def ride_details_batch(request: Request, ids: str = Query(..., description="Comma separated ride ids")):
+    try:
+        ride_ids = [int(ride_id) for ride_id in ids.split(",") if ride_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="ids must be integers")
+    if not ride_ids or len(ride_ids) > MAX_DETAIL_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Between 1 and {MAX_DETAIL_BATCH} ride ids are required"
+        )
+    identity = admit(request)
+    return {"rides": await ride_details(lambda upstream, path, body=None: fetch_json(request, upstream, path, identity, body), ride_ids)}
+
+@app.get("/rides/{ride_id}/details", tags=["aggregation"])
+async def ride_details_single(request: Request, ride_id: int):
+    identity = admit(request)
+    document = (await ride_details(lambda upstream, path, body=None: fetch_json(request, upstream, path, identity, body), [ride_id]))[0]
+    if document["ride"] is None:
+        error = document["errors"]["ride"]
+        raise HTTPException(status_code=error["status"], detail=error["detail"])
+    return document
 
 # Booking Service routes
 @app.api_route("/rides{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def booking_service_proxy(request: Request, path: str):
-    return await proxy_request(request, f"{BOOKING_SERVICE_URL}/api/v1/rides{path}")
+    return await forward(request, "booking_service", f"/api/v1/rides{path}")
 
-# Proxy function to forward requests to appropriate service
-async def proxy_request(request: Request, url: str):
-    # Get request method and body
-    method = request.method
-    
-    # Get query parameters
-    params = dict(request.query_params)
-    
-    # Get headers (exclude host)
-    headers = {k: v for k, v in request.headers.items() if k.lower() != "host"}
+# Token revocation, pushed by whoever revokes sessions
+def require_admin(admin_key):
+    if not GATEWAY_ADMIN_KEY or admin_key != GATEWAY_ADMIN_KEY:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+def require_authenticator(request: Request) -> EdgeAuthenticator:
+    if request.app.state.authenticator is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Edge authentication is disabled")
+    return request.app.state.authenticator
+
+@app.post("/auth/denylist", tags=["auth"])
+def update_denylist(update: DenylistUpdate, request: Request, x_gateway_admin_key: str = Header(None)):
+    require_admin(x_gateway_admin_key)
+    authenticator = require_authenticator(request)
+    authenticator.deny(tokens=update.tokens, token_digests=update.token_digests, user_ids=update.user_ids)
+    return authenticator.stats()["denylist"]
+
+@app.delete("/auth/denylist/users/{user_id}", tags=["auth"])
+def remove_user_from_denylist(user_id: int, request: Request, x_gateway_admin_key: str = Header(None)):
+    require_admin(x_gateway_admin_key)
+    authenticator = require_authenticator(request)
+    authenticator.allow(user_ids=[user_id])
+    return authenticator.stats()["denylist"]
+
+# Admission limits, changed at runtime without a restart
+@app.get("/admin/limits", tags=["admin"])
+def get_limits(request: Request, x_gateway_admin_key: str = Header(None)):
+    require_admin(x_gateway_admin_key)
+    return request.app.state.admission.stats()
+
+@app.put("/admin/limits", tags=["admin"])
+def update_limits(limits: AdmissionLimits, request: Request, x_gateway_admin_key: str = Header(None)):
+    require_admin(x_gateway_admin_key)
+    try:
+        request.app.state.admission.configure(limits)
+    except KeyError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown upstream: {e.args[0]}")
+    return request.app.state.admission.stats()
+
+# Metrics endpoint
+@app.get("/metrics", tags=["metrics"])
+def metrics(request: Request):
+    metrics = {
+        "admission": request.app.state.admission.stats(),
+        "response_cache": request.app.state.response_cache.stats(),
+        "coalescing": request.app.state.coalescer.stats(),
+        "resilience": {name: resilience.stats() for name, resilience in request.app.state.resilience.items()},
+        "upstreams": request.app.state.health_prober.snapshot(),
+    }
+    if request.app.state.authenticator is not None:
+        metrics["edge_auth"] = request.app.state.authenticator.stats()
+    return metrics
+
+# Verify the caller's bearer token, returns the identity headers to forward
+def edge_identity(request: Request) -> Dict[str, str]:
+    authenticator = request.app.state.authenticator
+    authorization = request.headers.get("authorization")
+    if authenticator is None or not authorization:
+        return {}
+    scheme, _, token = authorization.partition(" ")
+    claims = authenticator.verify(token) if scheme.lower() == "bearer" else None
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {IDENTITY_HEADER: str(claims["sub"])}
+
+# Authenticate the caller and apply the rate limits, returns the identity headers to forward
+def admit(request: Request) -> Dict[str, str]:
+    identity = edge_identity(request)
+    # Clients are the verified user when there is one, otherwise the remote address
+    client_key = identity.get(IDENTITY_HEADER) or (request.client.host if request.client else "unknown")
+    wait = request.app.state.admission.check_rate(client_key, request.method, request.url.path)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+    return identity
+
+# POST routes that only read, so they leave the response cache alone
+READ_ONLY_POST_ROUTES = {"/users/batch", "/riders/batch", "/rides/batch"}
+
+# Forward a request to an upstream service over its pooled client
+async def forward(request: Request, upstream: str, path: str):
+    prober = request.app.state.health_prober
+    if prober.is_down(upstream):
+        # Fail fast rather than queue callers behind connection timeouts
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service unavailable: {upstream} is failing health checks",
+            headers={"Retry-After": str(max(1, round(prober.interval)))},
+        )
     
+    identity = admit(request)
+    client = request.app.state.upstreams[upstream]
+    limiter = request.app.state.admission.upstream(upstream)
+    resilience = request.app.state.resilience[upstream]
+    cache = request.app.state.response_cache
     try:
-        # Get request body if applicable
-        body = None
-        if method in ["POST", "PUT", "PATCH"]:
-            body = await request.json()
-        
-        # Make request to service
-        async with httpx.AsyncClient() as client:
-            response = await client.request(
-                method=method,
-                url=url,
-                params=params,
-                headers=headers,
-                json=body,
-                timeout=30.0
-            )
-            
-            # Return response from service
-            return JSONResponse(
-                content=response.json(),
-                status_code=response.status_code,
-                headers=dict(response.headers)
-            )
-    except httpx.HTTPError as e:
+        route = cache.route_for(request)
+        try:
+            if route is not None:
+                return await forward_cached(request, client, limiter, resilience, path, cache, route, identity)
+            if request.method == "GET" and request.app.state.coalescer.covers(request.url.path):
+                # Shared calls are buffered, as one streamed body cannot be read by several clients
+                return buffered_response(*await fetch_shared(request, client, limiter, resilience, path, identity))
+        except StreamingUpstream:
+            # Event streams and exports are never buffered, send the request again as a plain stream
+            pass
+        # Only the wait for response headers holds a slot; the upstream has finished its work by then
+        async with limiter:
+            response = await proxy_request(request, client, path, identity, resilience)
+    except CircuitOpenError as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Service unavailable: {str(e)}"
+            detail=f"Service unavailable: {e}",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service overloaded: {upstream} {e}",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
         )
-    except Exception as e:
+    except httpx.HTTPError as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Internal server error: {str(e)}"
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Service unavailable: {str(e)}"
         )
+    
+    # A successful write drops the cached copies of the resource it touched
+    read_only = request.method == "POST" and request.url.path in READ_ONLY_POST_ROUTES
+    if request.method != "GET" and not read_only and 200 <= response.status_code < 300:
+        cache.invalidate(request.url.path)
+    return response
+
+# Serve a cacheable GET from the response cache, filling it from the upstream on a miss
+async def forward_cached(request: Request, client: httpx.AsyncClient, limiter: ConcurrencyLimiter,
+                         resilience: Resilience, path: str, cache: ResponseCache, route, identity: Dict[str, str]):
+    key = cache.key(request)
+    bypass = cache.bypass(request)
+    if not bypass:
+        entry = cache.get(key)
+        if entry is not None:
+            return cache.respond(request, entry, "HIT")
+    
+    status_code, headers, body = await fetch_shared(request, client, limiter, resilience, path, identity)
+    entry = None
+    if "no-store" not in request.headers.get("cache-control", "").lower():
+        entry = cache.put(key, route, status_code, headers, body)
+    if entry is not None:
+        return cache.respond(request, entry, "BYPASS" if bypass else "MISS")
+    return buffered_response(status_code, headers, body)
+
+# Read a whole GET response, joining an identical call already in flight; cache hits never get here
+async def fetch_shared(request: Request, client: httpx.AsyncClient, limiter: ConcurrencyLimiter,
+                       resilience: Resilience, path: str, identity: Dict[str, str]):
+    async def fetch():
+        async with limiter:
+            return await fetch_response(request, client, path, identity, resilience)
+    return await request.app.state.coalescer.do(coalesce_key(request), fetch)
+
+def buffered_response(status_code: int, headers, body: bytes) -> Response:
+    response = Response(content=body, status_code=status_code)
+    response.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers if name != "content-length"
+    ] + response.raw_headers
+    return response
+
+# GET one upstream resource as JSON for an aggregate; failures are returned, not raised
+async def fetch_json(request: Request, upstream: str, path: str, identity: Dict[str, str], json_body: Optional[Any] = None) -> Fetched:
+    if request.app.state.health_prober.is_down(upstream):
+        return Fetched(status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"{upstream} is failing health checks")
+    
+    headers = dict(identity)
+    if "authorization" in request.headers:
+        headers["authorization"] = request.headers["authorization"]
+    client = request.app.state.upstreams[upstream]
+    
+    # Batch lookups are POSTed but read-only, so they are retried and hedged like GETs
+    send = (lambda: client.get(path, headers=headers)) if json_body is None else (lambda: client.post(path, json=json_body, headers=headers))
+    
+    async def get():
+        async with request.app.state.admission.upstream(upstream):
+            return await request.app.state.resilience[upstream].call(send, idempotent=True)
+    
+    # Concurrent aggregates needing the same resource with the same credentials share the lookup
+    body_key = json.dumps(json_body, sort_keys=True) if json_body is not None else ""
+    key = ("aggregate", upstream, path, body_key, token_digest(headers["authorization"]) if "authorization" in headers else "")
+    try:
+        response = await request.app.state.coalescer.do(key, get)
+    except Overloaded as e:
+        return Fetched(status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"{upstream} overloaded: {e}")
+    except httpx.HTTPError as e:
+        return Fetched(status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Service unavailable: {str(e)}")
+    
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    if response.is_success:
+        return Fetched(response.status_code, body=body)
+    detail = body.get("detail") if isinstance(body, dict) else response.text
+    return Fetched(response.status_code, detail=detail)
 
 # Main entry point
 if __name__ == "__main__":
@@ -1,23 +1,69 @@
 import os
 import httpx
+from typing import Dict
 from fastapi import HTTPException, status
+from ride_sharing_common.resilience import resilience_from_env
 from app.data.schemas import RiderMatchResponse
 
 RIDE_MATCHING_SERVICE_URL = os.getenv("RIDE_MATCHING_SERVICE_URL", "http://ride-matching-service:8004")
+RIDER_SERVICE_URL = os.getenv("RIDER_SERVICE_URL", "http://rider-service:8002")
+
+# One pooled client and one breaker per upstream, shared by every request
+matching_client = httpx.AsyncClient(base_url=RIDE_MATCHING_SERVICE_URL, timeout=httpx.Timeout(10.0, connect=2.0))
+rider_client = httpx.AsyncClient(base_url=RIDER_SERVICE_URL, timeout=httpx.Timeout(10.0, connect=2.0))
+matching_resilience = resilience_from_env("ride_matching_service")
+rider_resilience = resilience_from_env("rider_service")
+
+async def close_clients() -> None:
+    await matching_client.aclose()
+    await rider_client.aclose()
+
+def resilience_stats() -> Dict:
+    return {
+        "ride_matching_service": matching_resilience.stats(),
+        "rider_service": rider_resilience.stats(),
+    }
 
 async def find_nearest_rider(user_id: int) -> RiderMatchResponse:
     """Gọi đến Ride Matching Service để tìm tài xế gần nhất."""
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(
-                f"{RIDE_MATCHING_SERVICE_URL}/api/v1/match",
-                json={"user_id": user_id}
-            )
-            response.raise_for_status()
-            match_result = response.json()
-            return RiderMatchResponse(**match_result)
-        except httpx.HTTPError as e:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail=f"Error finding nearest rider: {str(e)}"
-            )
+    try:
+        # Matching reserves a rider, so it is only retried when the request never got through
+        response = await matching_resilience.call(
+            lambda: matching_client.post("/api/v1/match", json={"user_id": user_id})
+        )
+        if response.status_code == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No available riders found")
+        response.raise_for_status()
+        match_result = response.json()
+        return RiderMatchResponse(**match_result)
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error finding nearest rider: {str(e)}"
+        )
+
+async def confirm_rider_reservation(rider_id: int, lease_id: str) -> bool:
+    """Confirm the lease taken by the matcher, False if the rider was lost in the meantime."""
+    try:
+        response = await rider_resilience.call(
+            lambda: rider_client.post(f"/api/v1/riders/{rider_id}/reservations/{lease_id}/confirm")
+        )
+        if response.status_code == status.HTTP_409_CONFLICT:
+            return False
+        response.raise_for_status()
+        return True
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error confirming rider reservation: {str(e)}"
+        )
+
+async def release_rider_reservation(rider_id: int, lease_id: str) -> None:
+    """Hand a reserved rider back; an expired lease is released by the Rider Service anyway."""
+    try:
+        await rider_resilience.call(
+            lambda: rider_client.delete(f"/api/v1/riders/{rider_id}/reservations/{lease_id}"),
+            idempotent=True,
+        )
+    except httpx.HTTPError:
+        pass
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, CheckConstraint, func
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, CheckConstraint, Index, func
 from app.data.database import Base
 
 class Ride(Base):
@@ -18,5 +18,9 @@ class Ride(Base):
     
     __table_args__ = (
         CheckConstraint("status IN ('Pending', 'In Progress', 'Completed', 'Canceled')"),
+        # Keyset pagination order, overall and per user or rider
+        Index("ix_booking_schema_rides_created_at_id", "created_at", "id"),
+        Index("ix_booking_schema_rides_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_booking_schema_rides_rider_id_created_at_id", "rider_id", "created_at", "id"),
         {"schema": "booking_schema"}
     )
\ No newline at end of file
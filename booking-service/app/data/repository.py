@@ -1,4 +1,8 @@
+from typing import List, Optional
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
+from ride_sharing_common.pagination import paginate
 from app.data.models import Ride
 
 def create_ride(db: Session, ride: Ride) -> Ride:
@@ -8,21 +12,25 @@ def create_ride(db: Session, ride: Ride) -> Ride:
     db.refresh(ride)
     return ride
 
-def get_rides(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieve all rides."""
-    return db.query(Ride).offset(skip).limit(limit).all()
+def get_rides(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of rides and the cursor of the next page."""
+    return paginate(db.query(Ride), Ride, skip, limit, cursor)
 
 def get_ride(db: Session, ride_id: int):
     """Retrieve a ride by ID."""
     return db.query(Ride).filter(Ride.id == ride_id).first()
 
-def get_user_rides(db: Session, user_id: int):
-    """Retrieve all rides for a specific user."""
-    return db.query(Ride).filter(Ride.user_id == user_id).all()
+def get_rides_by_ids(db: Session, ids: List[int]):
+    """Retrieve the rides with the given IDs in one query."""
+    return db.query(Ride).filter(Ride.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))).all()
 
-def get_rider_rides(db: Session, rider_id: int):
-    """Retrieve all rides for a specific rider."""
-    return db.query(Ride).filter(Ride.rider_id == rider_id).all()
+def get_user_rides(db: Session, user_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of rides for a specific user and the cursor of the next page."""
+    return paginate(db.query(Ride).filter(Ride.user_id == user_id), Ride, skip, limit, cursor)
+
+def get_rider_rides(db: Session, rider_id: int, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of rides for a specific rider and the cursor of the next page."""
+    return paginate(db.query(Ride).filter(Ride.rider_id == rider_id), Ride, skip, limit, cursor)
 
 def update_ride_status(db: Session, ride_id: int, status: str):
     """Update the status of a ride."""
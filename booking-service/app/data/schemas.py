@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
+import os
 
 class RideBase(BaseModel):
     user_id: int
@@ -32,6 +33,16 @@ class RideResponse(RideBase):
     class Config:
         from_attributes = True
 
+# Largest id list a batch lookup accepts
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+
+class BatchLookup(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class RideBatchResponse(BaseModel):
+    items: Dict[int, RideResponse]
+    missing: List[int]
+
 class RideRequest(BaseModel):
     user_id: int
     pickup_location: str
@@ -39,4 +50,5 @@ class RideRequest(BaseModel):
 
 class RiderMatchResponse(BaseModel):
     rider_id: int
-    distance_km: float
\ No newline at end of file
+    distance_km: float
+    lease_id: Optional[str] = None
\ No newline at end of file
@@ -1,4 +1,7 @@
+from typing import List, Optional
+from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
+from app.data.clients import confirm_rider_reservation, find_nearest_rider, release_rider_reservation
 from app.data.models import Ride
 from app.data.schemas import RideRequest, RideResponse, RideUpdate
 from app.service.fare import calculate_fare
@@ -6,24 +9,33 @@ from app.data.repository import (
     create_ride as create_ride_repo,
     get_rides as get_rides_repo,
     get_ride as get_ride_repo,
+    get_rides_by_ids as get_rides_by_ids_repo,
     get_user_rides as get_user_rides_repo,
     get_rider_rides as get_rider_rides_repo,
     update_ride_status as update_ride_status_repo,
 )
-import httpx
 import os
 
-RIDE_MATCHING_SERVICE_URL = os.getenv("RIDE_MATCHING_SERVICE_URL", "http://ride-matching-service:8004")
+# How many times to re-match when the reserved rider's lease is lost before it is confirmed
+BOOKING_MATCH_ATTEMPTS = int(os.getenv("BOOKING_MATCH_ATTEMPTS", "3"))
 
 async def create_ride_service(ride_request: RideRequest, db: Session) -> RideResponse:
     """Request a ride by finding the nearest available rider."""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{RIDE_MATCHING_SERVICE_URL}/api/v1/match", json={"user_id": ride_request.user_id})
-        response.raise_for_status()
-        match_result = response.json()
+    for _ in range(BOOKING_MATCH_ATTEMPTS):
+        match_result = await find_nearest_rider(ride_request.user_id)
 
-    rider_id = match_result["rider_id"]
-    distance_km = match_result["distance_km"]
+        # The matcher holds the rider under a lease; confirming it keeps the rider Busy for this ride
+        lease_id = match_result.lease_id
+        if lease_id is None or await confirm_rider_reservation(match_result.rider_id, lease_id):
+            break
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Matched riders were taken by other bookings, please retry"
+        )
+
+    rider_id = match_result.rider_id
+    distance_km = match_result.distance_km
     fare_amount = calculate_fare(distance_km)
 
     new_ride = Ride(
@@ -36,23 +48,34 @@ async def create_ride_service(ride_request: RideRequest, db: Session) -> RideRes
         status="Pending"
     )
 
-    return create_ride_repo(db, new_ride)
+    try:
+        return create_ride_repo(db, new_ride)
+    except Exception:
+        if lease_id is not None:
+            await release_rider_reservation(rider_id, lease_id)
+        raise
 
-def get_rides_service(db: Session, skip: int = 0, limit: int = 100):
-    """Get all rides."""
-    return get_rides_repo(db, skip, limit)
+def get_rides_service(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Get a page of rides and the cursor of the next page."""
+    return get_rides_repo(db, skip, limit, cursor)
 
 def get_ride_service(ride_id: int, db: Session):
     """Get a specific ride."""
     return get_ride_repo(db, ride_id)
 
-def get_user_rides_service(user_id: int, db: Session):
-    """Get all rides for a specific user."""
-    return get_user_rides_repo(db, user_id)
+def get_rides_by_ids_service(ids: List[int], db: Session):
+    """Retrieve rides by ID in one query, keyed by ID, plus the IDs that do not exist."""
+    unique_ids = list(dict.fromkeys(ids))
+    found = {item.id: item for item in get_rides_by_ids_repo(db, unique_ids)}
+    return {"items": found, "missing": [item_id for item_id in unique_ids if item_id not in found]}
+
+def get_user_rides_service(user_id: int, db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Get a page of rides for a specific user and the cursor of the next page."""
+    return get_user_rides_repo(db, user_id, skip, limit, cursor)
 
-def get_rider_rides_service(rider_id: int, db: Session):
-    """Get all rides for a specific rider."""
-    return get_rider_rides_repo(db, rider_id)
+def get_rider_rides_service(rider_id: int, db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Get a page of rides for a specific rider and the cursor of the next page."""
+    return get_rider_rides_repo(db, rider_id, skip, limit, cursor)
 
 def update_ride_status_service(ride_id: int, ride_update: RideUpdate, db: Session):
     """Update the status of a ride."""
@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from ride_sharing_common.pagination import NEXT_CURSOR_HEADER, InvalidCursor
 from app.data.database import get_db
-from app.data.schemas import RideRequest, RideResponse, RideUpdate
+from app.data.schemas import RideRequest, RideResponse, RideUpdate, BatchLookup, RideBatchResponse
 from app.service.booking_service import (
-    create_ride_service, get_rides_service, get_ride_service,
+    create_ride_service, get_rides_service, get_ride_service, get_rides_by_ids_service,
     get_user_rides_service, get_rider_rides_service, update_ride_status_service
 )
 
 router = APIRouter()
 
+def page(response: Response, fetch):
+    """Run a paginated query, exposing the next page's cursor in a header"""
+    try:
+        rows, next_cursor = fetch()
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
+
 @router.post("/rides/request", response_model=RideResponse)
 async def request_ride(ride_request: RideRequest, db: Session = Depends(get_db)):
     """API endpoint to request a ride."""
@@ -17,9 +28,15 @@ async def request_ride(ride_request: RideRequest, db: Session = Depends(get_db))
     return ride
 
 @router.get("/rides", response_model=List[RideResponse])
-def get_rides(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """API endpoint to get a list of rides."""
-    return get_rides_service(db, skip, limit)
+def get_rides(response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+              db: Session = Depends(get_db)):
+    """API endpoint to get a page of rides; pass X-Next-Cursor back as `cursor` for the next one."""
+    return page(response, lambda: get_rides_service(db, skip, limit, cursor))
+
+@router.post("/rides/batch", response_model=RideBatchResponse)
+def get_rides_batch(lookup: BatchLookup, db: Session = Depends(get_db)):
+    """API endpoint to get many rides by ID at once; unknown IDs are listed under `missing`."""
+    return get_rides_by_ids_service(lookup.ids, db)
 
 @router.get("/rides/{ride_id}", response_model=RideResponse)
 def get_ride(ride_id: int, db: Session = Depends(get_db)):
@@ -30,14 +47,16 @@ def get_ride(ride_id: int, db: Session = Depends(get_db)):
     return ride
 
 @router.get("/users/{user_id}/rides", response_model=List[RideResponse])
-def get_user_rides(user_id: int, db: Session = Depends(get_db)):
-    """API endpoint to get a user's rides."""
-    return get_user_rides_service(user_id, db)
+def get_user_rides(user_id: int, response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000),
+                   cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """API endpoint to get a page of a user's rides, oldest first."""
+    return page(response, lambda: get_user_rides_service(user_id, db, skip, limit, cursor))
 
 @router.get("/riders/{rider_id}/rides", response_model=List[RideResponse])
-def get_rider_rides(rider_id: int, db: Session = Depends(get_db)):
-    """API endpoint to get a rider's rides."""
-    return get_rider_rides_service(rider_id, db)
+def get_rider_rides(rider_id: int, response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000),
+                    cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """API endpoint to get a page of a rider's rides, oldest first."""
+    return page(response, lambda: get_rider_rides_service(rider_id, db, skip, limit, cursor))
 
 @router.patch("/rides/{ride_id}/status", response_model=RideResponse)
 def update_ride_status(ride_id: int, ride_update: RideUpdate, db: Session = Depends(get_db)):
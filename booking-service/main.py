@@ -1,17 +1,26 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.web.routes import bookings
+from app.data.clients import close_clients, resilience_stats
 from app.data.database import engine, Base
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Close the pooled upstream clients on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_clients()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Booking Service",
     description="Service for managing ride bookings and fare calculations",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -31,6 +40,11 @@ app.include_router(bookings.router, prefix="/api/v1", tags=["bookings"])
 def health_check():
     return {"status": "healthy", "service": "booking-service"}
 
+# Circuit breaker and retry counters for the services booking calls
+@app.get("/metrics", tags=["metrics"])
+def metrics():
+    return {"resilience": resilience_stats()}
+
 # Main entry point
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+import httpx
+
+# Upstream statuses worth another attempt: the request was not served, not refused
+RETRYABLE_STATUSES = {502, 503, 504}
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised without calling the upstream while its circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit open for {name}")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and consecutive failures are counted.
+    Open: after `failure_threshold` failures in a row calls fail immediately
+    for `recovery_timeout` seconds.
+    Half-open: then up to `half_open_max_calls` trial calls are let through;
+    a success closes the circuit again, a failure re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 10.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_calls = 0
+
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not go out"""
+        if self.state == "open":
+            remaining = self.opened_at + self.recovery_timeout - time.monotonic()
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = "half_open"
+            self.opened_at = time.monotonic()
+            self._trial_calls = 0
+        if self.state == "half_open":
+            # A trial call that never reported back (e.g. cancelled) must not wedge the circuit
+            if time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.opened_at = time.monotonic()
+                self._trial_calls = 0
+            if self._trial_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.recovery_timeout)
+            self._trial_calls += 1
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, for the hedging delay"""
+
+    def __init__(self, window: int = 200):
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def _close_discarded(task: asyncio.Task) -> None:
+    # A losing attempt may still have produced a response; release its connection
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().aclose())
+
+class Resilience:
+    """
+    Circuit breaker, retries and hedging for calls to one upstream.
+
+    Every call runs under a deadline that covers all of its attempts. Retries
+    back off with full jitter and stop as soon as the deadline could not be
+    met. Idempotent calls are retried on transport errors and 502/503/504;
+    other calls only when the connection could not be made, so the request
+    never reached the upstream. Idempotent calls may also be hedged: when
+    the first attempt is slower than the upstream's p95, a second one is sent
+    and whichever answers first wins.
+    """
+
+    def __init__(self, name: str, breaker: Optional[CircuitBreaker] = None, attempts: int = 3,
+                 base_delay: float = 0.05, max_delay: float = 1.0, deadline: float = 5.0,
+                 hedge: bool = False, hedge_min_delay: float = 0.01):
+        self.name = name
+        self.breaker = breaker if breaker is not None else CircuitBreaker(name)
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = LatencyTracker()
+
+        self.calls = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]], idempotent: bool = False,
+                   deadline: Optional[float] = None) -> httpx.Response:
+        """
+        Run `send` under the breaker and retry policy. Raises CircuitOpenError
+        while the circuit is open and httpx.TimeoutException once the deadline
+        has passed. Responses of discarded attempts are closed here, so `send`
+        may return streamed responses.
+        """
+        self.calls += 1
+        deadline_at = time.monotonic() + (deadline if deadline is not None else self.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            remaining = deadline_at - time.monotonic()
+            try:
+                if idempotent and self.hedge:
+                    response = await self._hedged(send, remaining)
+                else:
+                    response = await self._timed(send, remaining)
+            except httpx.HTTPError as e:
+                self.breaker.record_failure()
+                retryable = isinstance(e, httpx.TransportError) if idempotent else isinstance(e, (httpx.ConnectError, httpx.PoolTimeout))
+                if not retryable or not await self._backoff(attempt, deadline_at):
+                    raise
+                continue
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            if not idempotent or response.status_code not in RETRYABLE_STATUSES:
+                return response
+            if not await self._backoff(attempt, deadline_at):
+                return response
+            await response.aclose()
+
+    async def _backoff(self, attempt: int, deadline_at: float) -> bool:
+        """Sleep before the next attempt, False when there is no attempt or time left for one"""
+        if attempt >= self.attempts:
+            return False
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if time.monotonic() + delay >= deadline_at:
+            return False
+        self.retries += 1
+        await asyncio.sleep(delay)
+        return True
+
+    async def _timed(self, send: Callable[[], Awaitable[httpx.Response]], timeout: float) -> httpx.Response:
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(send(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise httpx.TimeoutException(f"Deadline exceeded calling {self.name}")
+        if response.status_code < 500:
+            self.latency.record(time.monotonic() - start)
+        return response
+
+    async def _hedged(self, send: Callable[[], Awaitable[httpx.Response]], timeout: float) -> httpx.Response:
+        p95 = self.latency.percentile(0.95)
+        first = asyncio.ensure_future(self._timed(send, timeout))
+        if p95 is None:
+            return await first
+        hedge_delay = max(p95, self.hedge_min_delay)
+        if hedge_delay >= timeout:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        second = asyncio.ensure_future(self._timed(send, timeout - hedge_delay))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_close_discarded)
+
+    def stats(self) -> Dict:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "circuit": self.breaker.stats(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+        }
+
+def resilience_from_env(name: str, default_deadline: float = 5.0) -> Resilience:
+    """
+    A breaker and retry policy for one upstream, configured the same way in
+    every service: CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_SECONDS,
+    RETRY_ATTEMPTS, RETRY_BASE_DELAY_MS, UPSTREAM_DEADLINE_SECONDS and
+    HEDGE_IDEMPOTENT_REQUESTS (off by default, as a hedge adds upstream load).
+    """
+    return Resilience(
+        name,
+        CircuitBreaker(
+            name,
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            recovery_timeout=float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "10")),
+        ),
+        attempts=int(os.getenv("RETRY_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("RETRY_BASE_DELAY_MS", "50")) / 1000,
+        deadline=float(os.getenv("UPSTREAM_DEADLINE_SECONDS", str(default_deadline))),
+        # Send a second idempotent call when the first is slower than the upstream's p95
+        hedge=os.getenv("HEDGE_IDEMPOTENT_REQUESTS", "false").lower() == "true",
+    )
@@ -0,0 +1,22 @@
+from typing import AsyncIterator
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a byte stream into lines without reading all of it. Lines stay bytes
+    so one undecodable line can be rejected on its own with decode_line.
+    """
+    pending = b""
+    async for data in stream:
+        pending += data
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            yield line.rstrip(b"\r")
+    if pending:
+        yield pending.rstrip(b"\r")
+
+def decode_line(line: bytes) -> str:
+    """Decode one line as UTF-8, raising ValueError with a short reason otherwise"""
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Not valid UTF-8 text (byte {e.start + 1})") from None
@@ -12,6 +12,22 @@ CREATE TABLE IF NOT EXISTS user_schema.users (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Keyset pagination order
+CREATE INDEX IF NOT EXISTS ix_user_schema_users_created_at_id ON user_schema.users (created_at, id);
+
+-- Change counter for riders: every insert or update takes the next value
+CREATE SEQUENCE IF NOT EXISTS rider_schema.rider_version_seq;
+
+-- Versions are taken through this function, which holds a shared advisory lock keyed on the
+-- sequence until the writing transaction ends; the change feed reads the lock's holders to
+-- tell which versions may still be uncommitted
+CREATE OR REPLACE FUNCTION rider_schema.next_rider_version() RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared('rider_schema.rider_version_seq'::regclass::oid::bigint);
+    RETURN nextval('rider_schema.rider_version_seq');
+END
+$$ LANGUAGE plpgsql VOLATILE;
+
 -- Riders table
 CREATE TABLE IF NOT EXISTS rider_schema.riders (
     id SERIAL PRIMARY KEY,
@@ -20,18 +36,31 @@ CREATE TABLE IF NOT EXISTS rider_schema.riders (
     license_plate VARCHAR(20) NOT NULL,
     rating DECIMAL(3, 2) DEFAULT 5.0,
     status VARCHAR(20) DEFAULT 'Available' CHECK (status IN ('Available', 'Busy')),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    version BIGINT NOT NULL DEFAULT rider_schema.next_rider_version(),
+    lease_id VARCHAR(64),
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    latitude DOUBLE PRECISION,
+    longitude DOUBLE PRECISION,
+    location_updated_at TIMESTAMP WITH TIME ZONE
 );
 
--- Distance matrix for user-rider combinations
+CREATE INDEX IF NOT EXISTS ix_rider_schema_riders_version ON rider_schema.riders (version);
+CREATE INDEX IF NOT EXISTS ix_rider_schema_riders_lease_expires_at ON rider_schema.riders (lease_expires_at);
+CREATE INDEX IF NOT EXISTS ix_rider_schema_riders_created_at_id ON rider_schema.riders (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_rider_schema_riders_available ON rider_schema.riders (vehicle_type, id) WHERE status = 'Available';
+
+-- Distance matrix for user-rider combinations; the unique key also serves per-user reads
 CREATE TABLE IF NOT EXISTS rider_schema.distance_matrix (
     id SERIAL PRIMARY KEY,
-    rider_name VARCHAR(100) NOT NULL,
+    user_id INT NOT NULL,
     rider_id INT NOT NULL,
     distance_km DECIMAL(5, 2) NOT NULL,
-    UNIQUE (rider_name, rider_id)
+    CONSTRAINT unique_user_rider_distance UNIQUE (user_id, rider_id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_rider_schema_distance_matrix_rider_id ON rider_schema.distance_matrix (rider_id);
+
 -- Rides table
 CREATE TABLE IF NOT EXISTS booking_schema.rides (
     id SERIAL PRIMARY KEY,
@@ -46,6 +75,11 @@ CREATE TABLE IF NOT EXISTS booking_schema.rides (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Keyset pagination order, overall and per user or rider
+CREATE INDEX IF NOT EXISTS ix_booking_schema_rides_created_at_id ON booking_schema.rides (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_booking_schema_rides_user_id_created_at_id ON booking_schema.rides (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_booking_schema_rides_rider_id_created_at_id ON booking_schema.rides (rider_id, created_at, id);
+
 -- Populate distance matrix with dummy data (5 users, 5 riders)
 INSERT INTO rider_schema.distance_matrix (user_id, rider_id, distance_km) VALUES
 -- User 1 distances
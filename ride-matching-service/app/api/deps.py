@@ -0,0 +1,12 @@
+from typing import Optional
+from fastapi import Request
+from app.dispatch import BatchDispatcher
+from app.distance_matrix import DistanceMatrixService
+
+def get_distance_service(request: Request) -> DistanceMatrixService:
+    """Get the process-wide distance service created at startup"""
+    return request.app.state.distance_service
+
+def get_dispatcher(request: Request) -> Optional[BatchDispatcher]:
+    """Get the windowed batch dispatcher, or None when matching runs in greedy mode"""
+    return request.app.state.dispatcher
@@ -0,0 +1,24 @@
+import asyncio
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, status
+from app.api.deps import get_distance_service
+from app.distance_matrix import DistanceMatrixService
+
+router = APIRouter()
+
+@router.get("/distance-matrix")
+def get_distance_matrix_info(distance_service: DistanceMatrixService = Depends(get_distance_service)):
+    """Describe the distance matrix currently in use"""
+    return distance_service.matrix.stats()
+
+@router.post("/distance-matrix/reload")
+async def reload_distance_matrix(distance_service: DistanceMatrixService = Depends(get_distance_service)):
+    """Reload the distance matrix from its source without restarting the service"""
+    try:
+        matrix = await asyncio.to_thread(distance_service.reload_matrix)
+    except (OSError, ValueError, httpx.HTTPError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Could not load distance matrix: {str(e)}"
+        )
+    return matrix.stats()
@@ -1,13 +1,56 @@
+from typing import Optional
+import httpx
 from fastapi import APIRouter, Depends, HTTPException, status
+from app.api.deps import get_dispatcher, get_distance_service
+from app.dispatch import BatchDispatcher
 from app.distance_matrix import DistanceMatrixService
-from app.schemas import MatchingRequest, MatchingResponse
+from app.schemas import (
+    MatchingRequest, MatchingResponse, BatchMatchingRequest, BatchMatchingResponse,
+    CandidatesRequest, CandidatesResponse,
+)
 
 router = APIRouter()
 
+def pickup_of(request: MatchingRequest):
+    if request.pickup_latitude is not None and request.pickup_longitude is not None:
+        return (request.pickup_latitude, request.pickup_longitude)
+    return None
+
+def match_fields(result):
+    rider_id, distance, lease = result
+    return {
+        "rider_id": rider_id,
+        "distance_km": distance,
+        "lease_id": lease["lease_id"] if lease else None,
+        "lease_expires_at": lease["lease_expires_at"] if lease else None,
+    }
+
+def ensure_cache_ready(distance_service: DistanceMatrixService):
+    if not distance_service.rider_cache.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Rider availability cache is not ready"
+        )
+
 @router.post("/match", response_model=MatchingResponse)
-async def match_rider(request: MatchingRequest, distance_service: DistanceMatrixService = Depends()):
+async def match_rider(
+    request: MatchingRequest,
+    distance_service: DistanceMatrixService = Depends(get_distance_service),
+    dispatcher: Optional[BatchDispatcher] = Depends(get_dispatcher),
+):
     """Find the nearest available rider for a user"""
-    result = await distance_service.find_nearest_rider(request.user_id)
+    ensure_cache_ready(distance_service)
+    
+    try:
+        if dispatcher is not None:
+            result = await dispatcher.submit(request.user_id, pickup_of(request))
+        else:
+            result = await distance_service.reserve_nearest_rider(request.user_id, pickup_of(request))
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error reserving rider: {str(e)}"
+        )
     
     if not result:
         raise HTTPException(
@@ -15,5 +58,37 @@ async def match_rider(request: MatchingRequest, distance_service: DistanceMatrix
             detail="No available riders found"
         )
     
-    rider_id, distance = result
-    return {"rider_id": rider_id, "distance_km": distance}
\ No newline at end of file
+    return match_fields(result)
+
+@router.post("/match/candidates", response_model=CandidatesResponse)
+def match_candidates(request: CandidatesRequest, distance_service: DistanceMatrixService = Depends(get_distance_service)):
+    """Rank the best available riders for a user without reserving any of them"""
+    ensure_cache_ready(distance_service)
+    
+    candidates = distance_service.rank_candidates(
+        request.user_id,
+        pickup_of(request),
+        k=request.k,
+        vehicle_type=request.vehicle_type,
+        max_distance_km=request.max_distance_km,
+        min_rating=request.min_rating,
+    )
+    return {"user_id": request.user_id, "candidates": candidates}
+
+@router.post("/match/batch", response_model=BatchMatchingResponse)
+async def match_riders_batch(request: BatchMatchingRequest, distance_service: DistanceMatrixService = Depends(get_distance_service)):
+    """Assign riders to many users at once, minimising the total pickup distance"""
+    ensure_cache_ready(distance_service)
+    
+    try:
+        results = await distance_service.match_batch([(r.user_id, pickup_of(r)) for r in request.requests])
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error reserving riders: {str(e)}"
+        )
+    matches = []
+    for match_request, result in zip(request.requests, results):
+        fields = match_fields(result) if result else {}
+        matches.append({"user_id": match_request.user_id, **fields})
+    return {"matches": matches}
@@ -0,0 +1,82 @@
+import numpy as np
+from typing import Tuple
+
+def solve_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum-cost assignment of rows to columns (Hungarian method).
+
+    Uses the shortest augmenting path formulation, O(n^2 * m), with the inner
+    column scan vectorized. Rectangular matrices are supported; every row is
+    assigned when rows <= columns, otherwise every column is. Infinite costs
+    mark forbidden pairs and are never part of the result, so fewer pairs may
+    be returned. Returns (row_indices, col_indices) sorted by row.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.ndim != 2:
+        raise ValueError("cost must be a 2-D matrix")
+    n_rows, n_cols = cost.shape
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    if n_rows == 0 or n_cols == 0:
+        return empty
+
+    allowed = np.isfinite(cost)
+    if not allowed.any():
+        return empty
+
+    transposed = n_rows > n_cols
+    work = cost.T if transposed else cost
+    if not allowed.all():
+        # Replace forbidden pairs with a cost larger than any complete finite assignment
+        low, high = cost[allowed].min(), cost[allowed].max()
+        penalty = high + (high - low + 1.0) * (min(n_rows, n_cols) + 1)
+        work = np.where(np.isfinite(work), work, penalty)
+
+    n, m = work.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    # p[j]: 1-based row matched to column j (0 = free); column 0 is the augmenting root
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = work[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            used_cols = np.flatnonzero(used)
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+
+    keep = allowed[rows, cols]
+    rows, cols = rows[keep], cols[keep]
+    order = np.argsort(rows)
+    return rows[order].astype(np.int64), cols[order].astype(np.int64)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+from app.distance_matrix import DistanceMatrixService, Match, Pickup
+
+class BatchDispatcher:
+    """
+    Windowed dispatch: match requests arriving within `window_seconds` of each
+    other are solved together as one assignment problem, and every waiting
+    caller receives its own result. A batch is flushed early once it reaches
+    `max_batch_size`.
+    """
+
+    def __init__(self, distance_service: DistanceMatrixService, window_seconds: float = 0.2,
+                 max_batch_size: int = 256, max_candidates: int = 50):
+        self.distance_service = distance_service
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.max_candidates = max_candidates
+
+        self._pending: List[Tuple[int, Pickup, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+
+        self.batches = 0
+        self.requests = 0
+        self.unmatched = 0
+        self.largest_batch = 0
+        self.last_flush_ms = 0.0
+
+    async def submit(self, user_id: int, pickup: Pickup = None) -> Optional[Match]:
+        """Queue a match request and wait for the batch it lands in to be solved"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((user_id, pickup, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, self._schedule_flush)
+        return await future
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[Tuple[int, Pickup, asyncio.Future]]) -> None:
+        # Callers that gave up while waiting do not take a rider
+        batch = [entry for entry in batch if not entry[2].done()]
+        if not batch:
+            return
+        start = time.perf_counter()
+        try:
+            results = await self.distance_service.match_batch(
+                [(user_id, pickup) for user_id, pickup, _ in batch],
+                max_candidates=self.max_candidates,
+            )
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, _, future), result in zip(batch, results):
+            if result is None:
+                self.unmatched += 1
+            if not future.done():
+                future.set_result(result)
+
+    async def stop(self) -> None:
+        """Flush whatever is still queued and wait for in-flight batches"""
+        self._schedule_flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "window_ms": self.window_seconds * 1000,
+            "max_batch_size": self.max_batch_size,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "requests": self.requests,
+            "unmatched": self.unmatched,
+            "largest_batch": self.largest_batch,
+            "average_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+        }
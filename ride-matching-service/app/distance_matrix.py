@@ -1,56 +1,293 @@
-import os
-import httpx
 import random
-from typing import Dict, List, Optional, Tuple
+import asyncio
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.assignment import solve_assignment
+from app.dense_matrix import DenseDistanceMatrix, load_distance_matrix
+from app.distance_providers import MatrixDistanceProvider, build_distance_provider
+from app.rider_cache import RiderAvailabilityCache, RiderColumns
+from app.reservations import RiderReserver
+from app.scoring import CandidateScorer
+from app.sharding import ShardRouter
+
+Pickup = Optional[Tuple[float, float]]
+# (rider_id, distance_km, lease) where lease is None when reservations are disabled
+Match = Tuple[int, float, Optional[Dict]]
 
 class DistanceMatrixService:
-    def __init__(self):
-        self.rider_service_url = os.getenv("RIDER_SERVICE_URL", "http://rider-service:8002")
-        self.distance_matrix = {
-            # Pre-defined distance matrix as specified in the requirements
-            (1, 1): 8.0, (1, 2): 5.0, (1, 3): 6.0, (1, 4): 2.0, (1, 5): 7.0,
-            (2, 1): 3.0, (2, 2): 9.0, (2, 3): 4.0, (2, 4): 6.0, (2, 5): 1.0,
-            (3, 1): 5.0, (3, 2): 2.0, (3, 3): 8.0, (3, 4): 7.0, (3, 5): 4.0,
-            (4, 1): 6.0, (4, 2): 10.0, (4, 3): 3.0, (4, 4): 1.0, (4, 5): 9.0,
-            (5, 1): 7.0, (5, 2): 4.0, (5, 3): 2.0, (5, 4): 9.0, (5, 5): 5.0
-        }
-    
-    def get_distance(self, user_id: int, rider_id: int) -> float:
-        """Get the distance between a user and a rider"""
-        return self.distance_matrix.get((user_id, rider_id), random.uniform(1.0, 10.0))
-    
-    async def get_available_riders(self) -> List[Dict]:
-        """Get list of available riders from the Rider Service"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.rider_service_url}/api/v1/riders")
-            response.raise_for_status()
-            riders = response.json()
-            return [rider for rider in riders if rider["status"] == "Available"]
-    
-    async def find_nearest_rider(self, user_id: int) -> Optional[Tuple[int, float]]:
+    """
+    Process-wide matching service: scores users against the available riders held
+    by the availability cache. Distances come from a chain of distance providers,
+    by default the dense distance matrix and then great-circle distance from the
+    pickup point. Riders with no known distance are never matched.
+    """
+    
+    def __init__(self, rider_cache: RiderAvailabilityCache, reserver: Optional[RiderReserver] = None,
+                 max_reserve_attempts: int = 5, matrix_path: Optional[str] = None,
+                 scorer: Optional[CandidateScorer] = None, distance_providers: Sequence[str] = ("matrix", "haversine"),
+                 routing_table_path: Optional[str] = None, distance_cache_size: int = 100000,
+                 distance_cache_ttl_seconds: float = 300.0, shard_router: Optional[ShardRouter] = None,
+                 pickup_candidate_factor: int = 4):
+        self.rider_cache = rider_cache
+        # Nearest-rider searches around a pickup run in the shard workers when set
+        self.shard_router = shard_router
+        self.reserver = reserver
+        self.max_reserve_attempts = max_reserve_attempts
+        self.scorer = scorer if scorer is not None else CandidateScorer()
+        # Around a pickup, this many times `k` straight-line neighbours are measured by the providers
+        self.pickup_candidate_factor = max(1, pickup_candidate_factor)
+        self.matrix_path = matrix_path
+        self.matrix_provider = MatrixDistanceProvider(load_distance_matrix(matrix_path))
+        self.provider = build_distance_provider(
+            distance_providers,
+            self.matrix_provider,
+            routing_table_path=routing_table_path,
+            cache_size=distance_cache_size,
+            cache_ttl_seconds=distance_cache_ttl_seconds,
+        )
+    
+    @property
+    def matrix(self) -> DenseDistanceMatrix:
+        return self.matrix_provider.matrix
+    
+    def reload_matrix(self) -> DenseDistanceMatrix:
+        """Reload the distance matrix from its source and swap it in atomically"""
+        self.matrix_provider.matrix = load_distance_matrix(self.matrix_path)
+        return self.matrix
+    
+    def get_distance(self, user_id: int, rider_id: int, pickup: Pickup = None) -> Optional[float]:
+        """Get the distance between a user and a rider, None when it is unknown"""
+        if pickup is not None:
+            return self.provider.distance(None, pickup, rider_id, self.rider_cache.index.position(rider_id))
+        return self.provider.distance(user_id, None, rider_id)
+    
+    def distances(self, user_id: int, pickup: Pickup, columns: RiderColumns,
+                  selected: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the distances from a user to many riders in one bulk provider call, NaN
+        where unknown. A pickup point replaces the user's own row in the matrix.
+        """
+        if selected is None:
+            selected = np.arange(len(columns.ids))
+        if pickup is not None:
+            user_id = None
+        return self.provider.distances(
+            user_id, pickup, columns.ids[selected], columns.latitudes[selected], columns.longitudes[selected]
+        )
+    
+    def rerank(self, pickup: Tuple[float, float], nearby: Sequence[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+        """
+        Measure riders found near a pickup by straight-line distance through the
+        distance providers, returning the `k` closest as (rider_id, distance).
+        """
+        positions = [(rider_id, self.rider_cache.index.position(rider_id)) for rider_id, _ in nearby]
+        positions = [(rider_id, position) for rider_id, position in positions if position is not None]
+        if not positions or k <= 0:
+            return []
+        rider_ids = np.array([rider_id for rider_id, _ in positions], dtype=np.int64)
+        latitudes = np.array([position[0] for _, position in positions], dtype=np.float64)
+        longitudes = np.array([position[1] for _, position in positions], dtype=np.float64)
+        distances = self.provider.distances(None, pickup, rider_ids, latitudes, longitudes)
+        known = np.flatnonzero(~np.isnan(distances))
+        top = known[np.argsort(distances[known], kind="stable")][:k]
+        return [(int(rider_ids[i]), float(distances[i])) for i in top]
+    
+    def _pickup_pool(self, k: int) -> int:
+        return k * self.pickup_candidate_factor
+    
+    def get_available_riders(self) -> List[Dict]:
+        """Get list of available riders from the local availability cache"""
+        return self.rider_cache.available_riders()
+    
+    async def find_nearest_rider(self, user_id: int, pickup: Pickup = None) -> Optional[Tuple[int, float]]:
         """Find the nearest available rider for a user"""
-        available_riders = await self.get_available_riders()
+        if self._sharded(pickup):
+            nearest = self.rerank(pickup, await self.shard_router.nearest(pickup[0], pickup[1], k=self._pickup_pool(1)), 1)
+            if nearest:
+                return nearest[0]
         
-        if not available_riders:
+        # With a pickup position, only the grid cells around it need to be searched
+        if pickup is not None and len(self.rider_cache.index):
+            nearest = self.rank_riders(user_id, pickup, k=1)
+            if nearest:
+                return nearest[0]
+        
+        # Score the user's row against every available rider at once
+        columns = self.rider_cache.available_columns()
+        distances = self.distances(user_id, None, columns)
+        known = np.flatnonzero(~np.isnan(distances))
+        if not len(known):
             return None
+        closest_riders = known[distances[known] == distances[known].min()]
         
-        # Calculate distances to all available riders
-        distances = []
-        for rider in available_riders:
-            rider_id = rider["id"]
-            distance = self.get_distance(user_id, rider_id)
-            distances.append((rider_id, distance))
+        # If multiple riders have the same distance, choose one randomly
+        closest = random.choice(closest_riders) if len(closest_riders) > 1 else closest_riders[0]
+        return int(columns.ids[closest]), float(distances[closest])
+    
+    def rank_riders(self, user_id: int, pickup: Pickup = None, k: int = 10) -> List[Tuple[int, float]]:
+        """Get up to `k` available riders closest to the user as (rider_id, distance), closest first"""
+        if pickup is not None and len(self.rider_cache.index):
+            # The grid finds straight-line neighbours; the providers decide their order
+            return self.rerank(pickup, self.rider_cache.index.nearest(pickup[0], pickup[1], k=self._pickup_pool(k)), k)
         
-        # Find the minimum distance
-        if not distances:
-            return None
+        columns = self.rider_cache.available_columns()
+        distances = self.distances(user_id, None, columns)
+        known = np.flatnonzero(~np.isnan(distances))
+        if not len(known) or k <= 0:
+            return []
+        if k < len(known):
+            known = known[np.argpartition(distances[known], k - 1)[:k]]
+        top = known[np.argsort(distances[known], kind="stable")]
+        return [(int(columns.ids[i]), float(distances[i])) for i in top]
+    
+    def _sharded(self, pickup: Pickup) -> bool:
+        return self.shard_router is not None and pickup is not None and len(self.shard_router) > 0
+    
+    async def rank_many(self, requests: Sequence[Tuple[int, Pickup]], k: int = 10) -> List[List[Tuple[int, float]]]:
+        """rank_riders for many requests, sending all pickup searches to the shards in one round"""
+        ranked: List[Optional[List[Tuple[int, float]]]] = [None] * len(requests)
+        sharded = [i for i, (_, pickup) in enumerate(requests) if self._sharded(pickup)]
+        if sharded:
+            nearest = await self.shard_router.nearest_many([requests[i][1] for i in sharded], k=self._pickup_pool(k))
+            for i, candidates in zip(sharded, nearest):
+                ranked[i] = self.rerank(requests[i][1], candidates, k)
+        for i, (user_id, pickup) in enumerate(requests):
+            if ranked[i] is None:
+                ranked[i] = self.rank_riders(user_id, pickup, k=k)
+        return ranked
+    
+    def rank_candidates(self, user_id: int, pickup: Pickup = None, k: int = 5,
+                        vehicle_type: Optional[str] = None, max_distance_km: Optional[float] = None,
+                        min_rating: Optional[float] = None) -> List[Dict]:
+        """
+        Get up to `k` available riders ordered by score, best first.
+
+        Filters are applied to the rider columns before any distance is computed,
+        and the distance cut before scoring, so only eligible riders are scored.
+        """
+        columns = self.rider_cache.available_columns()
+        keep = np.ones(len(columns.ids), dtype=bool)
+        if vehicle_type is not None:
+            keep &= columns.vehicle_types == vehicle_type
+        if min_rating is not None:
+            keep &= columns.ratings >= min_rating
         
-        min_distance = min(distances, key=lambda x: x[1])
+        # Measure from the pickup point when riders report positions, as rank_riders does
+        if pickup is not None and len(self.rider_cache.index):
+            keep &= ~np.isnan(columns.latitudes)
+        else:
+            pickup = None
+        selected = np.flatnonzero(keep)
+        distances = self.distances(user_id, pickup, columns, selected)
         
-        # Find all riders with the minimum distance
-        closest_riders = [d for d in distances if d[1] == min_distance[1]]
+        # Unknown distances compare false, so they are pruned along with the far riders
+        within = distances <= max_distance_km if max_distance_km is not None else ~np.isnan(distances)
+        selected, distances = selected[within], distances[within]
+        if not len(selected) or k <= 0:
+            return []
         
-        # If multiple riders have the same distance, choose one randomly
-        if len(closest_riders) > 1:
-            return random.choice(closest_riders)
-        return closest_riders[0]
\ No newline at end of file
+        scores = self.scorer.score(distances, columns.ratings[selected], columns.vehicle_types[selected])
+        if k < len(scores):
+            top = np.argpartition(scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((distances[top], scores[top]))]
+        
+        candidates = []
+        for i in top:
+            rating = columns.ratings[selected[i]]
+            candidates.append({
+                "rider_id": int(columns.ids[selected[i]]),
+                "distance_km": float(distances[i]),
+                "rating": None if np.isnan(rating) else float(rating),
+                "vehicle_type": columns.vehicle_types[selected[i]],
+                "score": float(scores[i]),
+            })
+        return candidates
+    
+    def assign_batch(self, requests: Sequence[Tuple[int, Pickup]], max_candidates: int = 50,
+                     ranked: Optional[List[List[Tuple[int, float]]]] = None) -> List[Optional[Tuple[int, float]]]:
+        """
+        Assign riders to a batch of (user_id, pickup) requests minimising total distance.
+
+        Each user only competes for its nearest candidates. When the batch has no more
+        users than `max_candidates`, that restriction cannot change the optimum: a user
+        placed outside its own top-n riders could always swap to a free one that is closer.
+        Pass `ranked` to reuse candidate lists computed elsewhere, e.g. by the shards.
+        """
+        if not requests:
+            return []
+        if ranked is None:
+            k = min(len(requests), max_candidates)
+            ranked = [self.rank_riders(user_id, pickup, k=k) for user_id, pickup in requests]
+        
+        rows = np.fromiter((i for i, candidates in enumerate(ranked) for _ in candidates), dtype=np.int64)
+        if not len(rows):
+            return [None] * len(requests)
+        candidate_ids = np.fromiter((rider_id for candidates in ranked for rider_id, _ in candidates), dtype=np.int64)
+        candidate_distances = np.fromiter((d for candidates in ranked for _, d in candidates), dtype=np.float64)
+        
+        # One column per distinct candidate rider; pairs outside a user's candidates stay forbidden
+        rider_ids, cols = np.unique(candidate_ids, return_inverse=True)
+        cost = np.full((len(requests), len(rider_ids)), np.inf)
+        cost[rows, cols] = candidate_distances
+        
+        assigned_rows, assigned_cols = solve_assignment(cost)
+        results: List[Optional[Tuple[int, float]]] = [None] * len(requests)
+        for i, j in zip(assigned_rows, assigned_cols):
+            results[i] = (int(rider_ids[j]), float(cost[i, j]))
+        return results
+    
+    async def reserve(self, rider_id: int) -> Optional[Dict]:
+        """Reserve a rider in the Rider Service, hiding it locally while the claim is in flight"""
+        rider = self.rider_cache.claim(rider_id)
+        try:
+            return await self.reserver.reserve(rider_id)
+        except Exception:
+            # The outcome is unknown; let the next sync decide whether the rider is still free
+            if rider is not None:
+                self.rider_cache.restore(rider)
+            raise
+    
+    async def reserve_nearest_rider(self, user_id: int, pickup: Pickup = None,
+                                    exclude: Sequence[int] = ()) -> Optional[Match]:
+        """Reserve the closest rider, falling through to the next-best candidate on contention"""
+        if self.reserver is None:
+            result = await self.find_nearest_rider(user_id, pickup)
+            return (result[0], result[1], None) if result else None
+        
+        attempts = 0
+        while attempts < self.max_reserve_attempts:
+            ranked = await self.rank_many([(user_id, pickup)], k=self.max_reserve_attempts + len(exclude))
+            candidates = [c for c in ranked[0] if c[0] not in exclude][:self.max_reserve_attempts - attempts]
+            if not candidates:
+                return None
+            for rider_id, distance in candidates:
+                attempts += 1
+                lease = await self.reserve(rider_id)
+                if lease is not None:
+                    return rider_id, distance, lease
+        return None
+    
+    async def match_batch(self, requests: Sequence[Tuple[int, Pickup]], max_candidates: int = 50) -> List[Optional[Match]]:
+        """Assign a batch of requests together, then reserve every assigned rider"""
+        ranked = await self.rank_many(requests, k=min(len(requests), max_candidates)) if requests else []
+        assignments = self.assign_batch(requests, max_candidates=max_candidates, ranked=ranked)
+        if self.reserver is None:
+            return [(a[0], a[1], None) if a else None for a in assignments]
+        
+        assigned = [a[0] for a in assignments if a]
+        
+        async def reserve_assignment(request, assignment):
+            if assignment is None:
+                return None
+            rider_id, distance = assignment
+            lease = await self.reserve(rider_id)
+            if lease is not None:
+                return rider_id, distance, lease
+            # Lost the rider to a concurrent match: fall back to the best rider outside this batch
+            return await self.reserve_nearest_rider(request[0], request[1], exclude=assigned)
+        
+        return list(await asyncio.gather(*(
+            reserve_assignment(request, assignment) for request, assignment in zip(requests, assignments)
+        )))
@@ -0,0 +1,256 @@
+import csv
+import math
+from abc import ABC, abstractmethod
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.dense_matrix import DenseDistanceMatrix
+from app.spatial_index import KM_PER_DEGREE, haversine_km_many
+
+Point = Optional[Tuple[float, float]]
+
+class DistanceProvider(ABC):
+    """
+    Source of user-to-rider distances.
+
+    `origin` is the pickup point when the caller has one, in which case the
+    distance is measured from that point rather than looked up by user id.
+    Rider positions come as parallel latitude/longitude arrays, NaN where a
+    rider has not reported one. Unknown distances are returned as NaN; a
+    provider never guesses.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def distances(self, user_id: Optional[int], origin: Point, rider_ids: np.ndarray,
+                  latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        """Distances to many riders at once, NaN where unknown"""
+
+    def distance(self, user_id: Optional[int], origin: Point, rider_id: int,
+                 position: Point = None) -> Optional[float]:
+        """Distance to a single rider, None when unknown"""
+        latitude, longitude = position if position is not None else (np.nan, np.nan)
+        result = self.distances(
+            user_id, origin,
+            np.array([rider_id], dtype=np.int64),
+            np.array([latitude], dtype=np.float64),
+            np.array([longitude], dtype=np.float64),
+        )[0]
+        return None if np.isnan(result) else float(result)
+
+    def stats(self) -> Dict:
+        return {"provider": self.name}
+
+class MatrixDistanceProvider(DistanceProvider):
+    """Looks distances up by (user_id, rider_id) in the dense distance matrix"""
+
+    name = "matrix"
+
+    def __init__(self, matrix: DenseDistanceMatrix):
+        self.matrix = matrix
+
+    def distances(self, user_id, origin, rider_ids, latitudes, longitudes):
+        if user_id is None:
+            return np.full(len(rider_ids), np.nan)
+        return self.matrix.row(user_id, rider_ids)
+
+    def stats(self) -> Dict:
+        return {"provider": self.name, **self.matrix.stats()}
+
+class HaversineDistanceProvider(DistanceProvider):
+    """Great-circle distance from the pickup point to each rider's last position"""
+
+    name = "haversine"
+
+    def distances(self, user_id, origin, rider_ids, latitudes, longitudes):
+        if origin is None:
+            return np.full(len(rider_ids), np.nan)
+        return haversine_km_many(origin[0], origin[1], latitudes, longitudes)
+
+class RoutingTableDistanceProvider(DistanceProvider):
+    """
+    Local stand-in for a routing engine. Road distances between grid cells are
+    read from a CSV table (origin_lat, origin_lon, destination_lat,
+    destination_lon, distance_km); pairs missing from the table fall back to
+    the great-circle distance scaled by `detour_factor`.
+    """
+
+    name = "routing"
+
+    def __init__(self, table_path: Optional[str] = None, detour_factor: float = 1.3, cell_size_km: float = 1.0):
+        self.table_path = table_path
+        self.detour_factor = detour_factor
+        self.cell_size_deg = cell_size_km / KM_PER_DEGREE
+        self.table: Dict[Tuple[int, int, int, int], float] = {}
+        if table_path:
+            self.load(table_path)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (math.floor(latitude / self.cell_size_deg), math.floor(longitude / self.cell_size_deg))
+
+    def load(self, table_path: str) -> None:
+        table = {}
+        with open(table_path, newline="") as f:
+            for row in csv.DictReader(f):
+                origin = self._cell(float(row["origin_lat"]), float(row["origin_lon"]))
+                destination = self._cell(float(row["destination_lat"]), float(row["destination_lon"]))
+                table[origin + destination] = float(row["distance_km"])
+        self.table = table
+
+    def distances(self, user_id, origin, rider_ids, latitudes, longitudes):
+        if origin is None:
+            return np.full(len(rider_ids), np.nan)
+        distances = haversine_km_many(origin[0], origin[1], latitudes, longitudes) * self.detour_factor
+        if self.table:
+            origin_cell = self._cell(*origin)
+            rows = np.floor(latitudes / self.cell_size_deg)
+            cols = np.floor(longitudes / self.cell_size_deg)
+            for i in np.flatnonzero(~np.isnan(distances)):
+                routed = self.table.get(origin_cell + (int(rows[i]), int(cols[i])))
+                if routed is not None:
+                    distances[i] = routed
+        return distances
+
+    def stats(self) -> Dict:
+        return {"provider": self.name, "table_entries": len(self.table), "detour_factor": self.detour_factor}
+
+class FallbackDistanceProvider(DistanceProvider):
+    """Asks each provider in turn, only for the riders the previous ones left unknown"""
+
+    name = "fallback"
+
+    def __init__(self, providers: Sequence[DistanceProvider]):
+        self.providers = list(providers)
+
+    def distances(self, user_id, origin, rider_ids, latitudes, longitudes):
+        distances = np.full(len(rider_ids), np.nan)
+        unknown = np.arange(len(rider_ids))
+        for provider in self.providers:
+            if not len(unknown):
+                break
+            distances[unknown] = provider.distances(
+                user_id, origin, rider_ids[unknown], latitudes[unknown], longitudes[unknown]
+            )
+            unknown = unknown[np.isnan(distances[unknown])]
+        return distances
+
+    def stats(self) -> Dict:
+        return {"provider": self.name, "chain": [provider.stats() for provider in self.providers]}
+
+class CachedDistanceProvider(DistanceProvider):
+    """
+    Bounded LRU cache with a TTL in front of another provider.
+
+    Entries are keyed by the origin and destination rounded to `precision`
+    decimal places (4 places is roughly 11 m), so nearby lookups share an
+    entry. Only point-to-point lookups are cached; id lookups without an
+    origin are already a single array gather and go straight through.
+    Misses from a bulk call are computed in one call to the wrapped provider.
+    """
+
+    def __init__(self, provider: DistanceProvider, max_entries: int = 100000,
+                 ttl_seconds: float = 300.0, precision: int = 4):
+        self.provider = provider
+        self.name = provider.name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.precision = precision
+        self._entries: "OrderedDict[Tuple[float, float, float, float], Tuple[float, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def distances(self, user_id, origin, rider_ids, latitudes, longitudes):
+        if origin is None:
+            return self.provider.distances(user_id, origin, rider_ids, latitudes, longitudes)
+
+        origin_key = (round(origin[0], self.precision), round(origin[1], self.precision))
+        destination_lats = np.round(latitudes, self.precision).tolist()
+        destination_lons = np.round(longitudes, self.precision).tolist()
+        now = time.monotonic()
+
+        distances = np.full(len(rider_ids), np.nan)
+        keys: List[Tuple[float, float, float, float]] = []
+        missing: List[int] = []
+        for i, destination in enumerate(zip(destination_lats, destination_lons)):
+            key = origin_key + destination
+            keys.append(key)
+            # Riders without a position cannot be measured from a point
+            if math.isnan(destination[0]) or math.isnan(destination[1]):
+                continue
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    distances[i] = entry[0]
+                    self.hits += 1
+                    continue
+                del self._entries[key]
+                self.expirations += 1
+            missing.append(i)
+
+        if missing:
+            self.misses += len(missing)
+            missing = np.array(missing, dtype=np.int64)
+            computed = self.provider.distances(
+                user_id, origin, rider_ids[missing], latitudes[missing], longitudes[missing]
+            )
+            distances[missing] = computed
+            expires_at = now + self.ttl_seconds
+            for i, distance in zip(missing.tolist(), computed.tolist()):
+                if not math.isnan(distance):
+                    self._entries[keys[i]] = (distance, expires_at)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return distances
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            **self.provider.stats(),
+            "cache": {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            },
+        }
+
+def build_distance_provider(names: Sequence[str], matrix_provider: MatrixDistanceProvider,
+                            routing_table_path: Optional[str] = None, cache_size: int = 100000,
+                            cache_ttl_seconds: float = 300.0, cache_precision: int = 4) -> DistanceProvider:
+    """
+    Chain the named providers in order. Routing lookups go through the LRU cache
+    unless cache_size is 0; matrix and haversine lookups are cheap array maths and
+    would only churn the cache, so they are never cached.
+    """
+    providers = []
+    for name in names:
+        name = name.strip()
+        if name == "matrix":
+            providers.append(matrix_provider)
+        elif name == "haversine":
+            providers.append(HaversineDistanceProvider())
+        elif name == "routing":
+            provider = RoutingTableDistanceProvider(table_path=routing_table_path)
+            if cache_size > 0:
+                provider = CachedDistanceProvider(provider, max_entries=cache_size,
+                                                  ttl_seconds=cache_ttl_seconds, precision=cache_precision)
+            providers.append(provider)
+        elif name:
+            raise ValueError(f"Unknown distance provider: {name}")
+    if not providers:
+        raise ValueError("At least one distance provider is required")
+    return providers[0] if len(providers) == 1 else FallbackDistanceProvider(providers)
@@ -0,0 +1,61 @@
+import httpx
+from typing import Dict, Optional
+from ride_sharing_common.resilience import Resilience
+
+class RiderReserver:
+    """Claims riders in the Rider Service under a short lease before they are handed out"""
+
+    def __init__(self, rider_service_url: str, lease_ttl_seconds: int = 30, max_in_flight: int = 10,
+                 resilience: Optional[Resilience] = None):
+        self.rider_service_url = rider_service_url
+        self.resilience = resilience if resilience is not None else Resilience("rider_service")
+        self.lease_ttl_seconds = lease_ttl_seconds
+        # Queue here rather than pile onto the Rider Service's small DB pool
+        self.max_in_flight = max_in_flight
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.reserved = 0
+        self.contended = 0
+        self.errors = 0
+
+    async def start(self) -> None:
+        self._client = httpx.AsyncClient(
+            base_url=self.rider_service_url,
+            timeout=httpx.Timeout(5.0, pool=30.0),
+            limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight),
+        )
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def reserve(self, rider_id: int) -> Optional[Dict]:
+        """Reserve a rider, returns the lease or None if someone else holds the rider"""
+        try:
+            # Only retried when the request never got through, so a rider is never reserved twice
+            response = await self.resilience.call(
+                lambda: self._client.post(
+                    f"/api/v1/riders/{rider_id}/reservations",
+                    json={"ttl_seconds": self.lease_ttl_seconds},
+                )
+            )
+        except httpx.HTTPError:
+            self.errors += 1
+            raise
+        if response.status_code in (404, 409):
+            self.contended += 1
+            return None
+        if response.is_error:
+            self.errors += 1
+        response.raise_for_status()
+        self.reserved += 1
+        return response.json()
+
+    def stats(self) -> Dict:
+        return {
+            "lease_ttl_seconds": self.lease_ttl_seconds,
+            "reserved": self.reserved,
+            "contended": self.contended,
+            "errors": self.errors,
+        }
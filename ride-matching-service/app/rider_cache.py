@@ -0,0 +1,232 @@
+import asyncio
+import time
+import httpx
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional
+from ride_sharing_common.resilience import Resilience
+from app.spatial_index import SpatialIndex
+
+class RiderColumns(NamedTuple):
+    """Available riders as parallel arrays, one entry per rider"""
+    ids: np.ndarray
+    ratings: np.ndarray
+    vehicle_types: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+
+def _float_or_nan(value) -> float:
+    return np.nan if value is None else float(value)
+
+class RiderAvailabilityCache:
+    """
+    Local table of available riders, kept in sync with the Rider Service.
+
+    The cache bootstraps by paging through `/api/v1/riders/changes` from version 0
+    and then polls the same endpoint for riders changed since the last applied
+    version. Match requests only read from memory. Every change carries the full
+    rider row, so re-applying a change is harmless, and a periodic full resync
+    heals any change that was committed out of version order.
+
+    Listeners (objects with clear, apply and remove methods) are told about
+    every change after it is applied locally, so other views of the rider
+    table such as the matching shards stay in step with the cache.
+    """
+
+    def __init__(self, rider_service_url: str, rider_index: Optional[SpatialIndex] = None,
+                 poll_interval: float = 1.0, resync_interval: float = 300.0, page_size: int = 1000,
+                 resilience: Optional[Resilience] = None):
+        self.rider_service_url = rider_service_url
+        self.resilience = resilience if resilience is not None else Resilience("rider_service")
+        self.index = rider_index if rider_index is not None else SpatialIndex()
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.page_size = page_size
+
+        self._riders: Dict[int, Dict] = {}
+        # Available riders as column arrays, rebuilt lazily after the table changes
+        self._columns: Optional[RiderColumns] = None
+        # Latest version seen per rider, so late or replayed changes never roll a rider back
+        self._seen_versions: Dict[int, int] = {}
+        self.listeners: List = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.ready = False
+        self.version = 0
+        self.head_version = 0
+        self.last_sync_at: Optional[float] = None
+        self.last_bootstrap_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.syncs = 0
+        self.sync_errors = 0
+        self.bootstraps = 0
+        self.changes_applied = 0
+
+    async def start(self) -> None:
+        """Start syncing in the background; the first iteration bootstraps the table"""
+        self._client = httpx.AsyncClient(base_url=self.rider_service_url, timeout=10.0)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                resync_due = (
+                    self.last_bootstrap_at is None
+                    or time.monotonic() - self.last_bootstrap_at >= self.resync_interval
+                )
+                if resync_due:
+                    await self.bootstrap()
+                else:
+                    await self.sync()
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self.sync_errors += 1
+                self.last_error = str(e) or e.__class__.__name__
+            await asyncio.sleep(self.poll_interval)
+
+    async def _fetch_changes(self, since: int) -> Dict:
+        response = await self.resilience.call(
+            lambda: self._client.get("/api/v1/riders/changes", params={"since": since, "limit": self.page_size}),
+            idempotent=True,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def bootstrap(self) -> None:
+        """Reload the full rider table and rebuild the spatial index"""
+        riders: Dict[int, Dict] = {}
+        since = 0
+        head_version = 0
+        while True:
+            page = await self._fetch_changes(since)
+            head_version = max(head_version, page["version"])
+            for rider in page["changes"]:
+                riders[rider["id"]] = rider
+                since = max(since, rider["version"])
+            if not page["has_more"]:
+                break
+
+        # Swap in the new table only once it has been fully downloaded
+        self._riders = {}
+        self._columns = None
+        self._seen_versions = {}
+        self.index.clear()
+        for listener in self.listeners:
+            listener.clear()
+        self.version = 0
+        self._apply(riders.values())
+        self.version = since
+        self.head_version = max(head_version, since)
+        self.ready = True
+        self.bootstraps += 1
+        self.last_bootstrap_at = self.last_sync_at = time.monotonic()
+        self.last_error = None
+
+    async def sync(self) -> int:
+        """Apply every change newer than the applied version, returns the number applied"""
+        applied = 0
+        while True:
+            page = await self._fetch_changes(self.version)
+            applied += self._apply(page["changes"])
+            self.head_version = max(self.head_version, page["version"], self.version)
+            if not page["has_more"]:
+                break
+        self.syncs += 1
+        self.last_sync_at = time.monotonic()
+        self.last_error = None
+        return applied
+
+    def _apply(self, changes) -> int:
+        applied = []
+        for rider in changes:
+            rider_id = rider["id"]
+            if rider["version"] < self._seen_versions.get(rider_id, 0):
+                continue
+            self._seen_versions[rider_id] = rider["version"]
+            if rider["status"] == "Available":
+                self._riders[rider_id] = rider
+                latitude, longitude = rider.get("latitude"), rider.get("longitude")
+                if latitude is not None and longitude is not None:
+                    self.index.update(rider_id, latitude, longitude)
+                else:
+                    self.index.remove(rider_id)
+            else:
+                self._riders.pop(rider_id, None)
+                self.index.remove(rider_id)
+            self.version = max(self.version, rider["version"])
+            applied.append(rider)
+        if applied:
+            self._columns = None
+            for listener in self.listeners:
+                listener.apply(applied)
+        self.changes_applied += len(applied)
+        return len(applied)
+
+    def claim(self, rider_id: int) -> Optional[Dict]:
+        """Hide a rider from local matching while it is being reserved"""
+        self.index.remove(rider_id)
+        rider = self._riders.pop(rider_id, None)
+        if rider is not None:
+            self._columns = None
+            for listener in self.listeners:
+                listener.remove(rider_id)
+        return rider
+
+    def restore(self, rider: Dict) -> None:
+        """Undo a claim, unless a newer change for the rider has arrived since"""
+        if rider["version"] >= self._seen_versions.get(rider["id"], 0):
+            self._apply([rider])
+
+    def available_riders(self) -> List[Dict]:
+        """Get the available riders currently held in memory"""
+        return list(self._riders.values())
+
+    def available_columns(self) -> RiderColumns:
+        """Get the available riders as column arrays for vectorized filtering and scoring"""
+        if self._columns is None:
+            riders = list(self._riders.values())
+            count = len(riders)
+            self._columns = RiderColumns(
+                ids=np.fromiter((r["id"] for r in riders), dtype=np.int64, count=count),
+                ratings=np.fromiter((_float_or_nan(r.get("rating")) for r in riders), dtype=np.float64, count=count),
+                vehicle_types=np.array([r.get("vehicle_type") for r in riders], dtype=object),
+                latitudes=np.fromiter((_float_or_nan(r.get("latitude")) for r in riders), dtype=np.float64, count=count),
+                longitudes=np.fromiter((_float_or_nan(r.get("longitude")) for r in riders), dtype=np.float64, count=count),
+            )
+        return self._columns
+
+    def available_ids(self) -> np.ndarray:
+        """Get the ids of the available riders as an int64 array"""
+        return self.available_columns().ids
+
+    def __len__(self) -> int:
+        return len(self._riders)
+
+    def stats(self) -> Dict:
+        """Cache size, staleness and replication lag"""
+        now = time.monotonic()
+        return {
+            "ready": self.ready,
+            "available_riders": len(self._riders),
+            "indexed_riders": len(self.index),
+            "version": self.version,
+            "head_version": self.head_version,
+            "lag_versions": max(0, self.head_version - self.version),
+            "staleness_seconds": None if self.last_sync_at is None else round(now - self.last_sync_at, 3),
+            "syncs": self.syncs,
+            "bootstraps": self.bootstraps,
+            "sync_errors": self.sync_errors,
+            "changes_applied": self.changes_applied,
+            "last_error": self.last_error,
+        }
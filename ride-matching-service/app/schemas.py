@@ -1,8 +1,44 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
 
 class MatchingRequest(BaseModel):
     user_id: int
+    pickup_latitude: Optional[float] = None
+    pickup_longitude: Optional[float] = None
 
 class MatchingResponse(BaseModel):
     rider_id: int
-    distance_km: float
\ No newline at end of file
+    distance_km: float
+    lease_id: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+
+class CandidatesRequest(MatchingRequest):
+    k: int = Field(5, ge=1, le=100)
+    vehicle_type: Optional[str] = None
+    max_distance_km: Optional[float] = Field(None, gt=0)
+    min_rating: Optional[float] = Field(None, ge=0, le=5)
+
+class RiderCandidate(BaseModel):
+    rider_id: int
+    distance_km: float
+    rating: Optional[float] = None
+    vehicle_type: Optional[str] = None
+    score: float
+
+class CandidatesResponse(BaseModel):
+    user_id: int
+    candidates: List[RiderCandidate]
+
+class BatchMatchingRequest(BaseModel):
+    requests: List[MatchingRequest] = Field(..., min_length=1, max_length=1000)
+
+class BatchMatchResult(BaseModel):
+    user_id: int
+    rider_id: Optional[int] = None
+    distance_km: Optional[float] = None
+    lease_id: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+
+class BatchMatchingResponse(BaseModel):
+    matches: List[BatchMatchResult]
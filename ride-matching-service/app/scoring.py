@@ -0,0 +1,48 @@
+import numpy as np
+from typing import Dict, Optional
+
+# Ratings run from 0 to 5; a rider below the top rating pays for the gap
+MAX_RATING = 5.0
+
+def parse_vehicle_penalties(value: Optional[str]) -> Dict[str, float]:
+    """Parse "Car:0,Bike:1.5" into {"Car": 0.0, "Bike": 1.5}"""
+    penalties = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        vehicle_type, _, penalty = item.partition(":")
+        penalties[vehicle_type.strip()] = float(penalty)
+    return penalties
+
+class CandidateScorer:
+    """
+    Linear score over rider columns, lower is better:
+
+        distance_weight * distance_km
+        + rating_weight * (5 - rating)
+        + vehicle_penalties[vehicle_type]
+
+    Weights are in km-equivalents, so a rating_weight of 2 means one rating
+    point is worth two kilometres of extra pickup distance.
+    """
+
+    def __init__(self, distance_weight: float = 1.0, rating_weight: float = 1.0,
+                 vehicle_penalties: Optional[Dict[str, float]] = None):
+        self.distance_weight = distance_weight
+        self.rating_weight = rating_weight
+        self.vehicle_penalties = vehicle_penalties or {}
+
+    def score(self, distances: np.ndarray, ratings: np.ndarray, vehicle_types: np.ndarray) -> np.ndarray:
+        """Score many riders at once; missing ratings count as the lowest rating"""
+        rating_gap = MAX_RATING - np.nan_to_num(ratings, nan=0.0)
+        scores = self.distance_weight * distances + self.rating_weight * rating_gap
+        for vehicle_type, penalty in self.vehicle_penalties.items():
+            scores[vehicle_types == vehicle_type] += penalty
+        return scores
+
+    def stats(self) -> Dict:
+        return {
+            "distance_weight": self.distance_weight,
+            "rating_weight": self.rating_weight,
+            "vehicle_penalties": self.vehicle_penalties,
+        }
@@ -0,0 +1,231 @@
+import asyncio
+import math
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from app.spatial_index import KM_PER_DEGREE, SpatialIndex
+
+Nearest = List[Tuple[int, float]]
+
+# State owned by a shard worker process; each shard runs in its own single-process pool
+_shard_index: Optional[SpatialIndex] = None
+
+def _init_shard(cell_size_km: float) -> None:
+    global _shard_index
+    _shard_index = SpatialIndex(cell_size_km=cell_size_km)
+
+def _shard_clear() -> None:
+    _shard_index.clear()
+
+def _shard_update(positions: List[Tuple[int, float, float]]) -> None:
+    for rider_id, lat, lon in positions:
+        _shard_index.update(rider_id, lat, lon)
+
+def _shard_remove(rider_ids: List[int]) -> None:
+    for rider_id in rider_ids:
+        _shard_index.remove(rider_id)
+
+def _shard_nearest(queries: List[Tuple[float, float]], k: int) -> List[Nearest]:
+    return [_shard_index.nearest(lat, lon, k=k) for lat, lon in queries]
+
+def _shard_size() -> int:
+    return len(_shard_index)
+
+def merge_nearest(results: Iterable[Nearest], k: int) -> Nearest:
+    """Merge per-shard nearest lists into the overall k nearest, closest first"""
+    merged = sorted((item for result in results for item in result), key=lambda item: (item[1], item[0]))
+    seen = set()
+    nearest = []
+    for rider_id, distance in merged:
+        if rider_id not in seen:
+            seen.add(rider_id)
+            nearest.append((rider_id, distance))
+            if len(nearest) == k:
+                break
+    return nearest
+
+class ShardRouter:
+    """
+    Splits the city into square zones of `zone_size_km` and hands every zone to
+    one of `num_shards` worker processes. Each worker holds the spatial index
+    for the riders in its zones and answers nearest-rider queries for them, so
+    the searches run on several cores instead of the front process's event loop.
+
+    The router listens to the rider availability cache and forwards every change
+    to the shard owning the rider's zone, moving riders between shards as they
+    cross zone borders. Updates and queries to one shard are processed in
+    submission order, so a query never sees a rider removed before it was sent.
+
+    A query goes to the shards owning any zone within `border_km` of the pickup.
+    When their k-th rider is further away than `border_km`, a closer rider could
+    still sit in another zone, and the remaining shards are queried as well.
+    """
+
+    def __init__(self, num_shards: int, zone_size_km: float = 5.0, border_km: float = 1.0,
+                 cell_size_km: float = 0.25):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.num_shards = num_shards
+        self.zone_size_km = zone_size_km
+        self.zone_size_deg = zone_size_km / KM_PER_DEGREE
+        self.border_km = border_km
+        self.cell_size_km = cell_size_km
+        self._executors: List[ProcessPoolExecutor] = []
+        # Shard currently holding each indexed rider
+        self._rider_shard: Dict[int, int] = {}
+
+        self.queries = 0
+        self.cross_shard_queries = 0
+        self.expanded_queries = 0
+        self.update_errors = 0
+
+    def start(self) -> None:
+        # Spawn rather than fork so workers do not inherit the event loop and open sockets
+        context = multiprocessing.get_context("spawn")
+        self._executors = [
+            ProcessPoolExecutor(max_workers=1, mp_context=context,
+                                initializer=_init_shard, initargs=(self.cell_size_km,))
+            for _ in range(self.num_shards)
+        ]
+
+    def stop(self) -> None:
+        for executor in self._executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._executors = []
+
+    def zone_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.zone_size_deg), math.floor(lon / self.zone_size_deg))
+
+    def shard_of_zone(self, zone: Tuple[int, int]) -> int:
+        return (zone[0] * 7919 + zone[1]) % self.num_shards
+
+    def shard_of(self, lat: float, lon: float) -> int:
+        return self.shard_of_zone(self.zone_of(lat, lon))
+
+    def shards_near(self, lat: float, lon: float, radius_km: float) -> Set[int]:
+        """Shards owning any zone that overlaps the box around a circle of `radius_km`"""
+        lat_span = radius_km / KM_PER_DEGREE
+        edge_lat = min(89.9, abs(lat) + lat_span)
+        lon_span = min(180.0, radius_km / (KM_PER_DEGREE * math.cos(math.radians(edge_lat))))
+        min_row, min_col = self.zone_of(lat - lat_span, lon - lon_span)
+        max_row, max_col = self.zone_of(lat + lat_span, lon + lon_span)
+        shards = set()
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                shards.add(self.shard_of_zone((row, col)))
+                if len(shards) == self.num_shards:
+                    return shards
+        return shards
+
+    def _submit(self, shard: int, fn, *args) -> Future:
+        return self._executors[shard].submit(fn, *args)
+
+    def _track(self, future: Future) -> None:
+        def done(f: Future) -> None:
+            if not f.cancelled() and f.exception() is not None:
+                self.update_errors += 1
+        future.add_done_callback(done)
+
+    # Availability cache listener
+
+    def clear(self) -> None:
+        self._rider_shard.clear()
+        for shard in range(self.num_shards):
+            self._track(self._submit(shard, _shard_clear))
+
+    def apply(self, riders: Sequence[Dict]) -> None:
+        updates: Dict[int, List[Tuple[int, float, float]]] = defaultdict(list)
+        removals: Dict[int, List[int]] = defaultdict(list)
+        for rider in riders:
+            rider_id = rider["id"]
+            lat, lon = rider.get("latitude"), rider.get("longitude")
+            shard = None
+            if rider["status"] == "Available" and lat is not None and lon is not None:
+                shard = self.shard_of(lat, lon)
+            previous = self._rider_shard.get(rider_id)
+            if previous is not None and previous != shard:
+                removals[previous].append(rider_id)
+            if shard is None:
+                self._rider_shard.pop(rider_id, None)
+            else:
+                self._rider_shard[rider_id] = shard
+                updates[shard].append((rider_id, lat, lon))
+        for shard, rider_ids in removals.items():
+            self._track(self._submit(shard, _shard_remove, rider_ids))
+        for shard, positions in updates.items():
+            self._track(self._submit(shard, _shard_update, positions))
+
+    def remove(self, rider_id: int) -> None:
+        shard = self._rider_shard.pop(rider_id, None)
+        if shard is not None:
+            self._track(self._submit(shard, _shard_remove, [rider_id]))
+
+    # Queries
+
+    def __len__(self) -> int:
+        return len(self._rider_shard)
+
+    async def _query(self, plan: Dict[int, List[int]], queries: Sequence[Tuple[float, float]],
+                     k: int, results: List[List[Nearest]]) -> None:
+        shards = list(plan)
+        answers = await asyncio.gather(*(
+            asyncio.wrap_future(self._submit(shard, _shard_nearest, [queries[i] for i in plan[shard]], k))
+            for shard in shards
+        ))
+        for shard, answer in zip(shards, answers):
+            for i, nearest in zip(plan[shard], answer):
+                results[i].append(nearest)
+
+    async def nearest_many(self, queries: Sequence[Tuple[float, float]], k: int = 1) -> List[Nearest]:
+        """k nearest riders for many pickups, with one message per shard involved"""
+        results: List[List[Nearest]] = [[] for _ in queries]
+        asked: List[Set[int]] = []
+        plan: Dict[int, List[int]] = defaultdict(list)
+        for i, (lat, lon) in enumerate(queries):
+            shards = self.shards_near(lat, lon, self.border_km)
+            asked.append(shards)
+            if len(shards) > 1:
+                self.cross_shard_queries += 1
+            for shard in shards:
+                plan[shard].append(i)
+        self.queries += len(queries)
+        await self._query(plan, queries, k, results)
+
+        merged = [merge_nearest(result, k) for result in results]
+        expand: Dict[int, List[int]] = defaultdict(list)
+        for i, nearest in enumerate(merged):
+            if len(asked[i]) < self.num_shards and (len(nearest) < k or nearest[-1][1] > self.border_km):
+                self.expanded_queries += 1
+                for shard in range(self.num_shards):
+                    if shard not in asked[i]:
+                        expand[shard].append(i)
+        if expand:
+            await self._query(expand, queries, k, results)
+            for i in {i for indices in expand.values() for i in indices}:
+                merged[i] = merge_nearest(results[i], k)
+        return merged
+
+    async def nearest(self, lat: float, lon: float, k: int = 1) -> Nearest:
+        return (await self.nearest_many([(lat, lon)], k=k))[0]
+
+    async def shard_sizes(self) -> List[int]:
+        """Riders indexed by each shard, as reported by the workers themselves"""
+        return list(await asyncio.gather(*(
+            asyncio.wrap_future(self._submit(shard, _shard_size)) for shard in range(self.num_shards)
+        )))
+
+    def stats(self) -> Dict:
+        sizes = [0] * self.num_shards
+        for shard in self._rider_shard.values():
+            sizes[shard] += 1
+        return {
+            "shards": self.num_shards,
+            "zone_size_km": self.zone_size_km,
+            "border_km": self.border_km,
+            "riders_per_shard": sizes,
+            "queries": self.queries,
+            "cross_shard_queries": self.cross_shard_queries,
+            "expanded_queries": self.expanded_queries,
+            "update_errors": self.update_errors,
+        }
@@ -0,0 +1,200 @@
+import math
+import heapq
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+Cell = Tuple[int, int]
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def haversine_km_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distances from one coordinate to many, NaN where a coordinate is missing"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    d_lambda = np.radians(lons - lon)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+class SpatialIndex:
+    """
+    Uniform grid bucket index over rider coordinates.
+
+    Riders are bucketed into square cells of `cell_size_km` (measured along a
+    meridian). Nearest and radius queries walk outward from the query cell and
+    stop as soon as no unvisited cell can hold a closer rider, so they only
+    touch the cells around the pickup point instead of every rider.
+    """
+
+    def __init__(self, cell_size_km: float = 0.25):
+        if cell_size_km <= 0:
+            raise ValueError("cell_size_km must be positive")
+        self.cell_size_km = cell_size_km
+        self.cell_size_deg = cell_size_km / KM_PER_DEGREE
+        self._cells: Dict[Cell, Set[int]] = {}
+        self._positions: Dict[int, Tuple[float, float]] = {}
+        self._cell_of: Dict[int, Cell] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, rider_id: int) -> bool:
+        return rider_id in self._positions
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return (math.floor(lat / self.cell_size_deg), math.floor(lon / self.cell_size_deg))
+
+    def position(self, rider_id: int) -> Optional[Tuple[float, float]]:
+        """Get the indexed position of a rider"""
+        return self._positions.get(rider_id)
+
+    def update(self, rider_id: int, lat: float, lon: float) -> None:
+        """Insert a rider or move it to a new position"""
+        cell = self._cell(lat, lon)
+        old_cell = self._cell_of.get(rider_id)
+        if old_cell != cell:
+            if old_cell is not None:
+                self._discard_from_cell(rider_id, old_cell)
+            self._cells.setdefault(cell, set()).add(rider_id)
+            self._cell_of[rider_id] = cell
+        self._positions[rider_id] = (lat, lon)
+
+    def remove(self, rider_id: int) -> None:
+        """Drop a rider from the index (no-op if it is not indexed)"""
+        cell = self._cell_of.pop(rider_id, None)
+        if cell is None:
+            return
+        del self._positions[rider_id]
+        self._discard_from_cell(rider_id, cell)
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._positions.clear()
+        self._cell_of.clear()
+
+    def _discard_from_cell(self, rider_id: int, cell: Cell) -> None:
+        bucket = self._cells.get(cell)
+        if bucket is None:
+            return
+        bucket.discard(rider_id)
+        if not bucket:
+            del self._cells[cell]
+
+    def _ring(self, center: Cell, radius: int) -> Iterable[Cell]:
+        """Cells at exactly `radius` Chebyshev steps from `center`"""
+        row, col = center
+        if radius == 0:
+            yield center
+            return
+        for dc in range(-radius, radius + 1):
+            yield (row - radius, col + dc)
+            yield (row + radius, col + dc)
+        for dr in range(-radius + 1, radius):
+            yield (row + dr, col - radius)
+            yield (row + dr, col + radius)
+
+    def _ring_lower_bound_km(self, lat: float, radius: int) -> float:
+        """Smallest possible distance to any cell beyond ring `radius`"""
+        # Longitude cells shrink towards the poles, so bound with the widest latitude in the band
+        band_lat = min(90.0, abs(lat) + (radius + 1) * self.cell_size_deg)
+        shrink = min(1.0, math.cos(math.radians(band_lat)))
+        # Small slack keeps the bound conservative against great-circle vs. grid-axis error
+        return radius * self.cell_size_km * shrink * 0.999
+
+    def nearest(self, lat: float, lon: float, k: int = 1,
+                max_distance_km: Optional[float] = None) -> List[Tuple[int, float]]:
+        """Find the `k` closest riders as (rider_id, distance_km), closest first"""
+        if k <= 0 or not self._positions:
+            return []
+
+        center = self._cell(lat, lon)
+        # Max-heap (negated distances) holding the best k candidates seen so far
+        best: List[Tuple[float, int]] = []
+        visited = 0
+        radius = 0
+        while True:
+            if 8 * radius > len(self._cells):
+                # The ring is wider than the occupied grid: finish with a scan of the remaining cells
+                self._scan_remaining(lat, lon, center, radius, k, best)
+                break
+
+            for cell in self._ring(center, radius):
+                bucket = self._cells.get(cell)
+                if not bucket:
+                    continue
+                for rider_id in bucket:
+                    visited += 1
+                    self._offer(best, k, rider_id, lat, lon)
+
+            bound = self._ring_lower_bound_km(lat, radius)
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            if max_distance_km is not None and bound > max_distance_km:
+                break
+            if visited == len(self._positions):
+                break
+            radius += 1
+
+        results = sorted((-neg_dist, rider_id) for neg_dist, rider_id in best)
+        if max_distance_km is not None:
+            results = [r for r in results if r[0] <= max_distance_km]
+        return [(rider_id, distance) for distance, rider_id in results]
+
+    def _offer(self, best: List[Tuple[float, int]], k: int, rider_id: int, lat: float, lon: float) -> None:
+        r_lat, r_lon = self._positions[rider_id]
+        distance = haversine_km(lat, lon, r_lat, r_lon)
+        if len(best) < k:
+            heapq.heappush(best, (-distance, rider_id))
+        elif distance < -best[0][0]:
+            heapq.heapreplace(best, (-distance, rider_id))
+
+    def _scan_remaining(self, lat: float, lon: float, center: Cell, radius: int,
+                        k: int, best: List[Tuple[float, int]]) -> None:
+        row, col = center
+        for (c_row, c_col), bucket in self._cells.items():
+            if max(abs(c_row - row), abs(c_col - col)) < radius:
+                continue
+            for rider_id in bucket:
+                self._offer(best, k, rider_id, lat, lon)
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> List[Tuple[int, float]]:
+        """All riders within `radius_km` as (rider_id, distance_km), closest first"""
+        if radius_km < 0 or not self._positions:
+            return []
+
+        lat_span = radius_km / KM_PER_DEGREE
+        edge_lat = min(89.9, abs(lat) + lat_span)
+        lon_span = min(180.0, radius_km / (KM_PER_DEGREE * math.cos(math.radians(edge_lat))))
+        min_row, min_col = self._cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = self._cell(lat + lat_span, lon + lon_span)
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            cells = [
+                cell for cell in self._cells
+                if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+            ]
+        else:
+            cells = [
+                (row, col)
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+            ]
+
+        results = []
+        for cell in cells:
+            for rider_id in self._cells.get(cell, ()):
+                r_lat, r_lon = self._positions[rider_id]
+                distance = haversine_km(lat, lon, r_lat, r_lon)
+                if distance <= radius_km:
+                    results.append((distance, rider_id))
+        results.sort()
+        return [(rider_id, distance) for distance, rider_id in results]
@@ -0,0 +1,55 @@
+"""
+Fire many parallel /api/v1/match calls at a running ride-matching-service and
+check that no rider is handed to more than one caller.
+
+    python -m benchmarks.concurrent_match_benchmark --url http://localhost:8004 --requests 2000
+
+Pass --url several times to spread the load over multiple matching instances,
+which only the reservation in the Rider Service keeps apart. The rider pool
+should be smaller than --requests so callers actually contend.
+"""
+import argparse
+import asyncio
+import collections
+import time
+import httpx
+from typing import List
+
+async def run(urls: List[str], total: int, concurrency: int, users: int) -> int:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def match(i: int):
+            async with semaphore:
+                response = await client.post(
+                    f"{urls[i % len(urls)]}/api/v1/match",
+                    json={"user_id": i % users + 1},
+                )
+                return response.status_code, response.json()
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(match(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    statuses = collections.Counter(status for status, _ in results)
+    riders = collections.Counter(body["rider_id"] for status, body in results if status == 200)
+    duplicates = {rider_id: count for rider_id, count in riders.items() if count > 1}
+
+    print(f"{total} matches in {elapsed:.2f}s ({total / elapsed:.0f} req/s), concurrency {concurrency}")
+    print(f"status codes: {dict(statuses)}")
+    print(f"distinct riders assigned: {len(riders)}")
+    if duplicates:
+        print(f"FAIL: riders assigned more than once: {duplicates}")
+        return 1
+    print("OK: every rider was assigned at most once")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", dest="urls")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--users", type=int, default=5)
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args.urls or ["http://localhost:8004"], args.requests, args.concurrency, args.users)))
@@ -0,0 +1,88 @@
+"""
+Measure nearest-rider search throughput across geo-sharded worker processes.
+
+Run from the ride-matching-service directory:
+
+    python -m benchmarks.sharded_match_benchmark --shards 1 2 4 8
+
+Every configuration answers the same batches of k-nearest queries (the work a
+batch dispatch flush sends to the shards) and is checked against a single
+in-process SpatialIndex. Throughput can only scale up to the number of cores
+on the machine; the in-process row is the baseline without any sharding.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from app.sharding import ShardRouter
+from app.spatial_index import SpatialIndex
+
+# Rough bounding box of Ho Chi Minh City
+MIN_LAT, MAX_LAT = 10.70, 10.90
+MIN_LON, MAX_LON = 106.60, 106.80
+
+def random_point(rng: random.Random):
+    return rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LON, MAX_LON)
+
+def report(label: str, queries: int, elapsed: float, baseline: float = None):
+    line = f"{label:>12} | {queries / elapsed:>9.0f} queries/s | {elapsed / queries * 1e6:>8.1f} us/query"
+    if baseline:
+        line += f" | {baseline / elapsed:>5.2f}x in-process"
+    print(line)
+
+async def run_sharded(shards: int, riders, batches, k: int, zone_km: float, border_km: float, expected):
+    router = ShardRouter(shards, zone_size_km=zone_km, border_km=border_km)
+    router.start()
+    try:
+        router.apply([
+            {"id": rider_id, "status": "Available", "latitude": lat, "longitude": lon}
+            for rider_id, lat, lon in riders
+        ])
+        # Waits for the workers to start and load their zones
+        await router.shard_sizes()
+
+        start = time.perf_counter()
+        # Several batches in flight at once, as with concurrent dispatch windows
+        results = await asyncio.gather(*(router.nearest_many(batch, k=k) for batch in batches))
+        elapsed = time.perf_counter() - start
+    finally:
+        router.stop()
+
+    got = [nearest for batch in results for nearest in batch]
+    for want, have in zip(expected, got):
+        assert [d for _, d in want] == [d for _, d in have], (want, have)
+    return elapsed, router.stats()
+
+async def main(args):
+    rng = random.Random(42)
+    riders = [(rider_id, *random_point(rng)) for rider_id in range(1, args.riders + 1)]
+    queries = [random_point(rng) for _ in range(args.batches * args.batch_size)]
+    batches = [queries[i:i + args.batch_size] for i in range(0, len(queries), args.batch_size)]
+
+    index = SpatialIndex()
+    for rider_id, lat, lon in riders:
+        index.update(rider_id, lat, lon)
+    start = time.perf_counter()
+    expected = [index.nearest(lat, lon, k=args.k) for lat, lon in queries]
+    baseline = time.perf_counter() - start
+
+    print(f"{args.riders} riders, {len(queries)} queries in batches of {args.batch_size}, k={args.k}, "
+          f"{os.cpu_count()} cores")
+    report("in-process", len(queries), baseline)
+    for shards in args.shards:
+        elapsed, stats = await run_sharded(shards, riders, batches, args.k, args.zone_km, args.border_km, expected)
+        report(f"{shards} shards", len(queries), elapsed, baseline)
+        print(f"{'':>12} | riders per shard {stats['riders_per_shard']}, "
+              f"cross-shard {stats['cross_shard_queries']}, expanded {stats['expanded_queries']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--riders", type=int, default=100_000)
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--zone-km", type=float, default=5.0)
+    parser.add_argument("--border-km", type=float, default=1.0)
+    asyncio.run(main(parser.parse_args()))
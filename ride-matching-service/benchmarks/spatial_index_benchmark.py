@@ -0,0 +1,70 @@
+"""
+Compare nearest-rider lookup through SpatialIndex with the linear scan.
+
+Run from the ride-matching-service directory:
+
+    python -m benchmarks.spatial_index_benchmark
+"""
+import random
+import time
+from app.spatial_index import SpatialIndex, haversine_km
+
+# Rough bounding box of Ho Chi Minh City
+MIN_LAT, MAX_LAT = 10.70, 10.90
+MIN_LON, MAX_LON = 106.60, 106.80
+
+FLEET_SIZES = [1_000, 10_000, 100_000]
+CELL_SIZES_KM = [1.0, 0.25]
+QUERIES = 200
+
+def random_point(rng: random.Random):
+    return rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LON, MAX_LON)
+
+def linear_scan(riders, lat, lon):
+    distances = [(rider_id, haversine_km(lat, lon, r_lat, r_lon)) for rider_id, r_lat, r_lon in riders]
+    return min(distances, key=lambda x: x[1])
+
+def run(fleet_size: int, cell_size_km: float, rng: random.Random):
+    riders = [(rider_id, *random_point(rng)) for rider_id in range(1, fleet_size + 1)]
+    queries = [random_point(rng) for _ in range(QUERIES)]
+
+    index = SpatialIndex(cell_size_km=cell_size_km)
+    start = time.perf_counter()
+    for rider_id, lat, lon in riders:
+        index.update(rider_id, lat, lon)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_results = [linear_scan(riders, lat, lon) for lat, lon in queries]
+    scan_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_results = [index.nearest(lat, lon, k=1)[0] for lat, lon in queries]
+    index_s = time.perf_counter() - start
+
+    for expected, actual in zip(scan_results, index_results):
+        assert abs(expected[1] - actual[1]) < 1e-9, (expected, actual)
+
+    # Incremental maintenance: move 1% of the fleet, take 1% offline
+    movers = rng.sample(riders, max(1, fleet_size // 100))
+    start = time.perf_counter()
+    for rider_id, _, _ in movers:
+        index.update(rider_id, *random_point(rng))
+    for rider_id, _, _ in rng.sample(riders, max(1, fleet_size // 100)):
+        index.remove(rider_id)
+    update_s = time.perf_counter() - start
+    update_ops = 2 * len(movers)
+
+    print(
+        f"{fleet_size:>8} riders, {cell_size_km:>4} km cells | scan {scan_s / QUERIES * 1e6:>10.1f} us/query"
+        f" | index {index_s / QUERIES * 1e6:>8.1f} us/query"
+        f" | speedup {scan_s / index_s:>7.1f}x"
+        f" | build {build_s * 1e3:>7.1f} ms"
+        f" | update {update_s / update_ops * 1e6:>5.2f} us/op"
+    )
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    for size in FLEET_SIZES:
+        for cell_size_km in CELL_SIZES_KM:
+            run(size, cell_size_km, rng)
@@ -1,14 +1,106 @@
 import os
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.endpoints import matching
+from app.api.endpoints import matching, distance_matrix
+from app.dispatch import BatchDispatcher
 from app.distance_matrix import DistanceMatrixService
+from app.rider_cache import RiderAvailabilityCache
+from app.reservations import RiderReserver
+from ride_sharing_common.resilience import resilience_from_env
+from app.scoring import CandidateScorer, parse_vehicle_penalties
+from app.sharding import ShardRouter
+from app.spatial_index import SpatialIndex
+
+RIDER_SERVICE_URL = os.getenv("RIDER_SERVICE_URL", "http://rider-service:8002")
+
+# "greedy" matches every request on arrival, "batch" solves requests together per time window
+MATCH_DISPATCH_MODE = os.getenv("MATCH_DISPATCH_MODE", "greedy")
+
+# Reserve matched riders in the Rider Service so concurrent matches never share a rider
+MATCH_RESERVE_RIDERS = os.getenv("MATCH_RESERVE_RIDERS", "true").lower() == "true"
+
+# Number of geo-sharded worker processes for nearest-rider searches, 0 keeps them in-process
+MATCH_SHARDS = int(os.getenv("MATCH_SHARDS", "0"))
+
+# Keep a local, incrementally synced table of available riders for the lifetime of the app
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One breaker for the Rider Service, shared by the cache sync and the reservations
+    app.state.rider_resilience = resilience_from_env("rider_service")
+    rider_cache = RiderAvailabilityCache(
+        rider_service_url=RIDER_SERVICE_URL,
+        rider_index=SpatialIndex(cell_size_km=float(os.getenv("SPATIAL_INDEX_CELL_KM", "0.25"))),
+        poll_interval=float(os.getenv("RIDER_CACHE_POLL_SECONDS", "1.0")),
+        resync_interval=float(os.getenv("RIDER_CACHE_RESYNC_SECONDS", "300")),
+        resilience=app.state.rider_resilience,
+    )
+    app.state.shard_router = None
+    if MATCH_SHARDS > 0:
+        app.state.shard_router = ShardRouter(
+            MATCH_SHARDS,
+            zone_size_km=float(os.getenv("MATCH_SHARD_ZONE_KM", "5.0")),
+            border_km=float(os.getenv("MATCH_SHARD_BORDER_KM", "1.0")),
+            cell_size_km=float(os.getenv("SPATIAL_INDEX_CELL_KM", "0.25")),
+        )
+        app.state.shard_router.start()
+        # Attach before the first bootstrap so the shards receive every rider
+        rider_cache.listeners.append(app.state.shard_router)
+    await rider_cache.start()
+    app.state.rider_cache = rider_cache
+
+    app.state.reserver = None
+    if MATCH_RESERVE_RIDERS:
+        app.state.reserver = RiderReserver(
+            RIDER_SERVICE_URL,
+            lease_ttl_seconds=int(os.getenv("RIDER_LEASE_TTL_SECONDS", "30")),
+            max_in_flight=int(os.getenv("RIDER_RESERVE_MAX_IN_FLIGHT", "10")),
+            resilience=app.state.rider_resilience,
+        )
+        await app.state.reserver.start()
+
+    # One distance service for the whole process; the matrix is loaded once and swapped on reload
+    app.state.distance_service = DistanceMatrixService(
+        rider_cache=rider_cache,
+        reserver=app.state.reserver,
+        max_reserve_attempts=int(os.getenv("MATCH_RESERVE_MAX_ATTEMPTS", "5")),
+        matrix_path=os.getenv("DISTANCE_MATRIX_PATH"),
+        # Providers are asked in order; a later one only fills distances the earlier ones do not know
+        distance_providers=os.getenv("DISTANCE_PROVIDERS", "matrix,haversine").split(","),
+        routing_table_path=os.getenv("ROUTING_TABLE_PATH"),
+        distance_cache_size=int(os.getenv("DISTANCE_CACHE_SIZE", "100000")),
+        distance_cache_ttl_seconds=float(os.getenv("DISTANCE_CACHE_TTL_SECONDS", "300")),
+        shard_router=app.state.shard_router,
+        pickup_candidate_factor=int(os.getenv("MATCH_PICKUP_CANDIDATE_FACTOR", "4")),
+        scorer=CandidateScorer(
+            distance_weight=float(os.getenv("MATCH_SCORE_DISTANCE_WEIGHT", "1.0")),
+            rating_weight=float(os.getenv("MATCH_SCORE_RATING_WEIGHT", "1.0")),
+            vehicle_penalties=parse_vehicle_penalties(os.getenv("MATCH_SCORE_VEHICLE_PENALTIES")),
+        ),
+    )
+
+    app.state.dispatcher = None
+    if MATCH_DISPATCH_MODE == "batch":
+        app.state.dispatcher = BatchDispatcher(
+            app.state.distance_service,
+            window_seconds=float(os.getenv("MATCH_BATCH_WINDOW_MS", "200")) / 1000,
+            max_batch_size=int(os.getenv("MATCH_BATCH_MAX_SIZE", "256")),
+        )
+    yield
+    if app.state.dispatcher is not None:
+        await app.state.dispatcher.stop()
+    if app.state.reserver is not None:
+        await app.state.reserver.stop()
+    await rider_cache.stop()
+    if app.state.shard_router is not None:
+        app.state.shard_router.stop()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Ride Matching Service",
     description="Service for matching users with the nearest available riders",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -20,24 +112,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency injection
-def get_distance_service():
-    return DistanceMatrixService()
-
-# Override the dependency in the router
-app.dependency_overrides[DistanceMatrixService] = get_distance_service
-
 # Include routers
 app.include_router(matching.router, prefix="/api/v1", tags=["matching"])
+app.include_router(distance_matrix.router, prefix="/api/v1", tags=["distance-matrix"])
 
 # Health check endpoint
 @app.get("/health", tags=["health"])
 def health_check():
     return {"status": "healthy", "service": "ride-matching-service"}
 
+# Metrics endpoint
+@app.get("/metrics", tags=["metrics"])
+def metrics(request: Request):
+    metrics = {
+        "rider_cache": request.app.state.rider_cache.stats(),
+        "distance_provider": request.app.state.distance_service.provider.stats(),
+        "scoring": request.app.state.distance_service.scorer.stats(),
+        "resilience": {"rider_service": request.app.state.rider_resilience.stats()},
+    }
+    if request.app.state.dispatcher is not None:
+        metrics["dispatcher"] = request.app.state.dispatcher.stats()
+    if request.app.state.shard_router is not None:
+        metrics["sharding"] = request.app.state.shard_router.stats()
+    if request.app.state.reserver is not None:
+        metrics["reservations"] = request.app.state.reserver.stats()
+    return metrics
+
 # Main entry point
 if __name__ == "__main__":
     import uvicorn
-    
+
     port = int(os.getenv("SERVICE_PORT", "8004"))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=True)
@@ -0,0 +1,188 @@
+import asyncio
+import bisect
+import json
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+def encode_event(change: Dict) -> str:
+    """A rider change as a server-sent event, its id being the version to resume after"""
+    return f"id: {change['version']}\nevent: rider\ndata: {json.dumps(change)}\n\n"
+
+class ChangeFeed:
+    """
+    In-memory tail of the rider change log, shared by every subscriber.
+
+    A single poller reads riders changed after the newest version it holds
+    (`read_changes(since, until, limit)` returns rider dicts in version order)
+    and appends them to a bounded buffer; subscribers are served from the
+    buffer and woken when it grows, so fan-out costs no database query per
+    subscriber. Mutations made by this process call `notify` to poll at once;
+    those made elsewhere are picked up within `poll_interval`. Reads from
+    before the oldest buffered version return None, and the caller falls
+    back to the database.
+
+    Versions are taken before their transaction commits, so commits can land
+    out of version order. Changes are only read up to `horizon`, the newest
+    version below which every writer has finished: `read_horizon()` returns
+    the last version handed out and the writers that may still hold one, and
+    that version becomes the horizon once none of those writers remain.
+    """
+
+    def __init__(self, read_changes: Callable[[int, int, int], List[Dict]],
+                 read_horizon: Callable[[], Tuple[int, Set[str]]],
+                 buffer_size: int = 10000, poll_interval: float = 0.5, page_size: int = 1000):
+        self.read_changes = read_changes
+        self.read_horizon = read_horizon
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+
+        self._versions: List[int] = []
+        self._changes: List[Dict] = []
+        # Server-sent event frames, encoded once for every stream subscriber
+        self._events: List[str] = []
+        # Every change after `floor` is buffered
+        self.floor = 0
+        self.version = 0
+        # Every version up to the horizon is committed or abandoned
+        self.horizon = 0
+        # (last version handed out, writers then active), oldest first
+        self._marks: Deque[Tuple[int, Set[str]]] = deque()
+        self._published = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.polls = 0
+        self.poll_errors = 0
+        self.buffer_hits = 0
+        self.buffer_misses = 0
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        # Start from the first horizon, once the writers active at startup are done
+        await self.advance_horizon()
+        first = self._marks[0] if self._marks else None
+        while self._marks and self._marks[0] is first:
+            await asyncio.sleep(0.05)
+            await self.advance_horizon()
+        self.version = self.floor = self.horizon
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        """Poll now; safe to call from threadpool threads"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.poll()
+            except Exception:
+                self.poll_errors += 1
+
+    async def advance_horizon(self) -> int:
+        """Move the horizon past every version whose writers have all finished"""
+        version, writers = await asyncio.to_thread(self.read_horizon)
+        self._marks.append((version, writers))
+        while self._marks and not self._marks[0][1] & writers:
+            self.horizon = max(self.horizon, self._marks.popleft()[0])
+        return self.horizon
+
+    async def poll(self) -> int:
+        """Append every change after the newest buffered version up to the horizon, returns the number appended"""
+        self.polls += 1
+        await self.advance_horizon()
+        appended = 0
+        while True:
+            changes = await asyncio.to_thread(self.read_changes, self.version, self.horizon, self.page_size)
+            for change in changes:
+                if change["version"] <= self.version:
+                    continue
+                self._versions.append(change["version"])
+                self._changes.append(change)
+                self._events.append(encode_event(change))
+                self.version = change["version"]
+                appended += 1
+            if len(changes) < self.page_size:
+                break
+        if appended:
+            self._trim()
+            # Wake every waiting subscriber, later waiters get a fresh event
+            published, self._published = self._published, asyncio.Event()
+            published.set()
+        return appended
+
+    def _trim(self) -> None:
+        # Drop the oldest changes in one go once the buffer is well past its size
+        excess = len(self._versions) - self.buffer_size
+        if excess > self.buffer_size // 2:
+            self.floor = self._versions[excess - 1]
+            del self._versions[:excess]
+            del self._changes[:excess]
+            del self._events[:excess]
+
+    def _start(self, since: int) -> Optional[int]:
+        if since < self.floor:
+            self.buffer_misses += 1
+            return None
+        self.buffer_hits += 1
+        return bisect.bisect_right(self._versions, since)
+
+    def read(self, since: int, limit: int) -> Optional[Dict]:
+        """Changes after `since` in the shape of GET /riders/changes, None when they are no longer buffered"""
+        start = self._start(since)
+        if start is None:
+            return None
+        changes = self._changes[start:start + limit]
+        return {
+            "version": self.version,
+            "has_more": start + limit < len(self._changes),
+            "changes": changes,
+        }
+
+    def read_events(self, since: int, limit: int) -> Optional[Tuple[List[str], int]]:
+        """Encoded server-sent events after `since` and the version of the last one, None when they are no longer buffered"""
+        start = self._start(since)
+        if start is None:
+            return None
+        events = self._events[start:start + limit]
+        return events, self._versions[start + len(events) - 1] if events else since
+
+    async def wait(self, since: int, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for a change after `since`, True if there is one"""
+        if self.version > since:
+            return True
+        try:
+            await asyncio.wait_for(self._published.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.version > since
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "floor": self.floor,
+            "horizon": self.horizon,
+            "pending_marks": len(self._marks),
+            "buffered": len(self._versions),
+            "buffer_size": self.buffer_size,
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "buffer_hits": self.buffer_hits,
+            "buffer_misses": self.buffer_misses,
+        }
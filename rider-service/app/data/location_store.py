@@ -0,0 +1,139 @@
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# (rider_id, lat, lon, ts) with ts in epoch seconds as reported by the device
+Location = Tuple[int, float, float, float]
+
+class LocationStore:
+    """
+    Latest known position of every rider, kept in parallel typed arrays (one
+    slot per rider) rather than an object per rider, so a node can hold all
+    riders in a few megabytes and apply pings without allocating.
+
+    Pings older than the stored one are ignored, so batches may arrive out of
+    order. Device timestamps more than `max_skew` seconds ahead of the time a
+    ping was received are clamped, so one ping from a fast clock cannot make
+    every later ping look out of order. Riders whose last ping was received more than `stale_after` seconds
+    ago are reported stale. Slots changed since the last `take_dirty` are
+    tracked for write-behind to the database.
+
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, max_riders: int = 100000, stale_after: float = 30.0, max_skew: float = 5.0):
+        self.max_riders = max_riders
+        self.stale_after = stale_after
+        self.max_skew = max_skew
+        self._slots: Dict[int, int] = {}
+        self._rider_ids = array("q")
+        self._lat = array("d")
+        self._lon = array("d")
+        self._ts = array("d")
+        # Wall-clock time each rider's latest ping was received, for staleness
+        self._received = array("d")
+        self._dirty: Set[int] = set()
+
+        self.pings = 0
+        self.ignored = 0
+        self.rejected = 0
+        self.unknown = 0
+        self.clamped = 0
+        self.flushed = 0
+
+    def update_many(self, pings: Iterable[Location], received_at: Optional[float] = None) -> Tuple[int, int]:
+        """Apply pings, returns (accepted, ignored as out of order or over capacity)"""
+        received_at = time.time() if received_at is None else received_at
+        slots, lat, lon, ts, received, dirty = self._slots, self._lat, self._lon, self._ts, self._received, self._dirty
+        latest_ts = received_at + self.max_skew
+        accepted = ignored = 0
+        for rider_id, ping_lat, ping_lon, ping_ts in pings:
+            if ping_ts > latest_ts:
+                ping_ts = latest_ts
+                self.clamped += 1
+            slot = slots.get(rider_id)
+            if slot is None:
+                if len(slots) >= self.max_riders:
+                    self.rejected += 1
+                    ignored += 1
+                    continue
+                slot = slots[rider_id] = len(self._rider_ids)
+                self._rider_ids.append(rider_id)
+                lat.append(ping_lat)
+                lon.append(ping_lon)
+                ts.append(ping_ts)
+                received.append(received_at)
+            elif ping_ts < ts[slot]:
+                ignored += 1
+                continue
+            else:
+                lat[slot] = ping_lat
+                lon[slot] = ping_lon
+                ts[slot] = ping_ts
+                received[slot] = received_at
+            dirty.add(slot)
+            accepted += 1
+        self.pings += accepted
+        self.ignored += ignored
+        return accepted, ignored
+
+    def load(self, locations: Iterable[Location]) -> None:
+        """Seed positions persisted earlier; they count as received at their own timestamp and are not dirty"""
+        now = time.time()
+        for rider_id, lat, lon, ts in locations:
+            # A timestamp persisted from the future is clamped like a live ping's
+            self.update_many([(rider_id, lat, lon, ts)], received_at=min(ts, now))
+            self._dirty.discard(self._slots[rider_id])
+        self.pings = 0
+
+    def untracked(self, rider_ids: Iterable[int]) -> Set[int]:
+        """The given riders that have no slot yet"""
+        slots = self._slots
+        return {rider_id for rider_id in rider_ids if rider_id not in slots}
+
+    def get(self, rider_id: int) -> Optional[Dict]:
+        slot = self._slots.get(rider_id)
+        if slot is None:
+            return None
+        return {
+            "rider_id": rider_id,
+            "lat": self._lat[slot],
+            "lon": self._lon[slot],
+            "ts": self._ts[slot],
+            "stale": time.time() - self._received[slot] > self.stale_after,
+        }
+
+    def stale_riders(self) -> List[int]:
+        """Riders whose pings stopped arriving, longest silent first"""
+        cutoff = time.time() - self.stale_after
+        received = self._received
+        stale = [slot for slot in range(len(received)) if received[slot] < cutoff]
+        stale.sort(key=received.__getitem__)
+        return [self._rider_ids[slot] for slot in stale]
+
+    def take_dirty(self) -> List[Location]:
+        """Positions changed since the last call, clearing them for the next write-behind batch"""
+        dirty, self._dirty = self._dirty, set()
+        return [(self._rider_ids[slot], self._lat[slot], self._lon[slot], self._ts[slot]) for slot in dirty]
+
+    def mark_dirty(self, rider_ids: Iterable[int]) -> None:
+        """Queue riders for the next batch again, e.g. after a failed write"""
+        for rider_id in rider_ids:
+            slot = self._slots.get(rider_id)
+            if slot is not None:
+                self._dirty.add(slot)
+
+    def stats(self) -> Dict:
+        return {
+            "riders": len(self._slots),
+            "max_riders": self.max_riders,
+            "dirty": len(self._dirty),
+            "stale": len(self.stale_riders()),
+            "stale_after_seconds": self.stale_after,
+            "pings": self.pings,
+            "ignored": self.ignored,
+            "rejected": self.rejected,
+            "unknown": self.unknown,
+            "clamped": self.clamped,
+            "flushed": self.flushed,
+        }
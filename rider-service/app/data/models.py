@@ -1,6 +1,25 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, ForeignKey, CheckConstraint, UniqueConstraint, func
+from sqlalchemy import DDL, event, Column, Integer, BigInteger, String, Numeric, Float, DateTime, ForeignKey, CheckConstraint, UniqueConstraint, Index, Sequence, func, text
 from app.data.database import Base
 
+# Monotonic change counter: every insert or update of a rider takes the next value
+rider_version_seq = Sequence("rider_version_seq", schema="rider_schema", metadata=Base.metadata)
+
+# Versions are taken through this function, which holds a shared advisory lock keyed on the
+# sequence until the writing transaction ends; the change feed reads the lock's holders to
+# tell which versions may still be uncommitted
+event.listen(Base.metadata, "before_create", DDL("""
+CREATE OR REPLACE FUNCTION rider_schema.next_rider_version() RETURNS bigint AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock_shared('rider_schema.rider_version_seq'::regclass::oid::bigint);
+    RETURN nextval('rider_schema.rider_version_seq');
+END
+$$ LANGUAGE plpgsql VOLATILE
+"""))
+
+def next_rider_version():
+    """SQL expression taking the next rider version"""
+    return func.rider_schema.next_rider_version()
+
 class Rider(Base):
     __tablename__ = "riders"
     __table_args__ = {"schema": "rider_schema"}
@@ -12,21 +31,33 @@ class Rider(Base):
     rating = Column(Numeric(3, 2), default=5.0)
     status = Column(String, default="Available")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    version = Column(BigInteger, nullable=False, index=True, server_default=text("rider_schema.next_rider_version()"))
+    # Set while a matcher holds the rider; an expired lease frees the rider again
+    lease_id = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # Last reported position, written behind from the in-memory location store
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    location_updated_at = Column(DateTime(timezone=True), nullable=True)
     
     
     __table_args__ = (
         CheckConstraint("status IN ('Available', 'Busy')"),
+        # Keyset pagination order
+        Index("ix_rider_schema_riders_created_at_id", "created_at", "id"),
+        # Available riders only, in the order GET /riders/available pages through them
+        Index("ix_rider_schema_riders_available", "vehicle_type", "id", postgresql_where=text("status = 'Available'")),
         {"schema": "rider_schema"}
     )
 
 class DistanceMatrix(Base):
     __tablename__ = "distance_matrix"
     __table_args__ = (
-        UniqueConstraint("rider_name", "rider_id", name="unique_rider_distance"),
+        UniqueConstraint("user_id", "rider_id", name="unique_user_rider_distance"),
         {"schema": "rider_schema"}
     )
     
     id = Column(Integer, primary_key=True, index=True)
-    rider_name = Column(String, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
     rider_id = Column(Integer, nullable=False, index=True)
     distance_km = Column(Numeric(5, 2), nullable=False)
\ No newline at end of file
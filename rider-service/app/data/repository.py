@@ -1,5 +1,13 @@
+import csv
+import io
+from datetime import timedelta
+from typing import Iterator, List, Optional, Set, Tuple
+from sqlalchemy import Float, Integer, any_, bindparam, cast, func, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
-from app.data.models import Rider, DistanceMatrix
+from psycopg2.extras import execute_values
+from ride_sharing_common.pagination import InvalidCursor, decode_key_cursor, encode_key_cursor, paginate
+from app.data.models import Rider, next_rider_version
 
 def create_rider(db: Session, rider: Rider) -> Rider:
     """Save a new rider to the database."""
@@ -16,9 +24,51 @@ def get_rider_by_id(db: Session, rider_id: int):
     """Retrieve a rider by ID."""
     return db.query(Rider).filter(Rider.id == rider_id).first()
 
-def get_all_riders(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieve all riders."""
-    return db.query(Rider).offset(skip).limit(limit).all()
+def get_riders_by_ids(db: Session, ids: List[int]):
+    """Retrieve the riders with the given IDs in one query."""
+    return db.query(Rider).filter(Rider.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))).all()
+
+def get_existing_rider_ids(db: Session, ids: List[int]) -> Set[int]:
+    """Retrieve which of the given IDs belong to riders."""
+    return {row[0] for row in db.query(Rider.id).filter(Rider.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))}
+
+def get_all_riders(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of riders and the cursor of the next page."""
+    return paginate(db.query(Rider), Rider, skip, limit, cursor)
+
+def _available_riders(vehicle_type: Optional[str] = None):
+    # Plain columns in partial index order, so no ORM objects are built
+    stmt = (
+        select(Rider.id, Rider.vehicle_type, cast(Rider.rating, Float), Rider.latitude, Rider.longitude)
+        .where(Rider.status == "Available")
+        .order_by(Rider.vehicle_type, Rider.id)
+    )
+    if vehicle_type:
+        stmt = stmt.where(Rider.vehicle_type == vehicle_type)
+    return stmt
+
+def get_available_riders(db: Session, vehicle_type: Optional[str] = None, limit: int = 1000,
+                         cursor: Optional[str] = None) -> Tuple[List[Tuple], Optional[str]]:
+    """Retrieve a page of available riders as (id, vehicle_type, rating, latitude, longitude) and the cursor of the next page."""
+    stmt = _available_riders(vehicle_type)
+    if cursor:
+        key = decode_key_cursor(cursor)
+        if len(key) != 2 or not isinstance(key[0], str) or not isinstance(key[1], int):
+            raise InvalidCursor("Invalid cursor")
+        stmt = stmt.where(tuple_(Rider.vehicle_type, Rider.id) > tuple(key))
+    rows = db.execute(stmt.limit(limit)).all()
+    next_cursor = encode_key_cursor(rows[-1][1], rows[-1][0]) if rows and len(rows) == limit else None
+    return rows, next_cursor
+
+def iter_available_riders(db: Session, vehicle_type: Optional[str] = None, batch_size: int = 10000) -> Iterator[List[Tuple]]:
+    """Read every available rider in batches through a server-side cursor."""
+    result = db.execute(_available_riders(vehicle_type), execution_options={"yield_per": batch_size})
+    try:
+        for rows in result.partitions():
+            yield rows
+    finally:
+        result.close()
+        db.rollback()
 
 def update_rider(db: Session, rider_id: int, updates: dict):
     """Update rider details."""
@@ -26,24 +76,176 @@ def update_rider(db: Session, rider_id: int, updates: dict):
     if db_rider:
         for key, value in updates.items():
             setattr(db_rider, key, value)
+        db_rider.version = next_rider_version()
         db.commit()
         db.refresh(db_rider)
     return db_rider
 
-def create_distance_entry(db: Session, entry: DistanceMatrix):
-    """Save or update distance entry."""
-    existing_entry = db.query(DistanceMatrix).filter(
-        DistanceMatrix.user_id == entry.user_id,
-        DistanceMatrix.rider_id == entry.rider_id
-    ).first()
-    
-    if existing_entry:
-        existing_entry.distance_km = entry.distance_km
-        db.commit()
-        db.refresh(existing_entry)
-        return existing_entry
+def get_rider_changes(db: Session, since_version: int = 0, until_version: Optional[int] = None, limit: int = 1000):
+    """Retrieve riders changed after a version, up to `until_version` if given, oldest change first."""
+    query = db.query(Rider).filter(Rider.version > since_version)
+    if until_version is not None:
+        query = query.filter(Rider.version <= until_version)
+    return query.order_by(Rider.version).limit(limit).all()
+
+# Transactions holding the lock next_rider_version() takes, i.e. writers that may hold an uncommitted version
+RIDER_VERSION_WRITERS = """
+SELECT virtualtransaction FROM pg_locks
+WHERE locktype = 'advisory' AND granted
+  AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+  AND classid = 0 AND objid = 'rider_schema.rider_version_seq'::regclass::oid AND objsubid = 1
+"""
+
+def get_rider_version_horizon(db: Session) -> Tuple[int, Set[str]]:
+    """
+    The last version handed out and the transactions that may still be writing
+    a version up to it. The sequence is read first, so any writer that took one
+    of those versions already holds its lock when the holders are listed.
+    """
+    version = db.execute(text(
+        "SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM rider_schema.rider_version_seq"
+    )).scalar()
+    writers = {row[0] for row in db.execute(text(RIDER_VERSION_WRITERS))}
+    db.rollback()
+    return version, writers
+
+def reserve_rider(db: Session, rider_id: int, lease_id: str, ttl_seconds: int):
+    """Atomically claim a rider that is available or whose lease has expired."""
+    stmt = (
+        update(Rider)
+        .where(
+            Rider.id == rider_id,
+            or_(Rider.status == "Available", Rider.lease_expires_at < func.now()),
+        )
+        .values(
+            status="Busy",
+            lease_id=lease_id,
+            lease_expires_at=func.now() + timedelta(seconds=ttl_seconds),
+            version=next_rider_version(),
+        )
+        .returning(Rider)
+        .execution_options(synchronize_session=False)
+    )
+    rider = db.execute(stmt).scalars().first()
+    db.commit()
+    return rider
+
+def confirm_rider_lease(db: Session, rider_id: int, lease_id: str):
+    """Make a held lease permanent so the rider stays Busy until released."""
+    stmt = (
+        update(Rider)
+        .where(Rider.id == rider_id, Rider.lease_id == lease_id, Rider.status == "Busy")
+        .values(lease_expires_at=None, version=next_rider_version())
+        .returning(Rider)
+        .execution_options(synchronize_session=False)
+    )
+    rider = db.execute(stmt).scalars().first()
+    db.commit()
+    return rider
 
-    db.add(entry)
+def release_rider_lease(db: Session, rider_id: int, lease_id: str):
+    """Give a leased rider back to the available pool."""
+    stmt = (
+        update(Rider)
+        .where(Rider.id == rider_id, Rider.lease_id == lease_id)
+        .values(status="Available", lease_id=None, lease_expires_at=None, version=next_rider_version())
+        .returning(Rider)
+        .execution_options(synchronize_session=False)
+    )
+    rider = db.execute(stmt).scalars().first()
     db.commit()
-    db.refresh(entry)
-    return entry
+    return rider
+
+def release_expired_leases(db: Session) -> int:
+    """Free every rider whose lease has expired, returns the number freed."""
+    stmt = (
+        update(Rider)
+        .where(Rider.lease_expires_at < func.now())
+        .values(status="Available", lease_id=None, lease_expires_at=None, version=next_rider_version())
+        .execution_options(synchronize_session=False)
+    )
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
+
+# Only moves a position forward in time, so a late batch never overwrites a newer one;
+# a stored timestamp from the future (a skewed device clock) never blocks later writes.
+# Each write takes a new version so the change feed carries positions at write-behind granularity.
+SAVE_RIDER_LOCATIONS = """
+UPDATE rider_schema.riders AS r
+SET latitude = v.lat, longitude = v.lon, location_updated_at = to_timestamp(v.ts),
+    version = rider_schema.next_rider_version()
+FROM (VALUES %s) AS v (id, lat, lon, ts)
+WHERE r.id = v.id AND (r.location_updated_at IS NULL OR r.location_updated_at <= to_timestamp(v.ts)
+                       OR r.location_updated_at > now())
+"""
+
+def save_rider_locations(db: Session, locations: List[Tuple[int, float, float, float]]) -> int:
+    """Write a batch of (rider_id, lat, lon, epoch ts) positions in one statement, returns the riders updated."""
+    cursor = db.connection().connection.cursor()
+    execute_values(
+        cursor, SAVE_RIDER_LOCATIONS, locations,
+        template="(%s::integer, %s::float8, %s::float8, %s::float8)", page_size=max(len(locations), 1),
+    )
+    updated = cursor.rowcount
+    db.commit()
+    return updated
+
+def get_rider_locations(db: Session):
+    """Retrieve every persisted position as (rider_id, lat, lon, epoch ts)."""
+    return db.query(
+        Rider.id, Rider.latitude, Rider.longitude, func.extract("epoch", Rider.location_updated_at)
+    ).filter(Rider.location_updated_at.isnot(None)).all()
+
+# Staged rows live until the transaction ends, so an import applies in full or not at all
+STAGE_DISTANCES = (
+    "CREATE TEMP TABLE IF NOT EXISTS distance_import "
+    "(seq integer, user_id integer, rider_id integer, distance_km numeric(5, 2)) ON COMMIT DELETE ROWS"
+)
+
+# The last staged value per pair wins; unchanged pairs are not rewritten
+MERGE_DISTANCES = """
+INSERT INTO rider_schema.distance_matrix (user_id, rider_id, distance_km)
+SELECT DISTINCT ON (user_id, rider_id) user_id, rider_id, distance_km
+FROM distance_import
+ORDER BY user_id, rider_id, seq DESC
+ON CONFLICT (user_id, rider_id) DO UPDATE SET distance_km = EXCLUDED.distance_km
+WHERE rider_schema.distance_matrix.distance_km IS DISTINCT FROM EXCLUDED.distance_km
+"""
+
+def stage_distance_entries(db: Session, entries: List[Tuple[int, int, float]], seq_start: int = 0) -> None:
+    """COPY (user_id, rider_id, distance_km) rows into the import staging table of the current transaction."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows((seq_start + seq, user_id, rider_id, distance_km) for seq, (user_id, rider_id, distance_km) in enumerate(entries))
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    cursor.execute(STAGE_DISTANCES)
+    cursor.copy_expert("COPY distance_import (seq, user_id, rider_id, distance_km) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def merge_staged_distances(db: Session) -> int:
+    """Upsert the staged rows into the distance matrix and commit, returns the pairs inserted or changed."""
+    cursor = db.connection().connection.cursor()
+    cursor.execute(MERGE_DISTANCES)
+    written = cursor.rowcount
+    db.commit()
+    return written
+
+def iter_distance_rows(db: Session, user_id: Optional[int] = None, batch_size: int = 10000) -> Iterator[List[Tuple]]:
+    """Read the distance matrix, or one user's row, in batches through a server-side cursor."""
+    cursor = db.connection().connection.cursor(name="distance_export")
+    if user_id is None:
+        cursor.execute("SELECT user_id, rider_id, distance_km FROM rider_schema.distance_matrix ORDER BY user_id, rider_id")
+    else:
+        cursor.execute(
+            "SELECT rider_id, distance_km FROM rider_schema.distance_matrix WHERE user_id = %s ORDER BY rider_id",
+            (user_id,),
+        )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        db.rollback()
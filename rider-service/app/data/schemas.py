@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
+import os
 import re
 
 class RiderBase(BaseModel):
@@ -35,14 +36,84 @@ class RiderResponse(RiderBase):
     rating: float
     status: str
     created_at: datetime
+    version: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    location_updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
+class AvailableRiderResponse(BaseModel):
+    id: int
+    vehicle_type: str
+    rating: float
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+
+class RiderChangesResponse(BaseModel):
+    version: int
+    has_more: bool
+    changes: List[RiderResponse]
+
+# Largest id list a batch lookup accepts
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+
+class BatchLookup(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class RiderBatchResponse(BaseModel):
+    items: Dict[int, RiderResponse]
+    missing: List[int]
+
+class LocationPing(BaseModel):
+    rider_id: int
+    lat: float = Field(..., ge=-90, le=90)
+    lon: float = Field(..., ge=-180, le=180)
+    # Epoch seconds at the device; defaults to the time the batch is received
+    ts: Optional[float] = None
+
+class LocationBatchResponse(BaseModel):
+    accepted: int
+    ignored: int
+    # Pings for rider ids that do not exist, dropped
+    unknown: int = 0
+
+class RiderLocationResponse(BaseModel):
+    rider_id: int
+    lat: float
+    lon: float
+    ts: float
+    stale: bool
+
+class StaleRidersResponse(BaseModel):
+    stale_after_seconds: float
+    rider_ids: List[int]
+
+class RiderReservationCreate(BaseModel):
+    ttl_seconds: int = Field(30, ge=1, le=600)
+
+class RiderReservationResponse(BaseModel):
+    rider_id: int
+    lease_id: str
+    lease_expires_at: Optional[datetime] = None
+
+# Largest distance a DECIMAL(5, 2) column holds
+MAX_DISTANCE_KM = 999.99
+
 class DistanceMatrixBase(BaseModel):
+    user_id: int
     rider_id: int
     distance_km: float
 
+    @validator('distance_km')
+    def validate_distance_km(cls, v):
+        # Checked after rounding to the stored precision, so 999.996 is rejected rather than overflowing
+        v = round(v, 2)
+        if not 0 <= v <= MAX_DISTANCE_KM:
+            raise ValueError(f'distance_km must be between 0 and {MAX_DISTANCE_KM}')
+        return v
+
 class DistanceMatrixCreate(DistanceMatrixBase):
     pass
 
@@ -52,6 +123,10 @@ class DistanceMatrixResponse(DistanceMatrixBase):
     class Config:
         from_attributes = True
 
+class DistanceMatrixImportResponse(BaseModel):
+    received: int
+    written: int
+
 class NearestRiderRequest(BaseModel):
     rider_name: str
 
@@ -0,0 +1,75 @@
+import asyncio
+import os
+from typing import AsyncIterator, Dict, List, Set, Tuple
+from app.data.change_feed import ChangeFeed, encode_event
+from app.data.database import SessionLocal
+from app.data.schemas import RiderResponse
+from app.data.repository import (
+    get_rider_changes as get_rider_changes_repo,
+    get_rider_version_horizon as get_rider_version_horizon_repo
+)
+
+FEED_PAGE_SIZE = 1000
+# Comment frames keep idle event streams open through proxies
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+# Longest long-poll, kept below the gateway's 10 s upstream deadline so a wait never times out there
+FEED_MAX_WAIT_SECONDS = 8
+
+def read_changes(since: int, until: int, limit: int) -> List[Dict]:
+    db = SessionLocal()
+    try:
+        return [
+            RiderResponse.model_validate(rider).model_dump(mode="json")
+            for rider in get_rider_changes_repo(db, since, until, limit)
+        ]
+    finally:
+        db.close()
+
+def read_horizon() -> Tuple[int, Set[str]]:
+    db = SessionLocal()
+    try:
+        return get_rider_version_horizon_repo(db)
+    finally:
+        db.close()
+
+# One tail of the change log shared by every long-poll and stream subscriber
+change_feed = ChangeFeed(
+    read_changes,
+    read_horizon,
+    buffer_size=int(os.getenv("FEED_BUFFER_SIZE", "10000")),
+    poll_interval=float(os.getenv("FEED_POLL_SECONDS", "0.5")),
+    page_size=FEED_PAGE_SIZE,
+)
+
+def read_changes_from_db(since: int, limit: int) -> Dict:
+    """Changes too old for the feed's buffer, read from the database up to the feed's horizon."""
+    horizon = change_feed.horizon
+    changes = read_changes(since, horizon, limit)
+    return {
+        "version": max(horizon, since),
+        "has_more": len(changes) == limit,
+        "changes": changes,
+    }
+
+async def get_rider_changes_service(since: int = 0, limit: int = 1000, wait: float = 0):
+    """Riders changed after version `since`, waiting up to `wait` seconds for one if there are none yet."""
+    if wait > 0:
+        await change_feed.wait(since, wait)
+    page = change_feed.read(since, limit)
+    if page is None:
+        page = await asyncio.to_thread(read_changes_from_db, since, limit)
+    return page
+
+async def stream_rider_changes(since: int) -> AsyncIterator[str]:
+    """Server-sent events for every change after `since`, catching up first, then as changes happen."""
+    while True:
+        batch = change_feed.read_events(since, FEED_PAGE_SIZE)
+        if batch is None:
+            page = await asyncio.to_thread(read_changes_from_db, since, FEED_PAGE_SIZE)
+            changes = page["changes"]
+            batch = [encode_event(change) for change in changes], changes[-1]["version"] if changes else since
+        events, since = batch
+        if events:
+            yield "".join(events)
+        elif not await change_feed.wait(since, FEED_HEARTBEAT_SECONDS):
+            yield ": keep-alive\n\n"
@@ -0,0 +1,81 @@
+import csv
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from ride_sharing_common.streams import decode_line, iter_lines
+from app.data.database import SessionLocal
+from app.data.schemas import MAX_DISTANCE_KM
+from app.data.repository import iter_distance_rows, merge_staged_distances, stage_distance_entries
+
+# Rows COPYed into the staging table per round trip
+DISTANCE_IMPORT_CHUNK_SIZE = 10000
+
+CSV_HEADER = ["user_id", "rider_id", "distance_km"]
+
+class DistanceImportError(ValueError):
+    """Raised for an import row that is not a valid (user_id, rider_id, distance_km)"""
+
+def _entry(values: List[str], line: int) -> Tuple[int, int, float]:
+    if len(values) != 3:
+        raise DistanceImportError(f"Line {line}: expected user_id,rider_id,distance_km")
+    try:
+        user_id, rider_id, distance_km = int(values[0]), int(values[1]), float(values[2])
+    except ValueError:
+        raise DistanceImportError(f"Line {line}: expected user_id,rider_id,distance_km")
+    distance_km = round(distance_km, 2)
+    if not 0 <= distance_km <= MAX_DISTANCE_KM:
+        raise DistanceImportError(f"Line {line}: distance_km must be between 0 and {MAX_DISTANCE_KM}")
+    return user_id, rider_id, distance_km
+
+def import_distance_entries(entries: List[Tuple[int, int, float]]):
+    """Upsert (user_id, rider_id, distance_km) rows in one transaction."""
+    db = SessionLocal()
+    try:
+        for start in range(0, len(entries), DISTANCE_IMPORT_CHUNK_SIZE):
+            stage_distance_entries(db, entries[start:start + DISTANCE_IMPORT_CHUNK_SIZE], start)
+        return {"received": len(entries), "written": merge_staged_distances(db)}
+    finally:
+        db.close()
+
+async def import_distance_csv(stream: AsyncIterator[bytes]):
+    """
+    Upsert user_id,rider_id,distance_km CSV lines (the header is optional) as
+    they arrive. Rows are staged chunk by chunk and merged once at the end, so
+    the import applies in full or, on the first bad line, not at all.
+    """
+    db = SessionLocal()
+    try:
+        received = 0
+        chunk: List[Tuple[int, int, float]] = []
+        line_number = 0
+        async for data in iter_lines(stream):
+            line_number += 1
+            if not data.strip():
+                continue
+            try:
+                values = next(csv.reader([decode_line(data)]))
+            except (ValueError, csv.Error) as e:
+                raise DistanceImportError(f"Line {line_number}: {e}")
+            if line_number == 1 and [value.strip() for value in values] == CSV_HEADER:
+                continue
+            chunk.append(_entry(values, line_number))
+            if len(chunk) >= DISTANCE_IMPORT_CHUNK_SIZE:
+                await run_in_threadpool(stage_distance_entries, db, chunk, received)
+                received += len(chunk)
+                chunk = []
+        if chunk:
+            await run_in_threadpool(stage_distance_entries, db, chunk, received)
+            received += len(chunk)
+        written = await run_in_threadpool(merge_staged_distances, db) if received else 0
+        return {"received": received, "written": written}
+    finally:
+        db.close()
+
+def export_distance_matrix(user_id: Optional[int] = None) -> Iterator[str]:
+    """The whole matrix, or one user's row, as CSV text produced batch by batch."""
+    db = SessionLocal()
+    try:
+        yield "user_id,rider_id,distance_km\n" if user_id is None else "rider_id,distance_km\n"
+        for rows in iter_distance_rows(db, user_id):
+            yield "".join(",".join(map(str, row)) + "\n" for row in rows)
+    finally:
+        db.close()
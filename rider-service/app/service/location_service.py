@@ -0,0 +1,92 @@
+import asyncio
+import os
+import time
+from typing import List, Set
+from app.data.database import SessionLocal
+from app.data.location_store import Location, LocationStore
+from app.data.schemas import LocationPing
+from app.data.repository import (
+    save_rider_locations as save_rider_locations_repo,
+    get_existing_rider_ids as get_existing_rider_ids_repo,
+    get_rider_locations as get_rider_locations_repo
+)
+from app.service.change_feed_service import change_feed
+
+# Latest rider positions; pings update memory only and reach the database in write-behind batches
+location_store = LocationStore(
+    max_riders=int(os.getenv("LOCATION_STORE_MAX_RIDERS", "100000")),
+    stale_after=float(os.getenv("LOCATION_STALE_SECONDS", "30")),
+    max_skew=float(os.getenv("LOCATION_MAX_CLOCK_SKEW_SECONDS", "5")),
+)
+
+LOCATION_MAX_BATCH = int(os.getenv("LOCATION_MAX_BATCH", "10000"))
+LOCATION_FLUSH_SECONDS = float(os.getenv("LOCATION_FLUSH_SECONDS", "2"))
+LOCATION_FLUSH_BATCH = int(os.getenv("LOCATION_FLUSH_BATCH", "5000"))
+
+def existing_rider_ids(ids: List[int]) -> Set[int]:
+    db = SessionLocal()
+    try:
+        return get_existing_rider_ids_repo(db, ids)
+    finally:
+        db.close()
+
+async def ingest_locations(pings: List[LocationPing]):
+    """Apply a batch of pings to the in-memory store, dropping those for riders that do not exist."""
+    # Only a rider's first pings need a lookup, after that it has a slot in the store
+    untracked = location_store.untracked(ping.rider_id for ping in pings)
+    unknown = 0
+    if untracked:
+        missing = untracked - await asyncio.to_thread(existing_rider_ids, list(untracked))
+        if missing:
+            kept = [ping for ping in pings if ping.rider_id not in missing]
+            unknown = len(pings) - len(kept)
+            location_store.unknown += unknown
+            pings = kept
+    received_at = time.time()
+    accepted, ignored = location_store.update_many(
+        ((ping.rider_id, ping.lat, ping.lon, received_at if ping.ts is None else ping.ts) for ping in pings),
+        received_at,
+    )
+    return {"accepted": accepted, "ignored": ignored, "unknown": unknown}
+
+def get_rider_location_service(rider_id: int):
+    """Latest position of a rider, None if it never reported one."""
+    return location_store.get(rider_id)
+
+def get_stale_riders_service():
+    """Riders that stopped sending pings."""
+    return {"stale_after_seconds": location_store.stale_after, "rider_ids": location_store.stale_riders()}
+
+def write_locations(locations: List[Location]) -> int:
+    db = SessionLocal()
+    try:
+        updated = 0
+        for start in range(0, len(locations), LOCATION_FLUSH_BATCH):
+            updated += save_rider_locations_repo(db, locations[start:start + LOCATION_FLUSH_BATCH])
+        return updated
+    finally:
+        db.close()
+
+async def flush_locations() -> int:
+    """Write positions changed since the last flush, putting them back on failure."""
+    locations = location_store.take_dirty()
+    if not locations:
+        return 0
+    try:
+        await asyncio.to_thread(write_locations, locations)
+    except Exception:
+        location_store.mark_dirty(rider_id for rider_id, _, _, _ in locations)
+        raise
+    location_store.flushed += len(locations)
+    change_feed.notify()
+    return len(locations)
+
+def load_locations() -> None:
+    """Seed the store with the positions persisted by earlier runs."""
+    db = SessionLocal()
+    try:
+        location_store.load(
+            (rider_id, lat, lon, float(ts)) for rider_id, lat, lon, ts in get_rider_locations_repo(db)
+        )
+    finally:
+        db.close()
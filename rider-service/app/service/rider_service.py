@@ -1,14 +1,25 @@
+import json
+import uuid
+from typing import Iterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from app.data.models import Rider, DistanceMatrix
-from app.data.schemas import RiderCreate, RiderUpdate, DistanceMatrixCreate
+from app.data.database import SessionLocal
+from app.data.models import Rider
+from app.data.schemas import RiderCreate, RiderUpdate
 from app.data.repository import (
     create_rider as create_rider_repo,
     get_rider_by_user_id as get_rider_by_user_id_repo,
     get_rider_by_id as get_rider_by_id_repo,
+    get_riders_by_ids as get_riders_by_ids_repo,
     get_all_riders as get_all_riders_repo,
+    get_available_riders as get_available_riders_repo,
+    iter_available_riders as iter_available_riders_repo,
     update_rider as update_rider_repo,
-    create_distance_entry as create_distance_entry_repo
+    reserve_rider as reserve_rider_repo,
+    confirm_rider_lease as confirm_rider_lease_repo,
+    release_rider_lease as release_rider_lease_repo,
+    release_expired_leases as release_expired_leases_repo
 )
+from app.service.change_feed_service import change_feed
 
 def create_rider_service(rider: RiderCreate, db: Session):
     """Register a new rider after checking uniqueness."""
@@ -16,21 +27,78 @@ def create_rider_service(rider: RiderCreate, db: Session):
         return None  # Handle in API layer
     
     db_rider = Rider(**rider.dict())
-    return create_rider_repo(db, db_rider)
+    created = create_rider_repo(db, db_rider)
+    change_feed.notify()
+    return created
 
 def get_rider_service(rider_id: int, db: Session):
     """Retrieve a specific rider."""
     return get_rider_by_id_repo(db, rider_id)
 
-def get_all_riders_service(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieve all riders."""
-    return get_all_riders_repo(db, skip, limit)
+def get_riders_by_ids_service(ids: List[int], db: Session):
+    """Retrieve riders by ID in one query, keyed by ID, plus the IDs that do not exist."""
+    unique_ids = list(dict.fromkeys(ids))
+    found = {item.id: item for item in get_riders_by_ids_repo(db, unique_ids)}
+    return {"items": found, "missing": [item_id for item_id in unique_ids if item_id not in found]}
+
+def get_all_riders_service(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of riders and the cursor of the next page."""
+    return get_all_riders_repo(db, skip, limit, cursor)
+
+def _available_rider(row: Tuple) -> str:
+    id, vehicle_type, rating, lat, lon = row
+    return json.dumps({"id": id, "vehicle_type": vehicle_type, "rating": rating, "lat": lat, "lon": lon})
+
+def get_available_riders_service(db: Session, vehicle_type: Optional[str] = None, limit: int = 1000,
+                                 cursor: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """A page of available riders as a JSON array, and the cursor of the next page."""
+    rows, next_cursor = get_available_riders_repo(db, vehicle_type, limit, cursor)
+    return "[" + ",".join(map(_available_rider, rows)) + "]", next_cursor
+
+def stream_available_riders(vehicle_type: Optional[str] = None) -> Iterator[str]:
+    """Every available rider as newline-delimited JSON, produced batch by batch."""
+    db = SessionLocal()
+    try:
+        for rows in iter_available_riders_repo(db, vehicle_type):
+            yield "".join(_available_rider(row) + "\n" for row in rows)
+    finally:
+        db.close()
 
 def update_rider_service(rider_id: int, rider_update: RiderUpdate, db: Session):
     """Update rider details."""
-    return update_rider_repo(db, rider_id, rider_update.dict(exclude_unset=True))
+    updates = rider_update.dict(exclude_unset=True)
+    if "status" in updates:
+        # An explicit status change overrides any lease held on the rider
+        updates.update(lease_id=None, lease_expires_at=None)
+    updated = update_rider_repo(db, rider_id, updates)
+    if updated:
+        change_feed.notify()
+    return updated
+
+def reserve_rider_service(rider_id: int, ttl_seconds: int, db: Session):
+    """Claim a rider under a new lease, None when it is already taken."""
+    rider = reserve_rider_repo(db, rider_id, uuid.uuid4().hex, ttl_seconds)
+    if rider:
+        change_feed.notify()
+    return rider
+
+def confirm_rider_lease_service(rider_id: int, lease_id: str, db: Session):
+    """Keep a leased rider Busy past the lease TTL."""
+    rider = confirm_rider_lease_repo(db, rider_id, lease_id)
+    if rider:
+        change_feed.notify()
+    return rider
+
+def release_rider_lease_service(rider_id: int, lease_id: str, db: Session):
+    """Release a leased rider."""
+    rider = release_rider_lease_repo(db, rider_id, lease_id)
+    if rider:
+        change_feed.notify()
+    return rider
 
-def create_distance_entry_service(entry: DistanceMatrixCreate, db: Session):
-    """Create or update a distance entry."""
-    db_entry = DistanceMatrix(**entry.dict())
-    return create_distance_entry_repo(db, db_entry)
+def release_expired_leases_service(db: Session) -> int:
+    """Free riders whose lease has expired."""
+    released = release_expired_leases_repo(db)
+    if released:
+        change_feed.notify()
+    return released
@@ -0,0 +1,39 @@
+from typing import List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter, ValidationError
+from starlette.concurrency import run_in_threadpool
+from app.data.schemas import DistanceMatrixCreate, DistanceMatrixImportResponse
+from app.service.distance_matrix_service import (
+    DistanceImportError, export_distance_matrix, import_distance_csv, import_distance_entries
+)
+
+router = APIRouter()
+
+distance_entries = TypeAdapter(List[DistanceMatrixCreate])
+
+@router.post("/distance-matrix", response_model=DistanceMatrixImportResponse)
+async def upsert_distance_matrix(request: Request):
+    """Insert or update many distances at once, from a JSON array of entries or user_id,rider_id,distance_km CSV."""
+    if request.headers.get("content-type", "").split(";")[0].strip().lower() == "text/csv":
+        try:
+            return await import_distance_csv(request.stream())
+        except DistanceImportError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    try:
+        entries = distance_entries.validate_json(await request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    return await run_in_threadpool(
+        import_distance_entries, [(entry.user_id, entry.rider_id, entry.distance_km) for entry in entries]
+    )
+
+@router.get("/distance-matrix")
+def get_distance_matrix():
+    """Stream the whole distance matrix as user_id,rider_id,distance_km CSV."""
+    return StreamingResponse(export_distance_matrix(), media_type="text/csv")
+
+@router.get("/distance-matrix/users/{user_id}")
+def get_user_distances(user_id: int):
+    """Stream one user's distances to every rider as rider_id,distance_km CSV."""
+    return StreamingResponse(export_distance_matrix(user_id), media_type="text/csv")
@@ -1,11 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from ride_sharing_common.pagination import NEXT_CURSOR_HEADER, InvalidCursor
 from app.data.database import get_db
-from app.data.schemas import RiderCreate, RiderResponse, RiderUpdate, DistanceMatrixCreate, DistanceMatrixResponse
+from app.data.schemas import (
+    RiderCreate, RiderResponse, RiderUpdate, RiderChangesResponse, AvailableRiderResponse, BatchLookup, RiderBatchResponse,
+    RiderReservationCreate, RiderReservationResponse, LocationPing, LocationBatchResponse,
+    RiderLocationResponse, StaleRidersResponse
+)
 from app.service.rider_service import (
-    create_rider_service, get_rider_service, get_all_riders_service,
-    update_rider_service, create_distance_entry_service
+    create_rider_service, get_rider_service, get_all_riders_service, get_riders_by_ids_service,
+    get_available_riders_service, stream_available_riders,
+    update_rider_service, reserve_rider_service, confirm_rider_lease_service,
+    release_rider_lease_service
+)
+from app.service.change_feed_service import FEED_MAX_WAIT_SECONDS, get_rider_changes_service, stream_rider_changes
+from app.service.location_service import (
+    LOCATION_MAX_BATCH, ingest_locations, get_rider_location_service, get_stale_riders_service
 )
 
 router = APIRouter()
@@ -19,9 +31,74 @@ def create_rider(rider: RiderCreate, db: Session = Depends(get_db)):
     return new_rider
 
 @router.get("/riders", response_model=List[RiderResponse])
-def get_riders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all riders."""
-    return get_all_riders_service(db, skip, limit)
+def get_riders(response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+               db: Session = Depends(get_db)):
+    """Get a page of riders; pass the X-Next-Cursor header back as `cursor` for the next page."""
+    try:
+        riders, next_cursor = get_all_riders_service(db, skip, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return riders
+
+@router.get("/riders/available", response_model=List[AvailableRiderResponse])
+def get_available_riders(vehicle_type: Optional[str] = None, limit: int = Query(1000, ge=1, le=10000),
+                         cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get a page of available riders with just id, vehicle type, rating and position."""
+    try:
+        body, next_cursor = get_available_riders_service(db, vehicle_type, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Rows are serialized straight from the query rather than validated one by one
+    response = Response(content=body, media_type="application/json")
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+@router.get("/riders/available/stream")
+def stream_available(vehicle_type: Optional[str] = None):
+    """Stream every available rider as newline-delimited JSON."""
+    return StreamingResponse(stream_available_riders(vehicle_type), media_type="application/x-ndjson")
+
+@router.get("/riders/changes", response_model=RiderChangesResponse)
+async def get_rider_changes(since: int = 0, limit: int = Query(1000, ge=1, le=5000), wait: float = Query(0, ge=0, le=FEED_MAX_WAIT_SECONDS)):
+    """Get riders created or updated after version `since`, long-polling up to `wait` seconds when there are none."""
+    return await get_rider_changes_service(since, limit, wait)
+
+@router.get("/riders/changes/stream")
+async def stream_changes(since: int = 0, last_event_id: Optional[int] = Header(None)):
+    """Stream rider changes after version `since` as server-sent events; reconnects resume from Last-Event-ID."""
+    start = last_event_id if last_event_id is not None else since
+    return StreamingResponse(
+        stream_rider_changes(start), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+
+@router.post("/riders/batch", response_model=RiderBatchResponse)
+def get_riders_batch(lookup: BatchLookup, db: Session = Depends(get_db)):
+    """Get many riders by ID at once; unknown IDs are listed under `missing`."""
+    return get_riders_by_ids_service(lookup.ids, db)
+
+# Location routes are async: the in-memory store is only touched from the event loop
+@router.post("/riders/locations", response_model=LocationBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_rider_locations(pings: List[LocationPing]):
+    """Report a batch of rider GPS pings; positions reach the database shortly after."""
+    if len(pings) > LOCATION_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {LOCATION_MAX_BATCH} pings per batch")
+    return await ingest_locations(pings)
+
+@router.get("/riders/locations/stale", response_model=StaleRidersResponse)
+async def get_stale_riders():
+    """Get riders whose pings stopped arriving."""
+    return get_stale_riders_service()
+
+@router.get("/riders/{rider_id}/location", response_model=RiderLocationResponse)
+async def get_rider_location(rider_id: int):
+    """Get a rider's latest reported position."""
+    location = get_rider_location_service(rider_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Rider location not found")
+    return location
 
 @router.get("/riders/{rider_id}", response_model=RiderResponse)
 def get_rider(rider_id: int, db: Session = Depends(get_db)):
@@ -38,3 +115,28 @@ def update_rider(rider_id: int, rider_update: RiderUpdate, db: Session = Depends
     if not updated_rider:
         raise HTTPException(status_code=404, detail="Rider not found")
     return updated_rider
+
+@router.post("/riders/{rider_id}/reservations", response_model=RiderReservationResponse, status_code=status.HTTP_201_CREATED)
+def reserve_rider(rider_id: int, reservation: RiderReservationCreate = RiderReservationCreate(), db: Session = Depends(get_db)):
+    """Claim an available rider under a lease that expires after `ttl_seconds`."""
+    rider = reserve_rider_service(rider_id, reservation.ttl_seconds, db)
+    if not rider:
+        if not get_rider_service(rider_id, db):
+            raise HTTPException(status_code=404, detail="Rider not found")
+        raise HTTPException(status_code=409, detail="Rider is not available")
+    return {"rider_id": rider.id, "lease_id": rider.lease_id, "lease_expires_at": rider.lease_expires_at}
+
+@router.post("/riders/{rider_id}/reservations/{lease_id}/confirm", response_model=RiderResponse)
+def confirm_rider_reservation(rider_id: int, lease_id: str, db: Session = Depends(get_db)):
+    """Confirm a reservation so the rider stays Busy after the lease TTL."""
+    rider = confirm_rider_lease_service(rider_id, lease_id, db)
+    if not rider:
+        raise HTTPException(status_code=409, detail="Reservation is no longer held")
+    return rider
+
+@router.delete("/riders/{rider_id}/reservations/{lease_id}", status_code=status.HTTP_204_NO_CONTENT)
+def release_rider_reservation(rider_id: int, lease_id: str, db: Session = Depends(get_db)):
+    """Release a reservation and make the rider available again."""
+    rider = release_rider_lease_service(rider_id, lease_id, db)
+    if not rider:
+        raise HTTPException(status_code=409, detail="Reservation is no longer held")
@@ -0,0 +1,75 @@
+"""
+Measure location ingestion throughput against a running rider-service.
+
+    python -m benchmarks.location_benchmark --url http://localhost:8002 --riders 300 --batch 1000 --batches 500
+
+Every batch carries one ping for each of `--batch` riders picked round-robin from
+ids 1..`--riders`, with a fresh timestamp, as a fleet of phones reporting through
+a collector would. Pings are kept in memory and written behind, so the database
+sees one UPDATE per flush instead of one per ping; /metrics shows the flushes.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import httpx
+
+def make_batch(riders: int, size: int, offset: int) -> bytes:
+    now = time.time()
+    pings = [
+        {
+            "rider_id": (offset + i) % riders + 1,
+            "lat": 10.75 + random.uniform(-0.1, 0.1),
+            "lon": 106.65 + random.uniform(-0.1, 0.1),
+            "ts": now,
+        }
+        for i in range(size)
+    ]
+    return json.dumps(pings).encode()
+
+async def run(url: str, riders: int, batch: int, batches: int, concurrency: int) -> None:
+    # Payloads are built up front so the client's own JSON encoding is not measured
+    payloads = [make_batch(riders, batch, i * batch) for i in range(batches)]
+    headers = {"Content-Type": "application/json"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        accepted = 0
+
+        async def send(payload: bytes):
+            nonlocal accepted
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/v1/riders/locations", content=payload, headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+                accepted += response.json()["accepted"]
+
+        await send(payloads[0])
+        latencies.clear()
+        accepted = 0
+
+        start = time.perf_counter()
+        await asyncio.gather(*(send(payload) for payload in payloads))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get("/metrics")).json()
+
+    latencies.sort()
+    print(f"POST {url}/api/v1/riders/locations: {batches} batches of {batch} pings, concurrency {concurrency}")
+    print(f"  throughput {batches * batch / elapsed:.0f} pings/s ({batches / elapsed:.0f} batches/s), {accepted} accepted")
+    print(f"  batch latency p50 {statistics.median(latencies) * 1000:.1f} ms"
+          f" | p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"  location store {metrics.get('locations')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--riders", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.riders, args.batch, args.batches, args.concurrency))
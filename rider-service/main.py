@@ -1,15 +1,64 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.web.routers import riders
-from app.data.database import engine, Base
+from app.web.routers import riders, distance_matrix
+from app.data.database import engine, Base, SessionLocal
+from app.service.rider_service import release_expired_leases_service
+from app.service.location_service import LOCATION_FLUSH_SECONDS, flush_locations, load_locations, location_store
+from app.service.change_feed_service import change_feed
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+LEASE_SWEEP_SECONDS = float(os.getenv("LEASE_SWEEP_SECONDS", "5"))
+
+def sweep_expired_leases() -> int:
+    db = SessionLocal()
+    try:
+        return release_expired_leases_service(db)
+    finally:
+        db.close()
+
+async def lease_sweeper():
+    """Periodically return riders with expired leases to the available pool"""
+    while True:
+        await asyncio.sleep(LEASE_SWEEP_SECONDS)
+        try:
+            await asyncio.to_thread(sweep_expired_leases)
+        except Exception:
+            # Try again on the next tick; reservations also reclaim expired leases on their own
+            pass
+
+async def location_writer():
+    """Periodically write the positions changed since the last batch"""
+    while True:
+        await asyncio.sleep(LOCATION_FLUSH_SECONDS)
+        try:
+            await flush_locations()
+        except Exception:
+            # The batch was put back and goes out with the next one
+            pass
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(load_locations)
+    await change_feed.start()
+    sweeper = asyncio.create_task(lease_sweeper())
+    writer = asyncio.create_task(location_writer())
+    yield
+    sweeper.cancel()
+    writer.cancel()
+    # Persist whatever arrived since the last batch
+    await flush_locations()
+    await change_feed.stop()
+
 app = FastAPI(
     title="Rider Service",
     description="Rider management for ride-sharing system",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -23,3 +72,14 @@ app.add_middleware(
 
 # Include rider router
 app.include_router(riders.router, prefix="/api/v1", tags=["riders"])
+app.include_router(distance_matrix.router, prefix="/api/v1", tags=["distance-matrix"])
+
+# Health check endpoint
+@app.get("/health", tags=["health"])
+def health_check():
+    return {"status": "healthy", "service": "rider-service"}
+
+# Metrics endpoint
+@app.get("/metrics", tags=["metrics"])
+async def metrics():
+    return {"locations": location_store.stats(), "change_feed": change_feed.stats()}
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, Index, func
 from app.data.database import Base
 
 class User(Base):
     __tablename__ = "users"
-    __table_args__ = {"schema": "user_schema"}
+    __table_args__ = (
+        # Keyset pagination order
+        Index("ix_user_schema_users_created_at_id", "created_at", "id"),
+        {"schema": "user_schema"}
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -0,0 +1,116 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from passlib.context import CryptContext
+
+# One context per worker process and cost factor
+_contexts: Dict[int, CryptContext] = {}
+
+def _context(rounds: int) -> CryptContext:
+    context = _contexts.get(rounds)
+    if context is None:
+        # Hashes below the configured cost count as deprecated and are re-hashed on login
+        context = _contexts[rounds] = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+        )
+    return context
+
+def _hash(password: str, rounds: int) -> str:
+    return _context(rounds).hash(password)
+
+def _hash_many(passwords: List[str], rounds: int) -> List[str]:
+    context = _context(rounds)
+    return [context.hash(password) for password in passwords]
+
+def _verify_and_update(password: str, password_hash: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    return _context(rounds).verify_and_update(password, password_hash)
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when too many hashes are already pending"""
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated process pool so hashing never occupies the event
+    loop or the request threadpool, and spreads over every core. At most
+    `max_pending` hashes may be queued or running; beyond that callers get
+    PasswordHasherBusy at once rather than waiting behind a login storm.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int = 12):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.pending = 0
+
+        self.hashed = 0
+        self.verified = 0
+        self.upgraded = 0
+        self.rejected = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Workers start on first use; spawn keeps them clear of the server's threads
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def _run(self, fn, *args, bounded: bool = True):
+        if bounded and self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        password_hash = await self._run(_hash, password, self.rounds)
+        self.hashed += 1
+        return password_hash
+
+    async def hash_many(self, passwords: List[str], batch_size: int = 8) -> List[str]:
+        """
+        Hash a bulk batch in small jobs, one in flight per worker. Bulk work waits
+        its turn instead of being rejected, and a login queued meanwhile only
+        waits for the job in front of it rather than the whole batch.
+        """
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def hash_part(part: List[str]) -> List[str]:
+            async with semaphore:
+                return await self._run(_hash_many, part, self.rounds, bounded=False)
+
+        parts = [passwords[start:start + batch_size] for start in range(0, len(passwords), batch_size)]
+        results = await asyncio.gather(*(hash_part(part) for part in parts))
+        self.hashed += len(passwords)
+        return [password_hash for part in results for password_hash in part]
+
+    async def verify(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """Whether the password matches, plus a re-hash at the current cost if the stored one is weaker"""
+        valid, new_hash = await self._run(_verify_and_update, password, password_hash, self.rounds)
+        self.verified += 1
+        if new_hash is not None:
+            self.upgraded += 1
+        return valid, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "upgraded": self.upgraded,
+            "rejected": self.rejected,
+        }
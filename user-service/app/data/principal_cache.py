@@ -0,0 +1,97 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from app.data.schemas import UserResponse
+
+class PrincipalCache:
+    """
+    Bounded LRU of authenticated principals, keyed by credential (a token or a
+    gateway identity) so a hit skips both the JWT decode and the user query.
+    Entries live for `ttl_seconds` and never beyond the token's own expiry.
+    Every entry of a user is dropped when that user changes; other processes
+    only see such changes once their entries expire. Safe to share between
+    the threadpool threads that run sync dependencies.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 60.0, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, Tuple[UserResponse, float]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(credential: str) -> str:
+        return hashlib.sha256(credential.encode()).hexdigest()
+
+    def get(self, credential: str) -> Optional[UserResponse]:
+        if not self.enabled:
+            return None
+        key = self.key(credential)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                self._discard(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, credential: str, principal: UserResponse, expires_at: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        key = self.key(credential)
+        deadline = time.time() + self.ttl_seconds
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (principal, min(deadline, expires_at) if expires_at else deadline)
+            self._keys_by_user.setdefault(principal.id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0].id]
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forget every cached principal of a user, e.g. after the user was changed"""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
@@ -1,4 +1,10 @@
+import csv
+import io
+from typing import List, Optional, Set, Tuple
+from sqlalchemy import Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
+from ride_sharing_common.pagination import paginate
 from app.data.models import User
 
 def create_user(db: Session, user: User) -> User:
@@ -16,6 +22,55 @@ def get_user_by_id(db: Session, user_id: int):
     """Retrieve a user by ID."""
     return db.query(User).filter(User.id == user_id).first()
 
-def get_all_users(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieve all users."""
-    return db.query(User).offset(skip).limit(limit).all()
+def get_users_by_ids(db: Session, ids: List[int]):
+    """Retrieve the users with the given IDs in one query."""
+    return db.query(User).filter(User.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))).all()
+
+def get_all_users(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of users and the cursor of the next page."""
+    return paginate(db.query(User), User, skip, limit, cursor)
+
+def get_existing_phone_numbers(db: Session, phone_numbers: List[str]) -> Set[str]:
+    """Return the phone numbers among `phone_numbers` that already belong to a user."""
+    rows = db.query(User.phone_number).filter(User.phone_number.in_(phone_numbers)).all()
+    return {phone_number for (phone_number,) in rows}
+
+# Keep the first staged row per phone number and skip numbers taken meanwhile; rows with no id were duplicates
+MERGE_IMPORTED_USERS = """
+WITH first_rows AS (
+    SELECT DISTINCT ON (phone_number) line, name, phone_number, password_hash
+    FROM users_import
+    ORDER BY phone_number, line
+), inserted AS (
+    INSERT INTO user_schema.users (name, phone_number, password_hash)
+    SELECT name, phone_number, password_hash FROM first_rows ORDER BY line
+    ON CONFLICT (phone_number) DO NOTHING
+    RETURNING id, phone_number
+)
+SELECT s.line, i.id
+FROM users_import s
+LEFT JOIN first_rows f ON f.line = s.line
+LEFT JOIN inserted i ON i.phone_number = f.phone_number
+ORDER BY s.line
+"""
+
+def import_users(db: Session, rows: List[Tuple[int, str, str, str]]) -> List[Tuple[int, Optional[int]]]:
+    """
+    Load (line, name, phone_number, password_hash) rows with COPY into a staging
+    table and merge them into the users table in one statement. Returns
+    (line, new user id) pairs, the id being None for duplicate phone numbers.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS users_import "
+        "(line integer, name text, phone_number text, password_hash text) ON COMMIT DELETE ROWS"
+    )
+    cursor.copy_expert("COPY users_import (line, name, phone_number, password_hash) FROM STDIN WITH (FORMAT csv)", buffer)
+    cursor.execute(MERGE_IMPORTED_USERS)
+    results = cursor.fetchall()
+    db.commit()
+    return results
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+import os
 import re
 
 class UserBase(BaseModel):
@@ -39,4 +40,14 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 class TokenData(BaseModel):
-    user_id: Optional[int] = None
\ No newline at end of file
+    user_id: Optional[int] = None
+
+# Largest id list a batch lookup accepts
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
+
+class BatchLookup(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class UserBatchResponse(BaseModel):
+    items: Dict[int, UserResponse]
+    missing: List[int]
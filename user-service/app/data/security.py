@@ -1,17 +1,23 @@
 import os
 from datetime import datetime, timedelta
-from typing import Optional
-from passlib.context import CryptContext
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.data.models import User
-from app.data.schemas import TokenData
+from app.data.schemas import TokenData, UserResponse
 from app.data.database import get_db
+from app.data.password_pool import PasswordHasher, PasswordHasherBusy
+from app.data.principal_cache import PrincipalCache
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing, in a bounded process pool; BCRYPT_ROUNDS is the bcrypt cost factor
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1))),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", "32")),
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+)
 
 # JWT configuration
 SECRET_KEY = os.getenv("JWT_SECRET", "your_super_secret_key_for_jwt")
@@ -21,19 +27,68 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
-    """Verify if the plain password matches the hashed password"""
-    return pwd_context.verify(plain_password, hashed_password)
+# Accept the user id verified by the API gateway instead of decoding the token again.
+# Only enable this when the service cannot be reached except through the gateway.
+TRUST_GATEWAY_IDENTITY = os.getenv("TRUST_GATEWAY_IDENTITY", "false").lower() == "true"
+IDENTITY_HEADER = "x-authenticated-user-id"
 
-def get_password_hash(password):
+# Read-only routes that only need the caller's id may take it from a valid token without a user lookup.
+# A deleted user's tokens then keep working on those routes until they expire.
+TRUST_JWT_CLAIMS = os.getenv("TRUST_JWT_CLAIMS", "false").lower() == "true"
+
+# Authenticated principals, so repeat requests skip the token decode and the user query
+principal_cache = PrincipalCache(
+    max_entries=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    ttl_seconds=float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60")),
+    enabled=os.getenv("PRINCIPAL_CACHE_ENABLED", "true").lower() == "true",
+)
+
+def hasher_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many password checks in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+async def verify_password(plain_password, hashed_password):
+    """Verify if the plain password matches the hashed password, returns (valid, upgraded hash or None)"""
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
+
+async def get_password_hash(password):
     """Hash a password for storing"""
-    return pwd_context.hash(password)
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception()
 
-def authenticate_user(db: Session, phone_number: str, password: str):
-    """Authenticate a user by phone number and password"""
+def _find_user(db: Session, phone_number: str) -> Optional[User]:
     user = db.query(User).filter(User.phone_number == phone_number).first()
-    if not user or not verify_password(password, user.password_hash):
+    if user:
+        db.expunge(user)
+    # Hand the connection back to the pool while the hash is checked, it can take a while under load
+    db.rollback()
+    return user
+
+def _store_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    db.query(User).filter(User.id == user_id).update({User.password_hash: password_hash})
+    db.commit()
+
+async def authenticate_user(db: Session, phone_number: str, password: str):
+    """Authenticate a user by phone number and password"""
+    # Queries run in the threadpool, only the hash is awaited on the event loop
+    user = await run_in_threadpool(_find_user, db, phone_number)
+    if not user:
         return False
+    valid, new_hash = await verify_password(password, user.password_hash)
+    if not valid:
+        return False
+    if new_hash is not None:
+        # Stored with a lower cost than configured; swap in the stronger hash while we have the password
+        await run_in_threadpool(_store_password_hash, db, user.id, new_hash)
+        principal_cache.invalidate_user(user.id)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -47,22 +102,63 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get the current user from JWT token"""
-    credentials_exception = HTTPException(
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def gateway_identity(request: Request) -> Optional[int]:
+    """User id asserted by the gateway, if this service trusts it"""
+    if not TRUST_GATEWAY_IDENTITY:
+        return None
+    identity = request.headers.get(IDENTITY_HEADER)
+    return int(identity) if identity and identity.isdigit() else None
+
+def decode_token(token: str) -> Tuple[int, Optional[float]]:
+    """Get the user id and expiry time from a JWT token"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            raise credentials_exception()
         token_data = TokenData(user_id=int(user_id))
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+        raise credentials_exception()
+    return token_data.user_id, payload.get("exp")
+
+def decode_user_id(token: str) -> int:
+    """Get the user id from a JWT token"""
+    return decode_token(token)[0]
+
+def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> UserResponse:
+    """Get the current user from JWT token, as a principal detached from the session"""
+    user_id = gateway_identity(request)
+    credential = f"gateway:{user_id}" if user_id is not None else token
+    principal = principal_cache.get(credential)
+    if principal is not None:
+        return principal
+    
+    expires_at = None
+    if user_id is None:
+        user_id, expires_at = decode_token(token)
+    user = db.query(User).filter(User.id == user_id).first()
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise credentials_exception()
+    principal = UserResponse.model_validate(user)
+    principal_cache.put(credential, principal, expires_at)
+    return principal
+
+def get_current_user_id(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> int:
+    """
+    Get the id of the authenticated user for routes that only need to know who
+    is calling. A gateway-verified identity is used as is, with no token decode
+    and no database query.
+    """
+    user_id = gateway_identity(request)
+    if user_id is not None:
+        return user_id
+    if TRUST_JWT_CLAIMS:
+        return decode_user_id(token)
+    return get_current_user(request, token, db).id
@@ -0,0 +1,123 @@
+import csv
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from ride_sharing_common.streams import decode_line, iter_lines
+from app.data.database import SessionLocal
+from app.data.schemas import UserCreate
+from app.data.repository import get_existing_phone_numbers, import_users
+from app.data.security import password_hasher
+
+# Rows validated, hashed and merged together; bounds memory per import
+IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "1000"))
+
+CSV_FIELDS = ("name", "phone_number", "password")
+
+def _parse(line: str, columns: Optional[List[str]]) -> Dict:
+    if columns is None:
+        row = json.loads(line)
+        if not isinstance(row, dict):
+            raise ValueError("Expected a JSON object")
+        return row
+    values = next(csv.reader([line]))
+    if len(values) != len(columns):
+        raise ValueError(f"Expected {len(columns)} columns, got {len(values)}")
+    return dict(zip(columns, values))
+
+def _existing(phone_numbers: List[str]) -> set:
+    db = SessionLocal()
+    try:
+        return get_existing_phone_numbers(db, phone_numbers)
+    finally:
+        db.close()
+
+def _insert(rows: List[Tuple[int, str, str, str]]) -> List[Tuple[int, Optional[int]]]:
+    db = SessionLocal()
+    try:
+        return import_users(db, rows)
+    finally:
+        db.close()
+
+async def _import_chunk(chunk: List[Tuple[int, UserCreate]]) -> List[Dict]:
+    phone_numbers = list({user.phone_number for _, user in chunk})
+    existing = await run_in_threadpool(_existing, phone_numbers)
+
+    # Only hash rows that can still be created: new numbers, first occurrence in the chunk
+    results: Dict[int, Dict] = {}
+    to_create: List[Tuple[int, UserCreate]] = []
+    seen = set()
+    for line, user in chunk:
+        if user.phone_number in existing or user.phone_number in seen:
+            results[line] = {"line": line, "status": "duplicate", "phone_number": user.phone_number}
+        else:
+            seen.add(user.phone_number)
+            to_create.append((line, user))
+
+    hashes = await password_hasher.hash_many([user.password for _, user in to_create])
+    rows = [(line, user.name, user.phone_number, password_hash) for (line, user), password_hash in zip(to_create, hashes)]
+    if rows:
+        # A number registered since the check above comes back without an id
+        phone_by_line = {line: phone_number for line, _, phone_number, _ in rows}
+        for line, user_id in await run_in_threadpool(_insert, rows):
+            if user_id is None:
+                results[line] = {"line": line, "status": "duplicate", "phone_number": phone_by_line[line]}
+            else:
+                results[line] = {"line": line, "status": "created", "id": user_id}
+    return [results[line] for line, _ in chunk]
+
+async def _report_chunk(chunk: List[Tuple[int, Optional[UserCreate]]], invalid: List[Dict]) -> List[Dict]:
+    valid = [(line, user) for line, user in chunk if user is not None]
+    results = {result["line"]: result for result in await _import_chunk(valid)} if valid else {}
+    results.update({result["line"]: result for result in invalid})
+    return [results[line] for line, _ in chunk]
+
+async def import_users_stream(stream: AsyncIterator[bytes], content_type: str) -> AsyncIterator[str]:
+    """
+    Import users from NDJSON, or CSV with a name,phone_number,password header,
+    yielding one NDJSON result per input line and a summary as the last line.
+    Input is read, hashed and merged a chunk at a time, so neither the upload
+    nor the report is ever held in memory whole.
+    """
+    columns: Optional[List[str]] = None
+    is_csv = content_type.split(";")[0].strip().lower() == "text/csv"
+    totals = {"created": 0, "duplicate": 0, "invalid": 0}
+    chunk: List[Tuple[int, Optional[UserCreate]]] = []
+    pending: List[Dict] = []
+
+    def report(results: List[Dict]) -> str:
+        for result in results:
+            totals[result["status"]] += 1
+        return "".join(json.dumps(result) + "\n" for result in results)
+
+    line_number = 0
+    async for data in iter_lines(stream):
+        line_number += 1
+        if not data.strip():
+            continue
+        if is_csv and columns is None:
+            try:
+                columns = [column.strip() for column in next(csv.reader([decode_line(data)]))]
+            except (ValueError, csv.Error) as e:
+                yield report([{"line": line_number, "status": "invalid", "detail": f"CSV header: {e}"}])
+                break
+            missing = [field for field in CSV_FIELDS if field not in columns]
+            if missing:
+                yield report([{"line": line_number, "status": "invalid", "detail": f"CSV header lacks {', '.join(missing)}"}])
+                break
+            continue
+        try:
+            row = _parse(decode_line(data), columns)
+            chunk.append((line_number, UserCreate(**{field: row.get(field) for field in CSV_FIELDS})))
+        except (ValueError, ValidationError, csv.Error) as e:
+            # Invalid rows are reported in input order with the chunk they fall in
+            pending.append({"line": line_number, "status": "invalid", "detail": str(e)})
+            chunk.append((line_number, None))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            yield report(await _report_chunk(chunk, pending))
+            chunk, pending = [], []
+    if chunk:
+        yield report(await _report_chunk(chunk, pending))
+
+    yield json.dumps({"summary": totals}) + "\n"
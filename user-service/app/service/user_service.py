@@ -1,4 +1,6 @@
+from typing import List, Optional
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 from app.data.models import User
 from app.data.schemas import UserCreate, UserResponse
@@ -6,35 +8,48 @@ from app.data.repository import (
     create_user as create_user_repo,
     get_user_by_phone as get_user_by_phone_repo,
     get_user_by_id as get_user_by_id_repo,
+    get_users_by_ids as get_users_by_ids_repo,
     get_all_users as get_all_users_repo
 )
 from app.data.security import (
-    get_password_hash, authenticate_user, create_access_token,
+    get_password_hash, authenticate_user, create_access_token, principal_cache,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
-def register_user_service(user: UserCreate, db: Session) -> UserResponse:
+async def register_user_service(user: UserCreate, db: Session) -> UserResponse:
     """Register a new user after checking if phone number exists."""
-    existing_user = get_user_by_phone_repo(db, user.phone_number)
+    # Queries run in the threadpool, only the hash is awaited on the event loop
+    existing_user = await run_in_threadpool(get_user_by_phone_repo, db, user.phone_number)
     if existing_user:
         return None  # Handle this in the API layer
     
-    hashed_password = get_password_hash(user.password)
+    # Do not hold a connection while waiting for the hash
+    await run_in_threadpool(db.rollback)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(name=user.name, phone_number=user.phone_number, password_hash=hashed_password)
-    return create_user_repo(db, db_user)
+    created = await run_in_threadpool(create_user_repo, db, db_user)
+    # Drop anything cached under this id
+    principal_cache.invalidate_user(created.id)
+    return created
 
-def authenticate_user_service(phone_number: str, password: str, db: Session):
+async def authenticate_user_service(phone_number: str, password: str, db: Session):
     """Authenticate a user."""
-    return authenticate_user(db, phone_number, password)
+    return await authenticate_user(db, phone_number, password)
 
 def generate_access_token(user_id: int):
     """Generate an access token for an authenticated user."""
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     return create_access_token(data={"sub": str(user_id)}, expires_delta=access_token_expires)
 
-def get_all_users_service(db: Session, skip: int = 0, limit: int = 100):
-    """Retrieve all users from the database."""
-    return get_all_users_repo(db, skip, limit)
+def get_users_by_ids_service(ids: List[int], db: Session):
+    """Retrieve users by ID in one query, keyed by ID, plus the IDs that do not exist."""
+    unique_ids = list(dict.fromkeys(ids))
+    found = {item.id: item for item in get_users_by_ids_repo(db, unique_ids)}
+    return {"items": found, "missing": [item_id for item_id in unique_ids if item_id not in found]}
+
+def get_all_users_service(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Retrieve a page of users and the cursor of the next page."""
+    return get_all_users_repo(db, skip, limit, cursor)
 
 def get_user_by_id_service(user_id: int, db: Session):
     """Retrieve a single user by ID."""
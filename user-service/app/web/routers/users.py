@@ -1,29 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from ride_sharing_common.pagination import NEXT_CURSOR_HEADER, InvalidCursor
 from app.data.database import get_db
-from app.data.schemas import UserCreate, UserResponse, Token
+from app.data.schemas import UserCreate, UserResponse, Token, BatchLookup, UserBatchResponse
 from app.service.user_service import (
     register_user_service, authenticate_user_service,
-    generate_access_token, get_all_users_service, get_user_by_id_service
+    generate_access_token, get_all_users_service, get_user_by_id_service,
+    get_users_by_ids_service
 )
-from app.data.security import get_current_user
+from app.service.user_import import import_users_stream
+from app.data.security import get_current_user, get_current_user_id
 
 router = APIRouter()
 
+class RequestStreamingResponse(StreamingResponse):
+    """
+    Streams a body that is produced while the request body is still being read.
+    StreamingResponse would listen for disconnects on the same receive channel
+    and swallow the upload; reading the request surfaces a disconnect anyway.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
 @router.post("/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
-    new_user = register_user_service(user, db)
+    new_user = await register_user_service(user, db)
     if not new_user:
         raise HTTPException(status_code=400, detail="User already exists")
     return new_user
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Authenticate user and return JWT token"""
-    user = authenticate_user_service(form_data.username, form_data.password, db)
+    user = await authenticate_user_service(form_data.username, form_data.password, db)
     if not user:
         raise HTTPException(status_code=401, detail="Incorrect phone number or password")
     
@@ -36,14 +50,32 @@ def get_current_user_profile(current_user: UserResponse = Depends(get_current_us
     return current_user
 
 @router.get("/users", response_model=List[UserResponse])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: UserResponse = Depends(get_current_user)):
-    """Get list of users (Requires authentication)"""
-    return get_all_users_service(db, skip, limit)
+def get_users(response: Response, skip: int = 0, limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None,
+              db: Session = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
+    """Get list of users; pass the X-Next-Cursor header back as `cursor` for the next page (Requires authentication)"""
+    try:
+        users, next_cursor = get_all_users_service(db, skip, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return users
+
+@router.post("/users/batch", response_model=UserBatchResponse)
+def get_users_batch(lookup: BatchLookup, db: Session = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
+    """Get many users by ID at once; unknown IDs are listed under `missing` (Requires authentication)"""
+    return get_users_by_ids_service(lookup.ids, db)
 
 @router.get("/users/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db), current_user: UserResponse = Depends(get_current_user)):
+def get_user(user_id: int, db: Session = Depends(get_db), current_user_id: int = Depends(get_current_user_id)):
     """Get user details by ID"""
     user = get_user_by_id_service(user_id, db)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
+
+@router.post("/users/import")
+async def import_users(request: Request, current_user_id: int = Depends(get_current_user_id)):
+    """Bulk import users from NDJSON or CSV, streaming a per-line result report (Requires authentication)"""
+    report = import_users_stream(request.stream(), request.headers.get("content-type", ""))
+    return RequestStreamingResponse(report, media_type="application/x-ndjson")
@@ -0,0 +1,65 @@
+"""
+Measure the latency of authenticated requests against a running user-service.
+
+    python -m benchmarks.auth_benchmark --url http://localhost:8001 --path /api/v1/users/me --requests 5000
+
+The benchmark user is registered if needed and logged in once; the token is then
+reused for every request, as a client would. Run it with PRINCIPAL_CACHE_ENABLED
+set to false and true (and TRUST_JWT_CLAIMS for /api/v1/users) to compare.
+"""
+import argparse
+import asyncio
+import collections
+import statistics
+import time
+import httpx
+
+async def run(url: str, path: str, phone_number: str, password: str, total: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        await client.post("/api/v1/users", json={"name": "Benchmark", "phone_number": phone_number, "password": password})
+        response = await client.post("/api/v1/token", data={"username": phone_number, "password": password})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        statuses = collections.Counter()
+
+        async def call():
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(path, headers=headers)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[e.__class__.__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(call() for _ in range(min(concurrency, total))))
+        latencies.clear()
+        statuses.clear()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        metrics = (await client.get("/metrics")).json()
+
+    latencies.sort()
+    print(f"GET {url}{path}: {total} requests, concurrency {concurrency}")
+    print(f"  throughput {total / elapsed:.0f} req/s")
+    print(f"  latency p50 {statistics.median(latencies) * 1000:.1f} ms"
+          f" | p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms")
+    print(f"  status codes {dict(statuses)}")
+    print(f"  principal cache {metrics.get('principal_cache')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--path", default="/api/v1/users/me")
+    parser.add_argument("--phone-number", default="0900000001")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.path, args.phone_number, args.password, args.requests, args.concurrency))
@@ -0,0 +1,85 @@
+"""
+Measure login throughput of a running user-service, and how a login storm
+affects a cheap route served by the same process.
+
+    python -m benchmarks.login_benchmark --url http://localhost:8001 --requests 500
+
+A test user is registered first (a 400 means it already exists). While the
+logins run, /health is polled so the latency of other routes can be compared
+with and without the storm.
+"""
+import argparse
+import asyncio
+import collections
+import statistics
+import time
+import httpx
+
+def summary(latencies) -> str:
+    latencies = sorted(latencies)
+    return (f"p50 {statistics.median(latencies) * 1000:.1f} ms"
+            f" | p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms"
+            f" | max {latencies[-1] * 1000:.1f} ms")
+
+async def poll_health_idle(client: httpx.AsyncClient, latencies) -> None:
+    for _ in range(20):
+        start = time.perf_counter()
+        await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+
+async def run(url: str, phone_number: str, password: str, total: int, concurrency: int) -> None:
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as client:
+        await client.post("/api/v1/users", json={"name": "Benchmark", "phone_number": phone_number, "password": password})
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        statuses = collections.Counter()
+        health_latencies = []
+        done = asyncio.Event()
+
+        async def login():
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/api/v1/token", data={"username": phone_number, "password": password})
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[e.__class__.__name__] += 1
+                latencies.append(time.perf_counter() - start)
+
+        async def poll_health():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        await poll_health_idle(client, health_latencies)
+        idle = list(health_latencies)
+        health_latencies.clear()
+
+        poller = asyncio.create_task(poll_health())
+        start = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await poller
+
+    ok = statuses.get(200, 0)
+    print(f"POST {url}/api/v1/token: {total} logins, concurrency {concurrency}")
+    print(f"  throughput {total / elapsed:.1f} req/s ({ok / elapsed:.1f} successful logins/s)")
+    print(f"  latency {summary(latencies)}")
+    print(f"  status codes {dict(statuses)}")
+    print(f"  /health idle {summary(idle)}")
+    print(f"  /health during logins {summary(health_latencies)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--phone-number", default="0900000001")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.phone_number, args.password, args.requests, args.concurrency))
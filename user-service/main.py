@@ -1,17 +1,26 @@
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.web.routers import users
 from app.data.database import engine, Base
+from app.data.security import password_hasher, principal_cache
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Stop the password hashing workers on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    password_hasher.shutdown()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="User Service",
     description="User management for ride-sharing system",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -31,6 +40,11 @@ app.include_router(users.router, prefix="/api/v1", tags=["users"])
 def health_check():
     return {"status": "healthy", "service": "user-service"}
 
+# Metrics endpoint
+@app.get("/metrics", tags=["metrics"])
+def metrics():
+    return {"password_hasher": password_hasher.stats(), "principal_cache": principal_cache.stats()}
+
 # Main entry point
 if __name__ == "__main__":
     import uvicorn